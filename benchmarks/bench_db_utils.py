@@ -0,0 +1,268 @@
+"""
+Benchmarks de nsds.db_utils: carga, leitura, conexão e consultas de metadados.
+
+Roda contra um SQLite temporário; o caminho Oracle só roda com --oracle CONNECTION_NAME
+(ou a variável de ambiente NSDS_BENCH_ORACLE) e é ignorado caso contrário.
+
+uso:
+    python benchmarks/bench_db_utils.py --output results.json
+    python benchmarks/bench_db_utils.py --save-baseline                  # grava benchmarks/baseline.json
+    python benchmarks/bench_db_utils.py --baseline benchmarks/baseline.json --tolerance 0.25
+
+o baseline depende da máquina e não é versionado: gravar com --save-baseline na mesma máquina antes de comparar.
+o processo termina com código 1 se alguma medida falhar ou, com --baseline, se alguma métrica piorar mais que tolerance.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def best_of(fn, repeat):
+    # menor tempo entre as repetições (menos sensível a ruído do que a média)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def make_frame(rows, kind):
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    columns = {
+        'int': lambda: {f'i{k}': rng.integers(0, 10 ** 6, rows) for k in range(4)},
+        'float': lambda: {f'f{k}': rng.random(rows) for k in range(4)},
+        'str': lambda: {f's{k}': rng.integers(0, 10 ** 6, rows).astype(str) for k in range(4)},
+        'mixed': lambda: {
+            'i': rng.integers(0, 10 ** 6, rows),
+            'f': rng.random(rows),
+            's': rng.integers(0, 10 ** 6, rows).astype(str),
+            'd': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 10 ** 8, rows), unit='s'),
+        },
+    }
+    return pd.DataFrame(columns[kind]())
+
+
+def bench_insert(sql_connector, db_utils, rows, repeat, batch_sizes, kinds, prefix):
+    results = {}
+    for kind in kinds:
+        df = make_frame(rows, kind)
+        for batch_size in batch_sizes:
+            table_name = f'bench_{kind}'
+
+            def load():
+                db_utils.insert_df(df, table_name, sql_connector, if_exists='replace', batch_size=batch_size)
+
+            seconds = best_of(load, repeat)
+            results[f'{prefix}.insert.{kind}.batch_{batch_size or "all"}'] = {
+                'value': rows / seconds, 'unit': 'rows/s', 'higher_is_better': True
+            }
+    return results
+
+
+def bench_read(sql_connector, db_utils, rows, repeat, chunksizes, prefix):
+    results = {}
+    df = make_frame(rows, 'mixed')
+    db_utils.insert_df(df, 'bench_read', sql_connector, if_exists='replace', batch_size=50000)
+    for chunksize in chunksizes:
+        for as_df in (False, True):
+            def read():
+                for _ in db_utils.read_query(sql_connector, 'select * from bench_read', chunksize=chunksize, as_df=as_df):
+                    pass
+
+            seconds = best_of(read, repeat)
+            results[f'{prefix}.read.{"df" if as_df else "rows"}.chunk_{chunksize}'] = {
+                'value': rows / seconds, 'unit': 'rows/s', 'higher_is_better': True
+            }
+
+    from nsds.db_utils import columnar
+
+    for as_df in (False, True):
+        seconds = best_of(lambda: columnar.read_arrays(sql_connector, 'select * from bench_read', nrows=rows, as_df=as_df), repeat)
+        results[f'{prefix}.read.arrays{".df" if as_df else ""}'] = {
+            'value': rows / seconds, 'unit': 'rows/s', 'higher_is_better': True
+        }
+    return results
+
+
+def bench_connect(connection_name, db_utils, pool, iterations, prefix):
+    def plain():
+        for _ in range(iterations):
+            db_utils.connect(connection_name).close()
+
+    def pooled():
+        for _ in range(iterations):
+            with pool.pooled_connection(connection_name):
+                pass
+
+    pooled() # cria o pool fora da medição
+    return {
+        f'{prefix}.connect.plain': {'value': best_of(plain, 3) / iterations, 'unit': 's', 'higher_is_better': False},
+        f'{prefix}.connect.pooled': {'value': best_of(pooled, 3) / iterations, 'unit': 's', 'higher_is_better': False},
+    }
+
+
+def bench_metadata(sql_connector, db_utils, iterations, prefix):
+    def lookups(cache):
+        def run():
+            for _ in range(iterations):
+                db_utils.table_exists(sql_connector, 'bench_read', cache=cache)
+                db_utils.find_table(sql_connector, 'bench', cache=cache)
+        return run
+
+    lookups(True)() # carrega o catálogo fora da medição
+    return {
+        f'{prefix}.metadata.query': {'value': best_of(lookups(False), 3) / iterations, 'unit': 's', 'higher_is_better': False},
+        f'{prefix}.metadata.cached': {'value': best_of(lookups(True), 3) / iterations, 'unit': 's', 'higher_is_better': False},
+    }
+
+
+def bench_import_time(repeat):
+    # import em um processo novo, para não medir módulos já carregados
+    import subprocess
+
+    # import.nsds.db_utils carrega o módulo de funções, mas nenhum driver (ver backends.py)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    codes = {
+        'import.nsds': 'import nsds',
+        'import.nsds.db_utils': 'import nsds; nsds.db_utils; '
+                                'assert not {"cx_Oracle", "sqlalchemy"} & set(sys.modules), "driver importado no import"',
+    }
+    results = {}
+    for name, statement in codes.items():
+        code = f'import sys, time; s = time.perf_counter(); {statement}; print(time.perf_counter() - s)'
+        times, error = [], None
+        for _ in range(repeat):
+            process = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True)
+            if process.returncode:
+                # e.g. a asserção de drivers: a medida é registrada como falha e as demais seguem
+                error = (process.stderr.strip().splitlines() or [f'código {process.returncode}'])[-1]
+                break
+            times.append(float(process.stdout))
+        results[name] = {'value': None if error else min(times), 'unit': 's', 'higher_is_better': False}
+        if error:
+            results[name]['error'] = error
+    return results
+
+
+def run(args):
+    from nsds.db_utils import db_utils, pool
+
+    results = {}
+    batch_sizes = [int(b) for b in args.batch_sizes.split(',')]
+    kinds = args.kinds.split(',')
+
+    results.update(bench_import_time(args.repeat))
+
+    tmp_dir = tempfile.mkdtemp(prefix='nsds_bench_')
+    os.environ['NSDS_CONNECTIONS'] = json.dumps({'BENCH_SQLITE': {'dbpath': os.path.join(tmp_dir, 'bench.db'), 'flavor': 'sqlite'}})
+    try:
+        connection = db_utils.connect('BENCH_SQLITE')
+        results.update(bench_insert(connection, db_utils, args.rows, args.repeat, batch_sizes, kinds, 'sqlite'))
+        results.update(bench_read(connection, db_utils, args.rows, args.repeat, [1000, 50000], 'sqlite'))
+        results.update(bench_connect('BENCH_SQLITE', db_utils, pool, args.iterations, 'sqlite'))
+        results.update(bench_metadata(connection, db_utils, args.iterations, 'sqlite'))
+        connection.close()
+        pool.close_all()
+    finally:
+        del os.environ['NSDS_CONNECTIONS']
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if args.oracle:
+        connection = db_utils.connect(args.oracle)
+        try:
+            results.update(bench_insert(connection, db_utils, args.rows, args.repeat, batch_sizes, kinds, 'oracle'))
+            results.update(bench_read(connection, db_utils, args.rows, args.repeat, [1000, 50000], 'oracle'))
+            results.update(bench_connect(args.oracle, db_utils, pool, max(args.iterations // 20, 5), 'oracle'))
+            results.update(bench_metadata(connection, db_utils, max(args.iterations // 20, 5), 'oracle'))
+            for kind in kinds:
+                db_utils.drop_table(f'bench_{kind}', connection)
+            db_utils.drop_table('bench_read', connection)
+        finally:
+            connection.close()
+            pool.close_all()
+    else:
+        print('oracle: ignorado (informe --oracle CONNECTION_NAME ou NSDS_BENCH_ORACLE)')
+
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'rows': args.rows,
+            'repeat': args.repeat,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Lista de métricas que pioraram mais que tolerance (fração) em relação ao baseline"""
+
+    regressions = []
+    for name, base in baseline['results'].items():
+        current = results['results'].get(name)
+        if current is None or current['value'] is None or base['value'] is None:
+            continue # medidas que falharam são reportadas à parte
+        change = current['value'] / base['value'] - 1
+        worse = change < -tolerance if base['higher_is_better'] else change > tolerance
+        if worse:
+            regressions.append((name, base['value'], current['value'], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks de nsds.db_utils')
+    parser.add_argument('--rows', type=int, default=100000, help='linhas por carga/leitura')
+    parser.add_argument('--repeat', type=int, default=3, help='repetições por medida (vale a melhor)')
+    parser.add_argument('--iterations', type=int, default=200, help='iterações das medidas de latência')
+    parser.add_argument('--batch-sizes', default='0,1000,10000,100000', help='tamanhos de lote do insert (0 = sem lotes)')
+    parser.add_argument('--kinds', default='int,float,str,mixed', help='tipos de colunas das cargas')
+    parser.add_argument('--oracle', default=os.environ.get('NSDS_BENCH_ORACLE'), help='conexão oracle salva')
+    parser.add_argument('--output', help='arquivo json com os resultados')
+    parser.add_argument('--baseline', help='arquivo json de baseline para comparação')
+    parser.add_argument('--save-baseline', action='store_true', help=f'grava os resultados em {BASELINE}')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='piora relativa aceita antes de acusar regressão')
+    args = parser.parse_args()
+
+    results = run(args)
+    failures = [name for name, r in results['results'].items() if r['value'] is None]
+    for name, r in sorted(results['results'].items()):
+        if r['value'] is None:
+            print(f'{name:45s} {"FALHOU":>16s} {r.get("error", "")}')
+        else:
+            print(f'{name:45s} {r["value"]:>16,.6g} {r["unit"]}')
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=4)
+    if args.save_baseline:
+        with open(BASELINE, 'w') as fp:
+            json.dump(results, fp, indent=4)
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            regressions = compare(results, json.load(fp), args.tolerance)
+        for name, base, current, change in regressions:
+            print(f'REGRESSÃO {name}: {base:,.6g} -> {current:,.6g} ({change:+.1%})')
+        if regressions:
+            sys.exit(1)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,13 @@
 
 __version__ = '0.1.0'
 __author__ = 'Pedro Correia <pedro.correia@netshoes.com>'
-__all__ = []
+__all__ = ['db_utils']
 
-from .db_utils import db_utils
\ No newline at end of file
+
+def __getattr__(name):
+    # db_utils (e os drivers de banco) só são importados no primeiro acesso a nsds.db_utils
+    if name == 'db_utils':
+        from .db_utils import db_utils
+        globals()['db_utils'] = db_utils
+        return db_utils
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
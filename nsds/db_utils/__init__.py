@@ -0,0 +1,9 @@
+import importlib
+
+
+def __getattr__(name):
+    # nsds.db_utils pode ficar ligado a este pacote (e não ao módulo db_utils) quando um submódulo é importado
+    # antes do primeiro acesso; as funções continuam acessíveis pelo pacote
+    if name.startswith('__') or name == 'db_utils':
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    return getattr(importlib.import_module(f'{__name__}.db_utils'), name)
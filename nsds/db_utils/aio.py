@@ -0,0 +1,209 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import db_utils
+from . import pool
+from . import tracing
+
+
+# # # # # # # # # # # # # # # #
+#                             #
+#   API ASSÍNCRONA            #
+#                             #
+# # # # # # # # # # # # # # # #
+
+# cx_Oracle e sqlite3 não têm API assíncrona nativa: as chamadas bloqueantes rodam em um executor
+# limitado ao tamanho do pool, e um semáforo limita quantas operações aguardam conexão ao mesmo tempo.
+# executor e semáforo seguem o max do pool efetivamente usado (o do processo pode ter sido criado antes, com
+# outro max): com mais operações que conexões, threads do executor bloqueiam no pool.acquire enquanto quem
+# tem a conexão aguarda uma thread livre para o fetch ou release (deadlock)
+
+_async_pools = {}
+_lock = threading.Lock()
+
+
+class AsyncConnectionPool:
+    """
+    Pool de conexões para uso com asyncio, sobre o pool do processo da conexão salva (ver pool.py)
+
+    inputs:
+    :: connection_name [str] -> nome da conexão
+    :: max [int] -> conexões abertas no máximo, na criação do pool do processo | default: 4
+    :: max_concurrency [int] -> operações em andamento ao mesmo tempo; as demais aguardam sem bloquear o loop.
+       não pode passar do max do pool do processo | default: max do pool
+    :: min, increment, timeout, config_filename, encoding -> repassados para a criação do pool (ver pool.ConnectionPool)
+    """
+
+    def __init__(self, connection_name, max=4, max_concurrency=None, **kwargs):
+        self.connection_name = connection_name.upper()
+        self._pool = pool.get_pool(connection_name, max=max, **kwargs)
+        self.max_concurrency = max_concurrency or self._pool.max
+        if self.max_concurrency > self._pool.max:
+            print(f'max_concurrency={self.max_concurrency} maior que o max={self._pool.max} do pool de {self.connection_name}')
+            raise ValueError
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix=f'nsds-{self.connection_name}')
+        self._semaphore = None
+
+    @property
+    def semaphore(self):
+        # criado no primeiro uso, já dentro do event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _in_executor(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Executa fn(conexão, *args, **kwargs) em uma thread do executor, com uma conexão emprestada do pool
+
+        output:
+        :: retorno de fn
+        """
+
+        def call():
+            with self._pool.connection() as connection:
+                return fn(connection, *args, **kwargs)
+
+        async with self.semaphore:
+            return await self._in_executor(call)
+
+    async def acquire(self):
+        """Empresta uma conexão do pool sem bloquear o loop. Devolver com release"""
+
+        await self.semaphore.acquire()
+        try:
+            return await self._in_executor(self._pool.acquire)
+        except:
+            self.semaphore.release()
+            raise
+
+    async def release(self, connection):
+        """Devolve uma conexão obtida com acquire"""
+
+        try:
+            await self._in_executor(self._pool.release, connection)
+        finally:
+            self.semaphore.release()
+
+    async def execute(self, q, params=None, commit=True):
+        """Executa q e retorna todas as linhas (se houver)"""
+
+        def call(connection):
+            cursor = connection.cursor()
+            try:
+                tracing.execute(cursor, q, params)
+                rows = cursor.fetchall() if cursor.description else None
+                if commit:
+                    connection.commit()
+                return rows
+            finally:
+                cursor.close()
+
+        return await self.run(call)
+
+    async def executemany(self, q, rows, commit=True):
+        """Executa q para cada linha de rows (cursor.executemany)"""
+
+        def call(connection):
+            cursor = connection.cursor()
+            try:
+                tracing.executemany(cursor, q, rows)
+                if commit:
+                    connection.commit()
+            finally:
+                cursor.close()
+
+        return await self.run(call)
+
+    async def insert_rows(self, rows, cols, table_name, batch_size=None, commit=True, **kwargs):
+        """Versão assíncrona de db_utils.insert_rows"""
+
+        def call(connection):
+            stats = db_utils.insert_rows(rows, cols, table_name, connection, batch_size=batch_size, **kwargs)
+            if commit:
+                connection.commit()
+            return stats
+
+        return await self.run(call)
+
+    async def read_query(self, q, params=None, chunksize=10000, as_df=True):
+        """
+        Versão assíncrona de db_utils.read_query: async generator de lotes. A conexão fica emprestada
+        até o fim da iteração e cada fetch roda no executor.
+        """
+
+        connection = await self.acquire()
+        chunks = db_utils.read_query(connection, q, params=params, chunksize=chunksize, as_df=as_df)
+        try:
+            while True:
+                chunk = await self._in_executor(next, chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            await self._in_executor(chunks.close)
+            await self.release(connection)
+
+    async def table_exists(self, table_name, **kwargs):
+        """Versão assíncrona de db_utils.table_exists"""
+
+        return await self.run(db_utils.table_exists, table_name, **kwargs)
+
+    async def find_table(self, partial_table_name=None, **kwargs):
+        """Versão assíncrona de db_utils.find_table"""
+
+        return await self.run(db_utils.find_table, partial_table_name, **kwargs)
+
+    async def create_table(self, table_name, **kwargs):
+        """Versão assíncrona de db_utils.create_table"""
+
+        return await self.run(lambda connection: db_utils.create_table(table_name, connection, **kwargs))
+
+    async def drop_table(self, table_name):
+        """Versão assíncrona de db_utils.drop_table"""
+
+        return await self.run(lambda connection: db_utils.drop_table(table_name, connection))
+
+    def stats(self):
+        """Estatísticas do pool (ver pool.ConnectionPool.stats)"""
+
+        return self._pool.stats()
+
+    async def close(self):
+        """Encerra o executor. As conexões pertencem ao pool do processo (ver pool.close_all)"""
+
+        with _lock:
+            if _async_pools.get(self.connection_name) is self:
+                del _async_pools[self.connection_name]
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._executor.shutdown)
+
+
+def get_async_pool(connection_name, **kwargs):
+    """
+    AsyncConnectionPool do processo para connection_name, criado no primeiro uso.
+    kwargs (ver AsyncConnectionPool) só têm efeito na criação.
+    """
+
+    key = connection_name.upper()
+    with _lock:
+        if key not in _async_pools:
+            _async_pools[key] = AsyncConnectionPool(connection_name, **kwargs)
+        return _async_pools[key]
+
+
+async def connect_async(connection_name, *connection_type, **kwargs):
+    """
+    Versão assíncrona de db_utils.connect: a conexão (bloqueante) é aberta em uma thread, sem bloquear o loop
+
+    output:
+    :: objeto conector ou lista de objetos conectores definido por connection_type
+    """
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(db_utils.connect, connection_name, *connection_type, **kwargs))
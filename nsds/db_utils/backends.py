@@ -0,0 +1,96 @@
+import importlib
+import threading
+
+
+# # # # # # # # # # # # # # # #
+#                             #
+#   REGISTRO DE BACKENDS      #
+#                             #
+# # # # # # # # # # # # # # # #
+
+# os drivers só são importados no primeiro uso: "import nsds" não carrega cx_Oracle/sqlalchemy
+# e scripts apenas sqlite funcionam em máquinas sem o Oracle client.
+# nome do backend -> {"module": módulo do driver, "on_load": callbacks executados após o import}
+_backends = {}
+_loaded = {}
+_lock = threading.RLock()
+
+
+def register_backend(name, module, on_load=None):
+    """
+    Registra um backend carregado sob demanda
+
+    inputs:
+    :: name [str] -> nome do backend (e.g. "oracle", "sqlite", "sqlalchemy")
+    :: module [str] -> módulo do driver (e.g. "cx_Oracle")
+    :: on_load [callable] -> função que recebe o módulo importado (e.g. registro dos tipos de conector)
+    """
+
+    with _lock:
+        backend = _backends.setdefault(name, {'module': module, 'on_load': []})
+        backend['module'] = module
+        if on_load:
+            backend['on_load'].append(on_load)
+            if name in _loaded:
+                on_load(_loaded[name])
+
+
+def load(name):
+    """
+    Módulo do driver do backend name, importado (e com os callbacks executados) no primeiro uso
+
+    inputs:
+    :: name [str] -> nome do backend
+
+    output:
+    :: [module] driver
+    """
+
+    try:
+        return _loaded[name]
+    except KeyError:
+        pass
+
+    with _lock:
+        if name in _loaded:
+            return _loaded[name]
+        try:
+            backend = _backends[name]
+        except KeyError:
+            print(f'Backend não registrado: {name} | registrados: {sorted(_backends)}')
+            raise
+        try:
+            module = importlib.import_module(backend['module'])
+        except ImportError:
+            print(f'Driver {backend["module"]} do backend {name} não instalado')
+            raise
+        for on_load in backend['on_load']:
+            on_load(module)
+        _loaded[name] = module
+        return module
+
+
+def load_module(module_name):
+    """
+    Carrega o backend cujo driver é module_name (e.g. ao receber um conector criado fora do nsds).
+    Retorna o nome do backend ou None se nenhum usa esse módulo
+    """
+
+    top = module_name.split('.')[0].lower()
+    for name, backend in list(_backends.items()):
+        if backend['module'].lower() == top:
+            load(name)
+            return name
+    return None
+
+
+def is_loaded(name):
+    """Se o driver do backend name já foi importado"""
+
+    return name in _loaded
+
+
+def list_backends():
+    """Backends registrados: nome -> (módulo do driver, carregado)"""
+
+    return {name: (backend['module'], name in _loaded) for name, backend in _backends.items()}
@@ -0,0 +1,248 @@
+import datetime
+import decimal
+import functools
+
+
+# # # # # # # # # # # # # # # # #
+#                               #
+#   CONVERSÃO PARA BIND         #
+#                               #
+# # # # # # # # # # # # # # # # #
+
+# cada coluna é convertida uma vez, de forma vetorizada, para tipos nativos do python aceitos pelos drivers:
+# NaN/NaT/NA -> None, datetime64 -> datetime.datetime (oracle) ou texto ISO (sqlite), com fuso convertidas para UTC, bool -> 0/1,
+# categorias -> códigos indexando a lista de categorias já convertidas. sem isso, valores como np.int64,
+# pd.Timestamp ou NaN chegam ao driver um a um (ou falham no bind)
+
+PLAN_CACHE_SIZE = 256
+
+
+def _with_nulls(values, mask):
+    # lista de values (np.ndarray) com None nas posições de mask
+    rows = values.tolist()
+    if mask is not None:
+        for i in mask.nonzero()[0].tolist():
+            rows[i] = None
+    return rows
+
+
+def _scalar(value, db):
+    # valor isolado de uma coluna object (tipos mistos): escalares numpy/pandas para tipos do python
+    import numpy as np
+    import pandas as pd
+
+    if isinstance(value, np.datetime64):
+        value = pd.Timestamp(value)
+    elif isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, pd.Timestamp):
+        value = value.to_pydatetime()
+    if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+        # o driver ignora o fuso do datetime: o instante vai em UTC, como nas colunas datetime64 com fuso
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    if isinstance(value, bool):
+        return int(value)
+    if db == 'sqlite' and isinstance(value, datetime.datetime):
+        return value.isoformat(' ')
+    if db == 'sqlite' and isinstance(value, decimal.Decimal):
+        return float(value) # o sqlite3 não aceita Decimal no bind
+    return value
+
+
+def _numeric(series, db):
+    values = series.to_numpy()
+    return lambda start, stop: values[start:stop].tolist()
+
+
+def _bool(series, db):
+    values = series.to_numpy().view('uint8')
+    return lambda start, stop: values[start:stop].tolist()
+
+
+def _float(series, db):
+    import numpy as np
+
+    values = series.to_numpy()
+    mask = np.isnan(values)
+    if not mask.any():
+        return lambda start, stop: values[start:stop].tolist()
+    return lambda start, stop: _with_nulls(values[start:stop], mask[start:stop])
+
+
+def _masked(series, db):
+    # Int64, Float64, boolean: dados numpy + máscara de nulos
+    import numpy as np
+
+    mask = series.isna().to_numpy()
+    dtype = series.dtype.numpy_dtype
+    if dtype.kind == 'b':
+        values = series.to_numpy(dtype='uint8', na_value=0)
+    elif dtype.kind == 'f':
+        values = series.to_numpy(dtype=dtype, na_value=np.nan)
+        mask |= np.isnan(values)
+    else:
+        values = series.to_numpy(dtype=dtype, na_value=0)
+    if not mask.any():
+        return lambda start, stop: values[start:stop].tolist()
+    return lambda start, stop: _with_nulls(values[start:stop], mask[start:stop])
+
+
+def _datetime(series, db):
+    import numpy as np
+
+    if getattr(series.dtype, 'tz', None) is not None:
+        # instante em UTC, sem fuso: a coluna é declarada TIMESTAMP (UTC) em schema.infer_column
+        series = series.dt.tz_convert('UTC').dt.tz_localize(None)
+    values = series.to_numpy(dtype='datetime64[us]')
+    if db != 'sqlite':
+        # datetime64[us] -> datetime.datetime, com NaT -> None
+        return lambda start, stop: values[start:stop].astype(object).tolist()
+
+    # sqlite: texto no formato do adaptador padrão do sqlite3 ("YYYY-MM-DD HH:MM:SS[.ffffff]")
+    mask = np.isnat(values)
+    fraction = values.view('int64')[~mask] % 1000000
+    unit = 'us' if fraction.any() else 's'
+
+    def convert(start, stop):
+        text = np.char.replace(np.datetime_as_string(values[start:stop], unit=unit), 'T', ' ')
+        return _with_nulls(text, mask[start:stop])
+    return convert
+
+
+def _timedelta(series, db):
+    # intervalos como segundos (float)
+    return _float(series.dt.total_seconds().astype('float64'), db)
+
+
+def _category(series, db):
+    # as categorias são convertidas uma única vez; cada lote é um take dos códigos (-1, nulo, aponta para o None final)
+    import numpy as np
+    import pandas as pd
+
+    categories = pd.Series(series.dtype.categories)
+    lookup = np.empty(len(categories) + 1, dtype=object)
+    lookup[:-1] = get_converter(categories.dtype)(categories, db)(0, len(categories)) if len(categories) else []
+    lookup[-1] = None
+    codes = series.cat.codes.to_numpy()
+    return lambda start, stop: lookup[codes[start:stop]].tolist()
+
+
+def _string(series, db):
+    values = series.to_numpy(dtype=object, na_value=None)
+    return lambda start, stop: values[start:stop].tolist()
+
+
+def _object(series, db):
+    import pandas as pd
+
+    values = series.to_numpy(dtype=object)
+    mask = pd.isna(values)
+    has_nulls = mask.any()
+    if pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'bytes', 'empty'):
+        # tipos não textuais (escalares numpy, Timestamps, bool, mistos): normalizados valor a valor
+        values = values.copy()
+        values[~mask] = [_scalar(v, db) for v in values[~mask]]
+    if not has_nulls:
+        return lambda start, stop: values[start:stop].tolist()
+    return lambda start, stop: _with_nulls(values[start:stop], mask[start:stop])
+
+
+def _kind(dtype):
+    import numpy as np
+    import pandas as pd
+    from pandas.api import types as pdt
+
+    numpy_dtype = isinstance(dtype, np.dtype)
+    if isinstance(dtype, pd.CategoricalDtype):
+        return 'category'
+    if pdt.is_bool_dtype(dtype):
+        return 'bool' if numpy_dtype else 'masked'
+    if pdt.is_integer_dtype(dtype):
+        return 'numeric' if numpy_dtype else 'masked'
+    if pdt.is_float_dtype(dtype):
+        return 'float' if numpy_dtype else 'masked'
+    if pdt.is_datetime64_any_dtype(dtype):
+        return 'datetime'
+    if pdt.is_timedelta64_dtype(dtype):
+        return 'timedelta'
+    if isinstance(dtype, pd.StringDtype):
+        return 'string'
+    return 'object'
+
+
+_CONVERTERS = {
+    'numeric': _numeric,
+    'bool': _bool,
+    'float': _float,
+    'masked': _masked,
+    'datetime': _datetime,
+    'timedelta': _timedelta,
+    'category': _category,
+    'string': _string,
+    'object': _object,
+}
+
+
+def get_converter(dtype):
+    """
+    Conversor de uma coluna de tipo dtype: função (series, db) que prepara a coluna inteira e retorna
+    uma função (start, stop) com a lista de valores prontos para bind do intervalo de linhas
+    """
+
+    return _CONVERTERS[_kind(dtype)]
+
+
+@functools.lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _get_plan(dtypes):
+    return tuple(get_converter(dtype) for dtype in dtypes)
+
+
+def get_plan(df):
+    """
+    Plano de conversão de df: um conversor por coluna (ver get_converter). O plano é guardado por tupla de dtypes,
+    então cargas repetidas de DataFrames com o mesmo formato não refazem a classificação das colunas
+
+    inputs:
+    :: df [pd.DataFrame] -> dados a serem inseridos
+
+    output:
+    :: [tuple] conversores, na ordem das colunas
+    """
+
+    dtypes = tuple(df.dtypes)
+    try:
+        return _get_plan(dtypes)
+    except TypeError: # dtype não hashable
+        return tuple(get_converter(dtype) for dtype in dtypes)
+
+
+def plan_cache_info():
+    """Estatísticas do cache de planos (hits, misses, maxsize, currsize)"""
+
+    return _get_plan.cache_info()
+
+
+def iter_rows(df, batch_size, db='oracle'):
+    """
+    Lotes de linhas de df prontos para o executemany, convertidos coluna a coluna pelo plano de df
+
+    inputs:
+    :: df [pd.DataFrame] -> dados a serem inseridos
+    :: batch_size [int] -> número máximo de linhas por lote
+    :: db [str] -> banco de destino ('oracle', 'sqlite'): define a representação das datas
+
+    output:
+    :: [generator] de listas de tuplas
+    """
+
+    columns = [convert(df.iloc[:, j], db) for j, convert in enumerate(get_plan(df))]
+    n = len(df)
+    for start in range(0, n, batch_size):
+        stop = min(start + batch_size, n)
+        yield list(zip(*[column(start, stop) for column in columns]))
+
+
+def to_rows(df, db='oracle'):
+    """Todas as linhas de df como uma lista de tuplas prontas para bind (ver iter_rows)"""
+
+    return [row for batch in iter_rows(df, max(len(df), 1), db=db) for row in batch]
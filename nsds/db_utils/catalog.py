@@ -0,0 +1,280 @@
+import time
+import threading
+
+from . import helpers
+from . import tracing
+
+
+# # # # # # # # # # # # # # # #
+#                             #
+#   CACHE DE METADADOS        #
+#                             #
+# # # # # # # # # # # # # # # #
+
+# um catálogo por (banco, visões consultadas): conexões ao mesmo banco (usuário@dsn no oracle, arquivo no sqlite)
+# compartilham o catálogo, e o registro não guarda referência às conexões (sqlite3/cx_Oracle não aceitam weakref)
+_catalogs = {} # (banco, tables) -> Catalog
+_lock = threading.Lock()
+
+# limite de binds em uma lista IN do oracle (ORA-01795)
+MAX_IN_LIST = 1000
+
+
+class Catalog:
+    """
+    Cópia em memória de owner/tabela/colunas do banco, para consultas de metadados sem ir ao banco.
+
+    Oracle: carregado de {tables}_objects/{tables}_tab_cols e atualizado incrementalmente pelo last_ddl_time.
+    SQLite: carregado do sqlite_master/pragma table_info e recarregado por inteiro (é local e barato).
+
+    inputs:
+    :: sql_connector [connector object] -> conector ao banco, usado nas atualizações quando as consultas
+       não informam outro (os catálogos de get_catalog não guardam conector e o recebem em cada consulta)
+    :: tables [str] -> visões do dicionário utilizadas no oracle | "dba" (default), "all", "user"
+    :: ttl [float] -> segundos até a próxima atualização com o banco | default: 600
+    """
+
+    def __init__(self, sql_connector, tables='dba', ttl=600):
+        db, _, _ = helpers.get_db_module_connectortype(sql_connector)
+        self.db = db.lower().split('+')[0]
+        if self.db not in ('oracle', 'sqlite'):
+            raise NotImplementedError
+        self.sql_connector = sql_connector
+        self.tables = tables
+        self.ttl = ttl
+
+        self._objects = {} # (owner, nome) -> (tipo, colunas)
+        self._names = [] # chaves de _objects, para a busca por substring
+        self._by_name = {} # nome em maiúsculas -> chaves de _objects, para a busca exata
+        self._stale = set() # nomes invalidados desde a última atualização
+        self._last_ddl_time = None
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+
+    def _connector(self, sql_connector):
+        sql_connector = sql_connector if sql_connector is not None else self.sql_connector
+        if sql_connector is None:
+            print('Catálogo sem conector: informar sql_connector na consulta')
+            raise ValueError
+        return sql_connector
+
+    def _execute(self, sql_connector, q, params=None):
+        cursor = helpers.get_cursor(sql_connector)
+        return tracing.execute(cursor, q, params).fetchall()
+
+    def _load_oracle(self, sql_connector, since=None, names=None):
+        owner = 'owner' if self.tables != 'user' else 'user'
+        # >= pois last_ddl_time tem resolução de segundos: recarrega alguns objetos a mais, mas não perde nenhum
+        filters, params = '', {}
+        if since:
+            filters, params = 'and last_ddl_time >= :since', {'since': since}
+        elif names and len(names) > MAX_IN_LIST:
+            objects = {}
+            for i in range(0, len(names), MAX_IN_LIST):
+                objects.update(self._load_oracle(sql_connector, names=names[i:i + MAX_IN_LIST]))
+            return objects
+        elif names:
+            binds = [f':n{i}' for i in range(len(names))]
+            filters, params = f'and object_name in ({", ".join(binds)})', {f'n{i}': n for i, n in enumerate(names)}
+        objects = self._execute(sql_connector, f"""
+        select
+            {owner}, object_name, object_type, last_ddl_time
+        from
+            {self.tables}_objects
+        where
+            object_type in ('TABLE', 'VIEW') {filters}
+        """, params)
+        if not objects:
+            return {}
+
+        join = ''
+        if filters:
+            join = f"""
+            inner join {self.tables}_objects o 
+                on o.object_name = c.table_name {'and o.owner = c.owner' if self.tables != 'user' else ''}
+                and o.object_type in ('TABLE', 'VIEW') {filters.replace('last_ddl_time', 'o.last_ddl_time').replace('object_name', 'o.object_name')}
+            """
+        columns = {}
+        for col_owner, table_name, column_name in self._execute(sql_connector, f"""
+        select
+            {'c.owner' if self.tables != 'user' else 'user'}, c.table_name, c.column_name
+        from
+            {self.tables}_tab_cols c {join}
+        order by
+            c.table_name, c.column_id
+        """, params):
+            columns.setdefault((col_owner, table_name), []).append(column_name)
+
+        last_ddl_time = max(o[3] for o in objects)
+        if not self._last_ddl_time or last_ddl_time > self._last_ddl_time:
+            self._last_ddl_time = last_ddl_time
+        return {(o[0], o[1]): (o[2], tuple(columns.get((o[0], o[1]), ()))) for o in objects}
+
+    def _load_sqlite(self, sql_connector, names=None):
+        objects = {}
+        for name, object_type in self._execute(sql_connector, "SELECT name, type FROM sqlite_master WHERE type in ('table', 'view')"):
+            if names is not None and name.upper() not in names:
+                continue
+            columns = tuple(c[1] for c in self._execute(sql_connector, f'PRAGMA table_info("{name}")'))
+            objects[(None, name)] = (object_type.upper(), columns)
+        return objects
+
+    def refresh(self, full=False, sql_connector=None):
+        """
+        Atualiza o catálogo com o banco (pelo sql_connector informado ou o da criação). Sem full, o oracle traz
+        apenas objetos com DDL após a última atualização (mais a lista de nomes para detectar drops) e o sqlite
+        apenas os objetos invalidados.
+        """
+
+        sql_connector = self._connector(sql_connector)
+        with self._lock:
+            if full or self._refreshed_at is None:
+                objects = self._load_oracle(sql_connector) if self.db == 'oracle' else self._load_sqlite(sql_connector)
+            elif self.db == 'oracle':
+                objects = dict(self._objects)
+                owner = 'owner' if self.tables != 'user' else 'user'
+                existing = set(self._execute(sql_connector, f"select {owner}, object_name from {self.tables}_objects where object_type in ('TABLE', 'VIEW')"))
+                objects = {k: v for k, v in objects.items() if k in existing and k[1] not in self._stale}
+                objects.update(self._load_oracle(sql_connector, since=self._last_ddl_time))
+                missing = sorted({k[1] for k in existing if k not in objects})
+                if missing: # invalidados sem alteração de last_ddl_time
+                    objects.update(self._load_oracle(sql_connector, names=missing))
+            else:
+                objects = {k: v for k, v in self._objects.items() if k[1].upper() not in self._stale}
+                if self._stale:
+                    current = {name.upper() for name, in self._execute(sql_connector, "SELECT name FROM sqlite_master WHERE type in ('table', 'view')")}
+                    objects = {k: v for k, v in objects.items() if k[1].upper() in current}
+                    objects.update(self._load_sqlite(sql_connector, names=self._stale & current))
+                else:
+                    objects = self._load_sqlite(sql_connector)
+
+            self._objects = objects
+            self._names = sorted(objects)
+            self._by_name = {}
+            for key in self._names:
+                self._by_name.setdefault(key[1].upper(), []).append(key)
+            self._stale = set()
+            self._refreshed_at = time.monotonic()
+
+    def invalidate(self, table_name=None):
+        """Marca table_name (ou o catálogo inteiro, se None) para ser recarregado na próxima consulta"""
+
+        with self._lock:
+            if table_name is None:
+                self._refreshed_at = None
+            else:
+                self._stale.add(table_name.split('.')[-1].upper())
+
+    def _check(self, sql_connector):
+        if self._refreshed_at is None or self._stale or time.monotonic() - self._refreshed_at > self.ttl:
+            self.refresh(sql_connector=sql_connector)
+
+    def find_table(self, partial_table_name=None, sql_connector=None):
+        """Mesmo retorno de db_utils.find_table, a partir do catálogo"""
+
+        self._check(sql_connector)
+        partial = (partial_table_name or '').upper()
+        matches = [k for k in self._names if self._objects[k][0] == 'TABLE' and partial in k[1].upper()]
+        if self.db == 'oracle' and self.tables != 'user':
+            return matches
+        return [(name,) for _, name in matches]
+
+    def table_exists(self, table_name, owner=None, sql_connector=None):
+        """Mesmo retorno de db_utils.table_exists, a partir do catálogo"""
+
+        self._check(sql_connector)
+        if '.' in table_name:
+            owner, table_name = table_name.split('.')
+        keys = self._by_name.get(table_name.upper(), [])
+        if self.db == 'sqlite':
+            return any(name == table_name and self._objects[(o, name)][0] == 'TABLE' for o, name in keys)
+        owner = owner.upper() if owner else None
+        return any(not owner or o == owner for o, _ in keys)
+
+    def find_column(self, partial_column_name, partial_table_name=None, sql_connector=None):
+        """Mesmo retorno de db_utils.find_column, a partir do catálogo"""
+
+        self._check(sql_connector)
+        partial_column = partial_column_name.upper()
+        partial_table = (partial_table_name or '').upper()
+        with_owner = self.db == 'oracle' and self.tables != 'user'
+        matches = []
+        for owner, name in self._names:
+            object_type, columns = self._objects[(owner, name)]
+            if object_type != 'TABLE' or partial_table not in name.upper():
+                continue
+            for column in columns:
+                if partial_column in column.upper():
+                    matches.append((owner, name, column) if with_owner else (name, column))
+        return matches
+
+
+def _database(sql_connector):
+    # identificação do banco de sql_connector: usuário@dsn no oracle e o arquivo no sqlite.
+    # None para bancos sqlite em memória, que existem apenas na própria conexão
+    db, module, _ = helpers.get_db_module_connectortype(sql_connector)
+    connection = helpers.get_connection(sql_connector)
+    if module == 'sqlalchemy':
+        url = getattr(connection, 'url', None) or connection.engine.url
+        return None if url.drivername.startswith('sqlite') and url.database in (None, '', ':memory:') else str(url)
+    if db.lower().startswith('oracle'):
+        return f'{connection.username}@{connection.dsn}'.upper()
+    cursor = helpers.get_cursor(sql_connector)
+    files = {name: file for _, name, file in tracing.execute(cursor, 'PRAGMA database_list').fetchall()}
+    return files.get('main') or None
+
+
+def get_catalog(sql_connector, tables='dba', ttl=600):
+    """
+    Catálogo do processo para o banco de sql_connector, criado no primeiro uso. As consultas ao catálogo devem
+    informar o conector (e.g. get_catalog(c).table_exists("T", sql_connector=c)); o registro não guarda conexões.
+    Bancos sqlite em memória recebem um catálogo novo, com o próprio conector, a cada chamada
+
+    inputs:
+    :: sql_connector [connector object] -> conector ao banco
+    :: tables [str] -> visões do dicionário utilizadas no oracle | "dba" (default), "all", "user"
+    :: ttl [float] -> segundos até a próxima atualização com o banco (só tem efeito na criação) | default: 600
+
+    output:
+    :: [Catalog]
+    """
+
+    database = _database(sql_connector)
+    if database is None:
+        return Catalog(sql_connector, tables=tables, ttl=ttl)
+
+    key = (database, tables)
+    with _lock:
+        if key not in _catalogs:
+            _catalogs[key] = Catalog(sql_connector, tables=tables, ttl=ttl)
+            _catalogs[key].sql_connector = None # o conector vem em cada consulta
+        return _catalogs[key]
+
+
+def invalidate(sql_connector, table_name=None):
+    """
+    Invalida table_name (ou tudo, se None) nos catálogos já criados para o banco de sql_connector.
+    Chamado por create_table e drop_table.
+    """
+
+    with _lock:
+        if not _catalogs:
+            return
+    database = _database(sql_connector)
+    with _lock:
+        catalogs = [c for (d, _), c in _catalogs.items() if d == database]
+    for c in catalogs:
+        c.invalidate(table_name)
+
+
+def drop_catalogs(sql_connector=None):
+    """Descarta os catálogos do banco de sql_connector (ou todos, se None)"""
+
+    if sql_connector is None:
+        with _lock:
+            _catalogs.clear()
+        return
+    database = _database(sql_connector)
+    with _lock:
+        for key in [k for k in _catalogs if k[0] == database]:
+            del _catalogs[key]
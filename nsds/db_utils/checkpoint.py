@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import hashlib
+
+from . import config
+from . import db_utils
+from . import helpers
+from . import schema
+from . import tracing
+
+
+# # # # # # # # # # # # # # # # #
+#                               #
+#   CARGAS COM CHECKPOINT       #
+#                               #
+# # # # # # # # # # # # # # # # #
+
+# estado de uma carga: {"table", "content_hash", "batch_size", "rows", "batches", "base_rows", "updated_at"}.
+# "rows"/"batches" são gravados antes de cada commit; "base_rows" é a contagem da tabela no início da carga
+
+
+def content_hash(df):
+    """Hash do conteúdo de df (colunas, índice e valores): identifica a carga a ser retomada"""
+
+    import pandas as pd
+
+    digest = hashlib.sha1(json.dumps([str(c) for c in df.columns]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def _count(sql_connector, table_name):
+    return tracing.execute(helpers.get_cursor(sql_connector), f'SELECT count(*) FROM {table_name}').fetchone()[0]
+
+
+class StateFile:
+    """
+    Estado da carga em um arquivo json local, gravado de forma atômica antes de cada commit.
+    Uma queda entre a gravação e o commit deixa o arquivo um lote à frente do banco, por isso a retomada
+    usa a contagem da tabela (count(*) - base_rows) como verdade: não deve haver outras cargas na tabela ao mesmo tempo.
+
+    inputs:
+    :: path [str] -> arquivo de estado | default: "<table_name>.checkpoint.json" no diretório atual
+    """
+
+    exact = False
+
+    def __init__(self, path=None):
+        self.path = path
+
+    def _path(self, table_name):
+        return self.path or f'{table_name}.checkpoint.json'
+
+    def load(self, table_name, sql_connector):
+        path = self._path(table_name)
+        if not os.path.exists(path):
+            return None
+        with open(path) as fp:
+            state = json.load(fp)
+        return state if state.get('table') == table_name else None
+
+    def save(self, state, sql_connector):
+        config.write_json_atomic(self._path(state['table']), state)
+
+    def clear(self, table_name, sql_connector):
+        path = self._path(table_name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class ControlTable:
+    """
+    Estado da carga em uma tabela de controle do próprio banco, gravado na mesma transação de cada lote:
+    a retomada é exata, sem contagem da tabela de destino
+
+    inputs:
+    :: control_table [str] -> tabela de controle (criada se não existir) | default: "NSDS_LOAD_STATE"
+    """
+
+    exact = True
+    COLUMNS = ['TABLE_NAME', 'CONTENT_HASH', 'BATCH_SIZE', 'ROWS_DONE', 'BATCHES', 'BASE_ROWS', 'UPDATED_AT']
+    TYPES = {
+        'oracle': ['VARCHAR2(128)', 'VARCHAR2(40)', 'NUMBER', 'NUMBER', 'NUMBER', 'NUMBER', 'NUMBER'],
+        'sqlite': ['TEXT', 'TEXT', 'INTEGER', 'INTEGER', 'INTEGER', 'INTEGER', 'REAL'],
+    }
+
+    def __init__(self, control_table='NSDS_LOAD_STATE'):
+        self.control_table = control_table
+
+    def _ensure(self, sql_connector):
+        if not db_utils.table_exists(sql_connector, self.control_table):
+            db, _, _ = helpers.get_db_module_connectortype(sql_connector)
+            db_utils.create_table(self.control_table, sql_connector, cols=self.COLUMNS, types=self.TYPES[db.lower()])
+
+    def load(self, table_name, sql_connector):
+        self._ensure(sql_connector)
+        q = f'SELECT {", ".join(self.COLUMNS)} FROM {self.control_table} WHERE TABLE_NAME = :table_name'
+        row = tracing.execute(helpers.get_cursor(sql_connector), q, {'table_name': table_name}).fetchone()
+        if row is None:
+            return None
+        keys = ['table', 'content_hash', 'batch_size', 'rows', 'batches', 'base_rows', 'updated_at']
+        return dict(zip(keys, row))
+
+    def save(self, state, sql_connector):
+        # sem commit: o commit do lote grava o estado junto
+        cursor = helpers.get_cursor(sql_connector)
+        tracing.execute(cursor, f'DELETE FROM {self.control_table} WHERE TABLE_NAME = :table_name', {'table_name': state['table']})
+        q = f"""
+        INSERT INTO {self.control_table} ({", ".join(self.COLUMNS)})
+        VALUES (:table_name, :content_hash, :batch_size, :rows_done, :batches, :base_rows, :updated_at)
+        """
+        tracing.execute(cursor, q, {
+            'table_name': state['table'], 'content_hash': state['content_hash'], 'batch_size': state['batch_size'],
+            'rows_done': state['rows'], 'batches': state['batches'], 'base_rows': state['base_rows'], 'updated_at': state['updated_at']
+        })
+
+    def clear(self, table_name, sql_connector):
+        tracing.execute(helpers.get_cursor(sql_connector), f'DELETE FROM {self.control_table} WHERE TABLE_NAME = :table_name',
+                        {'table_name': table_name})
+        helpers.get_connection(sql_connector).commit()
+
+
+def get_store(checkpoint):
+    """StateFile/ControlTable a partir do argumento checkpoint de insert_df (True, path do arquivo de estado ou store)"""
+
+    if checkpoint is True:
+        return StateFile()
+    if isinstance(checkpoint, str):
+        return StateFile(checkpoint)
+    return checkpoint
+
+
+def load_df(df, table_name, sql_connector, checkpoint=True, if_exists='fail', batch_size=100000, direct_path=False,
+            batch_errors=False, v=False):
+    """
+    Carga de df em table_name com commit a cada lote e registro do progresso. Se uma carga do mesmo conteúdo
+    (ver content_hash) foi interrompida, retoma a partir do último lote gravado, sem duplicar linhas.
+
+    inputs:
+    :: df [pd.DataFrame] -> dados a serem inseridos
+    :: table_name [str] -> tabela de destino
+    :: sql_connector [connector object] -> conexão ou cursor cx_Oracle/sqlite3
+    :: checkpoint [bool, str ou store] -> True (arquivo "<table_name>.checkpoint.json"), path do arquivo de estado,
+       StateFile ou ControlTable
+    :: if_exists [str] -> "fail", "replace" ou "append", aplicado apenas no início de uma carga nova
+    :: batch_size [int] -> linhas por lote (e por commit) | default: 100000
+    :: direct_path, batch_errors -> ver insert_batches
+    :: v [bool] -> imprime a retomada e as estatísticas da carga
+
+    output:
+    :: [dict] com estatísticas da carga (ver insert_batches) e "resumed_from" (linha de onde a carga continuou)
+    """
+
+    store = get_store(checkpoint)
+    if batch_errors and not store.exact:
+        # linhas rejeitadas não entram na contagem da tabela, que é a referência da retomada com StateFile
+        print('batch_errors com checkpoint exige ControlTable')
+        raise NotImplementedError
+    db, _, _ = helpers.get_db_module_connectortype(sql_connector)
+    df_schema = schema.infer_schema(df, db=db)
+    columns = [c.upper() for c in df.columns]
+    types = [c['type'].upper() for c in df_schema]
+    digest = content_hash(df)
+
+    state = store.load(table_name, sql_connector)
+    if state and state['content_hash'] != digest:
+        print(f'{table_name}: existe uma carga interrompida de outro conteúdo ({state["rows"]} linhas gravadas). '
+              f'Trate as linhas já carregadas e remova o estado com clear antes de uma nova carga')
+        raise ValueError
+
+    if state:
+        done = state['rows'] if store.exact else _count(sql_connector, table_name) - state['base_rows']
+        if v:
+            print(f'{table_name}: retomando a carga a partir da linha {done}')
+    else:
+        if db_utils.table_exists(sql_connector, table_name):
+            if if_exists == 'replace':
+                db_utils.drop_table(table_name, sql_connector)
+                db_utils.create_table(table_name, sql_connector, cols=columns, types=types)
+            elif if_exists == 'fail':
+                print('Tabela já existe')
+                raise Exception
+        else:
+            db_utils.create_table(table_name, sql_connector, cols=columns, types=types)
+        done = 0
+        state = {'table': table_name, 'content_hash': digest, 'batch_size': batch_size, 'rows': 0, 'batches': 0,
+                 'base_rows': _count(sql_connector, table_name), 'updated_at': time.time()}
+        store.save(state, sql_connector)
+        helpers.get_connection(sql_connector).commit()
+
+    state_batches = state['batches']
+
+    def on_commit(rows, batches):
+        state.update(rows=done + rows, batches=state_batches + batches, batch_size=batch_size, updated_at=time.time())
+        store.save(state, sql_connector)
+
+    stats = db_utils.insert_batches(helpers.iter_df_batches(df.iloc[done:], batch_size, db), columns, table_name, sql_connector,
+                                    commit_every=1, input_sizes=schema.get_input_sizes(df_schema, db), direct_path=direct_path,
+                                    batch_errors=batch_errors, on_commit=on_commit, v=v)
+    store.clear(table_name, sql_connector)
+    stats['resumed_from'] = done
+    return stats
+
+
+def clear(table_name, sql_connector=None, checkpoint=True):
+    """
+    Remove o estado de uma carga interrompida (as linhas já gravadas permanecem na tabela)
+
+    inputs:
+    :: table_name [str] -> tabela de destino da carga
+    :: sql_connector [connector object] -> necessário para ControlTable
+    :: checkpoint [bool, str ou store] -> como em load_df
+    """
+
+    get_store(checkpoint).clear(table_name, sql_connector)
@@ -0,0 +1,248 @@
+import operator
+
+from . import backends
+from . import helpers
+from . import tracing
+
+
+# # # # # # # # # # # # # # # # #
+#                               #
+#   LEITURA EM COLUNAS (NUMPY)  #
+#                               #
+# # # # # # # # # # # # # # # # #
+
+# maior precisão de NUMBER inteiro que cabe em int64
+INT64_MAX_PRECISION = 18
+
+# valor gravado nas posições nulas por tipo de array (a máscara guarda quais são nulas)
+_NULL_FILL = {'i': 0, 'u': 0, 'b': False, 'f': float('nan'), 'M': None}
+
+
+def _oracle_dtype(cx_Oracle, type_code, precision, scale):
+    # dtype numpy de uma coluna oracle a partir do cursor.description
+    if type_code is cx_Oracle.DB_TYPE_NUMBER:
+        return 'int64' if scale == 0 and 0 < (precision or 0) <= INT64_MAX_PRECISION else 'float64'
+    if type_code is cx_Oracle.DB_TYPE_BINARY_INTEGER:
+        return 'int64'
+    if type_code in (cx_Oracle.DB_TYPE_BINARY_DOUBLE, cx_Oracle.DB_TYPE_BINARY_FLOAT):
+        return 'float64'
+    if type_code in (cx_Oracle.DB_TYPE_DATE, cx_Oracle.DB_TYPE_TIMESTAMP):
+        return 'datetime64[us]'
+    return 'object'
+
+
+def _oracle_output_handler(cx_Oracle):
+    # NUMBER chega direto como int/float do python (sem Decimal/str intermediário nem tipos mistos por valor)
+    def handler(cursor, name, default_type, size, precision, scale):
+        if default_type is cx_Oracle.DB_TYPE_NUMBER:
+            python_type = int if scale == 0 and 0 < (precision or 0) <= INT64_MAX_PRECISION else float
+            return cursor.var(python_type, arraysize=cursor.arraysize)
+    return handler
+
+
+def _value_dtype(values):
+    # dtype de uma coluna sem tipo declarado (sqlite): pelo primeiro valor não nulo do lote
+    for v in values:
+        if v is None:
+            continue
+        if isinstance(v, bool):
+            return 'bool'
+        if isinstance(v, int):
+            return 'int64'
+        if isinstance(v, float):
+            return 'float64'
+        return 'object'
+    return 'float64'
+
+
+class _Column:
+    """Array preenchido por lotes, com capacidade dobrada quando necessário e máscara de nulos criada no primeiro nulo"""
+
+    def __init__(self, dtype, capacity, typed):
+        import numpy as np
+
+        self.values = np.empty(capacity, dtype=dtype)
+        self.mask = None
+        self.typed = typed # tipo vindo do banco: os valores não precisam ser checados
+
+    def reserve(self, size):
+        import numpy as np
+
+        if size > len(self.values):
+            capacity = max(size, 2 * len(self.values))
+            values = np.empty(capacity, dtype=self.values.dtype)
+            values[:len(self.values)] = self.values
+            self.values = values
+            if self.mask is not None:
+                mask = np.zeros(capacity, dtype=bool)
+                mask[:len(self.mask)] = self.mask
+                self.mask = mask
+
+    def fill(self, pos, values):
+        import numpy as np
+
+        n = len(values)
+        kind = self.values.dtype.kind
+        if kind != 'O' and None in values:
+            self.set_mask(pos, np.fromiter((v is None for v in values), dtype=bool, count=n))
+            fill = _NULL_FILL[kind]
+            values = [fill if v is None else v for v in values]
+
+        if not self.typed and kind != 'O':
+            # sem tipo declarado, um lote pode trazer valores de outro tipo (e.g. float em coluna inteira)
+            segment = np.asarray(values)
+            if segment.dtype.kind in 'iufb' and kind in 'iufb':
+                promoted = np.promote_types(self.values.dtype, segment.dtype)
+            elif segment.dtype.kind in ('M', kind):
+                promoted = self.values.dtype
+            else:
+                promoted = np.dtype(object)
+            if promoted != self.values.dtype:
+                self.promote(promoted, pos)
+            values = segment if self.values.dtype.kind != 'O' else values
+        self.values[pos:pos + n] = values
+
+    def promote(self, dtype, filled):
+        values = self.values.astype(dtype)
+        if dtype.kind == 'O' and self.mask is not None:
+            values[:filled][self.mask[:filled]] = None
+        self.values = values
+
+    def set_mask(self, pos, mask):
+        import numpy as np
+
+        if self.mask is None:
+            self.mask = np.zeros(len(self.values), dtype=bool)
+        self.mask[pos:pos + len(mask)] = mask
+
+    def trim(self, size):
+        # fatias são views: nenhuma cópia dos dados
+        return self.values[:size], self.mask[:size] if self.mask is not None else None
+
+
+def _select(rows, idx, n_columns):
+    # linhas do lote apenas com as colunas idx (itemgetter roda em C; com uma coluna, vira uma lista de tuplas de 1)
+    if len(idx) == n_columns:
+        return rows
+    if len(idx) == 1:
+        j = idx[0]
+        return [(r[j],) for r in rows]
+    return list(map(operator.itemgetter(*idx), rows))
+
+
+def _fill_batch(columns, rows, pos):
+    """
+    Preenche as colunas com um lote de linhas. Colunas float64 e int64 são convertidas em bloco
+    (um único np.array 2D por tipo, sem transpor as tuplas em Python); as demais, ou lotes com nulos/tipos
+    inesperados em colunas inteiras, são preenchidas coluna a coluna
+    """
+
+    import numpy as np
+
+    groups = {}
+    for j, column in enumerate(columns):
+        groups.setdefault(column.values.dtype.str if column.values.dtype.kind in 'if' else None, []).append(j)
+
+    n = len(rows)
+    per_column = groups.pop(None, [])
+    for dtype, idx in groups.items():
+        sub = _select(rows, idx, len(columns))
+        try:
+            block = np.array(sub, dtype=dtype) if dtype[1] == 'f' else np.array(sub)
+        except (ValueError, TypeError):
+            block = None
+        if block is None or block.dtype.kind != dtype[1] or block.ndim != 2:
+            per_column.extend(idx) # nulos ou outros tipos em coluna inteira, textos em coluna float
+            continue
+        nulls = np.isnan(block) if dtype[1] == 'f' else None # float: nulos chegam como NaN
+        for k, j in enumerate(idx):
+            columns[j].values[pos:pos + n] = block[:, k]
+            if nulls is not None and nulls[:, k].any():
+                columns[j].set_mask(pos, nulls[:, k])
+
+    for j in per_column:
+        columns[j].fill(pos, [r[j] for r in rows])
+
+
+def read_arrays(sql_connector, q, params=None, arraysize=50000, nrows=None, as_df=False):
+    """
+    Executa a consulta q e preenche um array numpy por coluna, lote a lote (arraysize linhas por round trip),
+    sem montar DataFrames intermediários: a memória de pico é a dos arrays finais mais um lote.
+    Em colunas float, nulos e NaN são equivalentes (o sqlite já grava NaN como NULL). No oracle, um output type handler entrega NUMBER
+    diretamente como int/float; colunas NUMBER(p<=18, 0) viram int64 e as demais numéricas float64.
+
+    inputs:
+    :: sql_connector [connector object] -> conexão ou cursor cx_Oracle/sqlite3
+    :: q [str] -> consulta
+    :: params [dict ou list] -> parâmetros de bind da consulta
+    :: arraysize [int] -> linhas por fetch (cursor.arraysize) | default: 50000
+    :: nrows [int] -> número esperado de linhas, para alocar os arrays uma única vez | default: None (cresce sob demanda)
+    :: as_df [bool] -> retorna um DataFrame montado sobre os arrays (inteiros com nulos como Int64) | default: False
+
+    output:
+    :: [tuple] (arrays, masks): dict coluna -> np.ndarray e dict coluna -> máscara booleana de nulos
+       (apenas colunas com nulos), ou [pd.DataFrame] se as_df
+    """
+
+    cursor = helpers.get_cursor(sql_connector)
+    _, module, _ = helpers.get_db_module_connectortype(sql_connector)
+    owns_cursor = cursor is not sql_connector
+
+    if module not in ('cx_oracle', 'sqlite3'):
+        print(f'read_arrays não implementado para {module}')
+        raise NotImplementedError
+
+    cursor.arraysize = arraysize
+    cx_Oracle = backends.load('oracle') if module == 'cx_oracle' else None
+    if cx_Oracle:
+        previous_handler = cursor.outputtypehandler
+        cursor.outputtypehandler = _oracle_output_handler(cx_Oracle)
+
+    columns, size = None, 0
+    try:
+        tracing.execute(cursor, q, params)
+        names = [d[0] for d in cursor.description]
+        capacity = nrows or arraysize
+        if cx_Oracle:
+            columns = {
+                d[0]: _Column(_oracle_dtype(cx_Oracle, d[1], d[4], d[5]), capacity, typed=True) for d in cursor.description
+            }
+
+        while True:
+            rows = tracing.fetchmany(cursor, arraysize, q)
+            if not rows:
+                break
+            if columns is None:
+                columns = {name: _Column(_value_dtype(values), capacity, typed=False) for name, values in zip(names, zip(*rows))}
+            for column in columns.values():
+                column.reserve(size + len(rows))
+            _fill_batch([columns[name] for name in names], rows, size)
+            size += len(rows)
+    finally:
+        if cx_Oracle:
+            cursor.outputtypehandler = previous_handler
+        if owns_cursor:
+            cursor.close()
+
+    if columns is None:
+        columns = {name: _Column('object', 0, typed=False) for name in names}
+    arrays, masks = {}, {}
+    for name, column in columns.items():
+        arrays[name], mask = column.trim(size)
+        if mask is not None and mask.any():
+            masks[name] = mask
+
+    if not as_df:
+        return arrays, masks
+
+    import pandas as pd
+
+    data = {}
+    for name, values in arrays.items():
+        if name in masks and values.dtype.kind in 'iu':
+            data[name] = pd.arrays.IntegerArray(values, masks[name]) # inteiros com nulos sem conversão para float
+        elif name in masks and values.dtype.kind == 'b':
+            data[name] = pd.arrays.BooleanArray(values, masks[name])
+        else:
+            data[name] = values
+    return pd.DataFrame(data, copy=False)
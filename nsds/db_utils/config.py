@@ -0,0 +1,137 @@
+import os
+import json
+import copy
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # windows
+    fcntl = None
+    import msvcrt
+
+
+# # # # # # # # # # # # # # # #
+#                             #
+#   ARQUIVO DE CONEXÕES       #
+#                             #
+# # # # # # # # # # # # # # # #
+
+# se definida, contém o json de conexões e nenhum arquivo é lido (e.g. NSDS_CONNECTIONS='{"SAS_BIGDATA": {...}}')
+ENV_VAR = 'NSDS_CONNECTIONS'
+
+_cache = {} # path absoluto -> ((mtime_ns, size), conteúdo)
+_env_cache = {} # conteúdo da variável de ambiente -> json carregado
+_lock = threading.Lock()
+
+
+def read_config(config_filename='connections.json'):
+    """
+    Conteúdo do arquivo de conexões, relido apenas quando mtime ou tamanho do arquivo mudam.
+    Com a variável de ambiente NSDS_CONNECTIONS definida, o arquivo não é acessado.
+
+    inputs:
+    :: config_filename [str] -> arquivo com os dados de conexão
+
+    output:
+    :: [dict] cópia do conteúdo do arquivo (pode ser alterada por quem chama)
+    """
+
+    env_config = os.environ.get(ENV_VAR)
+    if env_config:
+        with _lock:
+            if env_config not in _env_cache:
+                _env_cache.clear()
+                _env_cache[env_config] = json.loads(env_config)
+            return copy.deepcopy(_env_cache[env_config])
+
+    path = os.path.abspath(config_filename)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == signature:
+            return copy.deepcopy(cached[1])
+
+    with open(path) as config_file:
+        connection_info = json.loads(config_file.read())
+    with _lock:
+        _cache[path] = (signature, connection_info)
+    return copy.deepcopy(connection_info)
+
+
+@contextmanager
+def _file_lock(path):
+    """Lock exclusivo entre processos sobre path, por meio do arquivo auxiliar path + '.lock'"""
+
+    with open(path + '.lock', 'a+') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def write_json_atomic(path, content):
+    """Escreve content em path por meio de um arquivo temporário + rename, sem deixar o arquivo pela metade"""
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(content, fp, indent=4)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp_path, path)
+    except:
+        os.remove(tmp_path)
+        raise
+
+
+def update_config(update, config_filename='connections.json', create=True):
+    """
+    Altera o arquivo de conexões com lock entre processos e escrita atômica
+
+    inputs:
+    :: update [callable] -> função que recebe o dict de conexões e o altera in-place
+    :: config_filename [str] -> arquivo com os dados de conexão
+    :: create [bool] -> se False, FileNotFoundError quando o arquivo não existe | default: True
+
+    output:
+    :: [dict] conteúdo salvo
+    """
+
+    path = os.path.abspath(config_filename)
+    with _lock, _file_lock(path):
+        # relido dentro do lock (e não do cache) para não sobrescrever alterações de outros processos
+        try:
+            with open(path) as config_file:
+                connection_info = json.loads(config_file.read())
+        except FileNotFoundError:
+            if not create:
+                raise
+            connection_info = {}
+
+        update(connection_info)
+        write_json_atomic(path, connection_info)
+
+        stat = os.stat(path)
+        _cache[path] = ((stat.st_mtime_ns, stat.st_size), copy.deepcopy(connection_info))
+    return connection_info
+
+
+def clear_cache():
+    """Descarta o conteúdo em cache dos arquivos de conexão"""
+
+    with _lock:
+        _cache.clear()
+        _env_cache.clear()
@@ -1,10 +1,21 @@
+from . import backends
+from . import binds
+from . import catalog
+from . import checkpoint as checkpoint_
+from . import config
+from . import failover
 from . import helpers
+from . import parallel
+from . import pool
+from . import schema
+from . import statements
+from . import sqlite_profiles
+from . import sync
+from . import tracing
 
-import pkg_resources
-import json
 import re
 import os
-import cx_Oracle, sqlite3, sqlalchemy
+import time
 
 
 # # # # # # # # # #
@@ -25,6 +36,8 @@ def blobs(a='a'):
 def get_connection_info(connection_name=None, config_filename='connections.json', v=True):
     """
     Obtém dados de conexão dada por connection name guardada no arquivo config_filename.
+    O arquivo é mantido em cache e relido apenas quando é alterado; com a variável de ambiente
+    NSDS_CONNECTIONS definida (json com as conexões), o arquivo não é lido.
 
     inputs:
     :: connection_name [str] -> nome da conexão
@@ -34,8 +47,7 @@ def get_connection_info(connection_name=None, config_filename='connections.json'
     :: [dict] com dados de conexão salvos no arquivo (e.g. "user", "password", "host" e "service")
     """
     try:
-        with open(config_filename) as config_file:
-            connection_info = json.loads(config_file.read())
+        connection_info = config.read_config(config_filename)
 
         if connection_name:
             return connection_info[connection_name.upper()]
@@ -66,19 +78,16 @@ def save_connection_info(connection_name, **kwargs):
     :: connection_string [str] -> se houver, será utilizada prioritariamente
     :: connection_name [str] -> nome da conexão 
     :: flavor [str] -> banco utilizado ('oracle', 'sqlite') 
+    :: port, dsn, retries, backoff -> apenas oracle: porta, DSNs alternativos e retry da conexão (ver connect_oracle)
+    :: profile, pragmas, busy_timeout -> apenas sqlite: perfil de desempenho e busy timeout de cada conexão (ver connect_sqlite)
     :: config_filename -> arquivo onde serão salvos os dados de conexão (default: connections.json)
     """
     config_filename = kwargs.pop('config_filename', 'connections.json')
 
-    try:
-        connection_info = get_connection_info(config_filename=config_filename, v=False)
-    except:
-        connection_info = {}
-    finally:
+    def update(connection_info):
         connection_info.update({connection_name.upper(): {k.lower(): v for k, v in kwargs.items()}})
 
-    with open(config_filename, 'w') as fp:
-        json.dump(connection_info, fp, indent=4)
+    config.update_config(update, config_filename=config_filename)
 
 
 def del_connection_info(connection_name, config_filename='connections.json'):
@@ -90,16 +99,25 @@ def del_connection_info(connection_name, config_filename='connections.json'):
     :: config_filename -> arquivo onde serão salvos os dados de conexão (default: "connections.json") 
     """
 
-    connection_info = get_connection_info(config_filename='connections.json', v=True)
-    del connection_info[connection_name.upper()]
-    with open(config_filename, 'w') as fp:
-        json.dump(connection_info, fp, indent=4)
+    def update(connection_info):
+        try:
+            del connection_info[connection_name.upper()]
+        except KeyError:
+            print(f'Conexão {connection_name} não encontrada em {config_filename}')
+            raise
+
+    try:
+        config.update_config(update, config_filename=config_filename, create=False)
+    except FileNotFoundError:
+        print(f'Arquivo {config_filename} não encontrado. Verificar se está na mesma pasta do script')
+        raise
 
 
 #
 # CONEXÃO
 #
 
+@tracing.traced('connect_oracle')
 def connect_oracle(connection_name=None, *connection_type, **kwargs):
     """
     Conexão com banco de dados Oracle
@@ -109,8 +127,16 @@ def connect_oracle(connection_name=None, *connection_type, **kwargs):
     :: *connection_type [str] -> define o tipo de conexão retornado | "connection" (default), "cursor", "engine", "all"
     :: config_filename -> arquivo onde serão salvos os dados de conexão (default: "connections.json")
     :: connection_info [dict] -> dicionario com campos "user", "password", "host" e "service"
-    :: user, password, host, service [str] -> infos de conexão inseridas individualmente
+    :: user, password, host, service [str] -> infos de conexão inseridas individualmente.
+       host aceita vários hosts ("h1,h2" ou lista, "host:porta" opcional), tentados em ordem (failover)
+    :: port [int] -> porta do listener | default: 1521
+    :: dsn [str ou list] -> DSNs usados no lugar de host/port/service (alias do tnsnames, descritor, ...)
+    :: retries [int] -> novas rodadas de tentativas por todos os DSNs em erros de rede/listener (ver failover.py) | default: 2
+    :: backoff [float] -> segundos antes da primeira nova rodada, dobrando a cada uma | default: 1
     :: encoding [str] -> encoding a ser utilizado na conexão | default: "utf-8"
+    :: stmtcachesize [int] -> statements mantidos preparados por conexão (cache do cliente) | default: 50
+    :: pooled [bool] -> se True, connection/cursor vêm do pool de connection_name (devolver com pool.release)
+       e a engine é compartilhada pelo processo | default: False
 
     output:
     :: objeto conector ou lista de objetos conectores definido por connection_type,
@@ -121,12 +147,17 @@ def connect_oracle(connection_name=None, *connection_type, **kwargs):
     # obtendo lista de conexões a serem retornadas
     connection_type = helpers.get_connection_type(connection_type, kwargs)
 
-    # obtendo enconding
+    # obtendo enconding e tamanho do cache de statements
     encoding = kwargs.pop('encoding', 'utf-8')
+    stmtcachesize = kwargs.pop('stmtcachesize', statements.DEFAULT_CACHE_SIZE)
+
+    # conexões do pool do processo (ver pool.py): connection/cursor são emprestados do pool e a engine é compartilhada
+    if kwargs.pop('pooled', False):
+        return pool.connect_pooled(connection_name, connection_type, encoding=encoding, stmtcachesize=stmtcachesize, **kwargs)
 
     # obtendo dados de conexão
     connection_string = kwargs.pop('connection_string', None)
-    engine_string = connection_string
+    connection_info = {}
     if not connection_string:
         if connection_name:
             connection_info = get_connection_info(connection_name, config_filename=kwargs.get('config_filename', 'connections.json'))
@@ -137,32 +168,48 @@ def connect_oracle(connection_name=None, *connection_type, **kwargs):
             
         user = connection_info.get('user')
         password = connection_info.get('password')
-        host = connection_info.get('host')
-        service = connection_info.get('service')
 
         # verificando se temos todos os dados para conexão
         assert user, "User missing"
         assert password, "Password missing"
-        assert host, "Host missing"
-        assert service, "Service missing"
+        if not connection_info.get('dsn'):
+            assert connection_info.get('host'), "Host missing"
+            assert connection_info.get('service'), "Service missing"
 
-        # construindo strings de conexão
-        connection_string = f'{user}/{password}@{host}:1521/{service}'
-        engine_string = 'oracle://' + connection_string.replace('/', ':', 1)
+        # DSNs tentados em ordem: um por host (ou os "dsn" salvos)
+        dsns = failover.get_dsns(connection_info)
+
+    # retry com backoff em erros de rede/listener (ver failover.py)
+    retries = kwargs.pop('retries', connection_info.get('retries', failover.DEFAULT_RETRIES))
+    backoff = kwargs.pop('backoff', connection_info.get('backoff', failover.DEFAULT_BACKOFF))
+
+    cx_Oracle = backends.load('oracle')
+
+    def new_connection():
+        if connection_string:
+            connection = failover.connect(lambda dsn: cx_Oracle.connect(connection_string, encoding=encoding), [connection_string],
+                                          retries=retries, backoff=backoff)
+        else:
+            connection = failover.connect(lambda dsn: cx_Oracle.connect(user=user, password=password, dsn=dsn, encoding=encoding), dsns,
+                                          retries=retries, backoff=backoff)
+        connection.stmtcachesize = stmtcachesize
+        return statements.register(connection, stmtcachesize)
 
     # criando os objetos de conexão
     cnxn_objects = []
     for ct in connection_type:
         if ct == 'cc':
-            connection = cx_Oracle.connect(connection_string, encoding=encoding)
+            connection = new_connection()
             cursor = connection.cursor()
             cnxn_objects = [connection, cursor] # podemos fazer isso por a construção da lista de conexões garante 'cc' no primeiro índice
         elif ct == 'connection':
-            cnxn_objects.append(cx_Oracle.connect(connection_string, encoding=encoding))
+            cnxn_objects.append(new_connection())
         elif ct == 'cursor':
-            cnxn_objects.append(cx_Oracle.connect(connection_string, encoding=encoding).cursor())
+            cnxn_objects.append(new_connection().cursor())
         elif ct == 'engine':
-            cnxn_objects.append(sqlalchemy.create_engine(engine_string, encoding=encoding))
+            # conexões da engine abertas por new_connection (retry e failover) e testadas antes de cada uso
+            cnxn_objects.append(backends.load('sqlalchemy').create_engine('oracle://', creator=new_connection, pool_pre_ping=True,
+                                                                          encoding=encoding))
     
     # retornando objetos de conexão
     if len(cnxn_objects) > 1:
@@ -189,6 +236,7 @@ def connect_sas_bigdata(*connection_type, encoding='utf-8', config_filename='con
     return connect_oracle('sas_bigdata', connection_type, encoding=encoding, config_filename='connections.json')
 
 
+@tracing.traced('connect_sqlite')
 def connect_sqlite(connection_name=None, *connection_type, **kwargs):
     """
     Conexão com banco de dados SQLite
@@ -197,7 +245,17 @@ def connect_sqlite(connection_name=None, *connection_type, **kwargs):
     :: connection_name [str] -> nome da conexão 
     :: *connection_type [str] -> define o tipo de conexão retornado | "connection" (default), "cursor", "engine", "all"
     :: config_filename -> arquivo onde serão salvos os dados de conexão (default: "connections.json")
-    :: dbpath -> path para arquivo .db
+    :: dbpath -> path para arquivo .db, ":memory:" (banco em memória, um por conexão) ou uri "file:..."
+       (e.g. "file:staging?mode=memory&cache=shared", banco em memória compartilhado pelas conexões do processo)
+    :: cached_statements [int] -> statements mantidos preparados por conexão (cache LRU do sqlite3) | default: 50
+    :: profile [str ou dict] -> perfil de desempenho aplicado em cada conexão: "default", "fast" (WAL, synchronous NORMAL,
+       cache e mmap grandes) ou "scratch" (staging local, sem fsync), ver sqlite_profiles.PROFILES.
+       pode ser salvo com save_connection_info(..., profile="fast") | default: perfil salvo ou "default"
+    :: pragmas [dict] -> ajustes sobre o perfil, e.g. {"cache_size": -65536} | default: pragmas salvos ou None
+    :: busy_timeout [float] -> segundos aguardando um lock de outra conexão antes de "database is locked"
+       (timeout do sqlite3.connect) | default: busy_timeout salvo ou sqlite_profiles.DEFAULT_BUSY_TIMEOUT
+    :: pooled [bool] -> se True, connection/cursor vêm do pool de connection_name (devolver com pool.release)
+       e a engine é compartilhada pelo processo | default: False
 
     output:
     :: objeto conector ou lista de objetos conectores definido por connection_type.
@@ -207,32 +265,52 @@ def connect_sqlite(connection_name=None, *connection_type, **kwargs):
 
     # obtendo lista de conexões a serem retornadas
     connection_type = helpers.get_connection_type(connection_type, kwargs)
+    cached_statements = kwargs.pop('cached_statements', statements.DEFAULT_CACHE_SIZE)
+
+    # conexões do pool do processo (ver pool.py): connection/cursor são emprestados do pool e a engine é compartilhada
+    if kwargs.pop('pooled', False):
+        return pool.connect_pooled(connection_name, connection_type, stmtcachesize=cached_statements, **kwargs)
 
     # construindo strings de conexão
+    profile, pragmas, busy_timeout = kwargs.pop('profile', None), kwargs.pop('pragmas', None), kwargs.pop('busy_timeout', None)
     if connection_name:
         connection_info = get_connection_info(connection_name, config_filename=kwargs.get('config_filename', 'connections.json'))
         connection_string = connection_info['dbpath']
+        profile = profile or connection_info.get('profile')
+        pragmas = pragmas or connection_info.get('pragmas')
+        busy_timeout = busy_timeout if busy_timeout is not None else connection_info.get('busy_timeout')
     else:
         connection_string = kwargs.pop('dbpath', None)
-        assert connection_string, 'dbpath deve ser fornecido'
+    if busy_timeout is None:
+        busy_timeout = sqlite_profiles.DEFAULT_BUSY_TIMEOUT
+
+    connection_string = helpers.format_sqlite_path(connection_string)
+    if connection_string == ':memory:':
+        engine_string = 'sqlite://'
+    elif connection_string.startswith('file:'):
+        engine_string = f'sqlite:///{connection_string}{"&" if "?" in connection_string else "?"}uri=true'
+    else:
+        engine_string = f'sqlite:///{connection_string}'
 
-    if not connection_string[-3:] == '.db':
-        connection_string += '.db'    
-    engine_string = f'sqlite:///{connection_string}'
+    def new_connection():
+        connection = sqlite_profiles.connect(connection_string, profile, pragmas, cached_statements=cached_statements,
+                                             timeout=busy_timeout)
+        return statements.register(connection, cached_statements)
 
     # criando os objetos de conexão
     cnxn_objects = []
     for ct in connection_type:
         if ct == 'cc':
-            connection = sqlite3.connect(connection_string)
+            connection = new_connection()
             cursor = connection.cursor()
             cnxn_objects = [connection, cursor] # podemos fazer isso por a construção da lista de conexões garante 'cc' no primeiro índice
         elif ct == 'connection':
-            cnxn_objects.append(sqlite3.connect(connection_string))
+            cnxn_objects.append(new_connection())
         elif ct == 'cursor':
-            cnxn_objects.append(sqlite3.connect(connection_string).cursor())
+            cnxn_objects.append(new_connection().cursor())
         elif ct == 'engine':
-            cnxn_objects.append(sqlalchemy.create_engine(engine_string))
+            engine = backends.load('sqlalchemy').create_engine(engine_string)
+            cnxn_objects.append(sqlite_profiles.listen_engine(engine, profile, pragmas) if profile or pragmas else engine)
 
     # retornando objetos de conexão
     if len(cnxn_objects) > 1:
@@ -241,54 +319,115 @@ def connect_sqlite(connection_name=None, *connection_type, **kwargs):
         return cnxn_objects[0]
 
 
+def connect(connection_name, *connection_type, **kwargs):
+    """
+    Conexão com o banco de uma conexão salva, escolhendo connect_oracle ou connect_sqlite pelo "flavor" salvo
+
+    inputs:
+    :: connection_name [str] -> nome da conexão
+    :: *connection_type [str] -> define o tipo de conexão retornado | "connection" (default), "cursor", "engine", "all"
+    :: config_filename -> arquivo onde estão salvos os dados de conexão (default: "connections.json")
+    :: managed [bool] -> retorna uma failover.ManagedConnection, que se reconecta quando a sessão cai | default: False
+
+    output:
+    :: objeto conector ou lista de objetos conectores definido por connection_type
+    """
+
+    if kwargs.pop('managed', False):
+        return failover.ManagedConnection(connection_name, **kwargs)
+    connection_info = get_connection_info(connection_name, config_filename=kwargs.get('config_filename', 'connections.json'))
+    if helpers.get_flavor(connection_info) == 'sqlite':
+        return connect_sqlite(connection_name, *connection_type, **kwargs)
+    return connect_oracle(connection_name, *connection_type, **kwargs)
+
+
 #
 # CONSULTA
 #
 
-def find_table(sql_connector, partial_table_name=None, fetch='all', tables='dba'):
+def find_table(sql_connector, partial_table_name=None, fetch='all', tables='dba', cache=False):
+    """
+    Busca tabelas cujo nome contém partial_table_name
+
+    inputs:
+    :: sql_connector [connector object] -> conector ao banco
+    :: partial_table_name [str] -> parte do nome da tabela
+    :: fetch [str ou int] -> "all" (default), número de linhas ou None para retornar o cursor
+    :: tables [str] -> visões do dicionário utilizadas no oracle | "dba" (default), "all", "user"
+    :: cache [bool] -> busca no catálogo em memória do banco (ver catalog.py) em vez de consultar o banco
+
+    output:
+    :: [list] de tuplas (owner, table_name) no oracle ou (table_name,) com tables="user" e no sqlite
+    """
+
+    if cache:
+        matches = catalog.get_catalog(sql_connector, tables=tables).find_table(partial_table_name, sql_connector=sql_connector)
+        return matches[:fetch] if type(fetch) is int else matches
 
     cursor = helpers.get_cursor(sql_connector)
     db, _, _ = helpers.get_db_module_connectortype(sql_connector)
     db = db.lower()
+    helpers.check_dictionary_views(tables)
 
     if not partial_table_name:
         partial_table_name = ''
 
+    # valores sempre por bind: o texto da query não muda entre chamadas e o parse é reaproveitado
     if db == 'oracle':
         q = f"""
         SELECT 
             {"owner, " if not tables=='user' else ""}table_name 
         FROM 
-            {tables}_tables where table_name like \'%{partial_table_name.upper()}%\'
+            {tables}_tables where table_name like :pattern
         """
+        params = {'pattern': f'%{partial_table_name.upper()}%'}
 
     elif db == 'sqlite':
-        q = f"""
+        q = """
         SELECT 
             name 
         FROM 
             sqlite_master 
         WHERE 
-            type='table' AND name like '%{partial_table_name}%'"""
+            type='table' AND name like :pattern"""
+        params = {'pattern': f'%{partial_table_name}%'}
 
     else:
         raise NotImplementedError
 
     if fetch == 'all':
-        matches = cursor.execute(q).fetchall()
+        matches = tracing.execute(cursor, q, params).fetchall()
     elif not fetch:
-        matches = cursor.execute(q)
+        matches = tracing.execute(cursor, q, params)
     elif isinstance(fetch, int):
-        matches = cursor.execute(q).fetchmany(fetch)
+        matches = tracing.execute(cursor, q, params).fetchmany(fetch)
     return matches
 
 
-def table_exists(sql_connector, table_name, fetch='all', tables='dba', owner=None):
+def table_exists(sql_connector, table_name, fetch='all', tables='dba', owner=None, cache=False):
+    """
+    Verifica se a tabela (ou view, no oracle) table_name existe
+
+    inputs:
+    :: sql_connector [connector object] -> conector ao banco
+    :: table_name [str] -> nome da tabela, opcionalmente com owner (e.g. "owner.tabela")
+    :: tables [str] -> visões do dicionário utilizadas no oracle | "dba" (default), "all", "user"
+    :: owner [str] -> owner da tabela (apenas oracle)
+    :: cache [bool] -> busca no catálogo em memória do banco (ver catalog.py) em vez de consultar o banco
+
+    output:
+    :: [bool]
+    """
+
+    if cache:
+        return catalog.get_catalog(sql_connector, tables=tables).table_exists(table_name, owner=owner, sql_connector=sql_connector)
     
     cursor = helpers.get_cursor(sql_connector)
     db, _, _ = helpers.get_db_module_connectortype(sql_connector)
     db = db.lower()
 
+    helpers.check_dictionary_views(tables)
+
     if '.' in table_name:
             owner, table_name = table_name.split('.')
 
@@ -301,32 +440,57 @@ def table_exists(sql_connector, table_name, fetch='all', tables='dba', owner=Non
         where 
             object_type in ('TABLE', 'VIEW')
         and 
-            object_name = '{table_name.upper()}'
-            {f"and owner = '{owner.upper()}'" if owner else ''}
+            object_name = :table_name
+            {"and owner = :owner" if owner else ''}
         """
+        params = {'table_name': table_name.upper()}
+        if owner:
+            params['owner'] = owner.upper()
     
     elif db == 'sqlite':
-        q = f"""
+        q = """
         SELECT 
             count(*) 
         FROM 
             sqlite_master 
         WHERE 
-            type='table' AND name = '{table_name}'
+            type='table' AND name = :table_name
         """
+        params = {'table_name': table_name}
     
     else:
         raise NotImplementedError
 
-    return bool(cursor.execute(q).fetchone()[0])
+    return bool(tracing.execute(cursor, q, params).fetchone()[0])
+
 
+def find_column(sql_connector, partial_column_name, partial_table_name=None, tables='dba', fetch='all', cache=False):
+    """
+    Busca colunas cujo nome contém partial_column_name, em tabelas cujo nome contém partial_table_name
 
-def find_column(sql_connector, partial_column_name, partial_table_name=None, tables='dba', fetch='all'):
+    inputs:
+    :: sql_connector [connector object] -> conector ao banco
+    :: partial_column_name [str] -> parte do nome da coluna
+    :: partial_table_name [str] -> parte do nome da tabela
+    :: tables [str] -> visões do dicionário utilizadas no oracle | "dba" (default), "all", "user"
+    :: fetch [str ou int] -> "all" (default), número de linhas ou None para retornar o cursor
+    :: cache [bool] -> busca no catálogo em memória do banco (ver catalog.py) em vez de consultar o banco
+
+    output:
+    :: [list] de tuplas (owner, table_name, column_name) ou (table_name, column_name) com tables="user"
+    """
+
+    if cache:
+        matches = catalog.get_catalog(sql_connector, tables=tables).find_column(partial_column_name, partial_table_name,
+                                                                                sql_connector=sql_connector)
+        return matches[:fetch] if type(fetch) is int else matches
 
     cursor = helpers.get_cursor(sql_connector)
     db, _, _ = helpers.get_db_module_connectortype(sql_connector)
     db = db.lower()
 
+    helpers.check_dictionary_views(tables)
+
     if db == 'oracle':
         q = f"""
         select 
@@ -337,21 +501,89 @@ def find_column(sql_connector, partial_column_name, partial_table_name=None, tab
             {tables}_tab_cols cols
             ON tabs.table_name = cols.table_name
         WHERE 
-            tabs.table_name LIKE '%{partial_table_name.upper() if partial_table_name else ''}%'
-            AND cols.column_name LIKE '%{partial_column_name.upper()}%'
+            tabs.table_name LIKE :table_pattern
+            AND cols.column_name LIKE :column_pattern
         """
+        params = {
+            'table_pattern': f'%{partial_table_name.upper() if partial_table_name else ""}%',
+            'column_pattern': f'%{partial_column_name.upper()}%'
+        }
     else:
         raise NotImplementedError
 
     if fetch == 'all':
-        matches = cursor.execute(q).fetchall()
+        matches = tracing.execute(cursor, q, params).fetchall()
     elif not fetch:
-        matches = cursor.execute(q)
+        matches = tracing.execute(cursor, q, params)
     elif isinstance(fetch, int):
-        matches = cursor.execute(q).fetchmany(fetch)
+        matches = tracing.execute(cursor, q, params).fetchmany(fetch)
     return matches
 
 
+def read_query(sql_connector, q, params=None, chunksize=10000, as_df=True, arraysize=None, prefetchrows=None):
+    """
+    Executa a consulta q e retorna um generator com os resultados em lotes de chunksize linhas,
+    mantendo em memória apenas um lote por vez.
+
+    inputs:
+    :: sql_connector [connector object] -> conexão ou cursor cx_Oracle/sqlite3, engine/conexão sqlalchemy
+    :: q [str] -> consulta
+    :: params [dict ou list] -> parâmetros de bind da consulta
+    :: chunksize [int] -> número de linhas por lote | default: 10000
+    :: as_df [bool] -> se True os lotes são DataFrames, senão listas de tuplas | default: True
+    :: arraysize [int] -> linhas trazidas do banco a cada round trip (cursor.arraysize) | default: chunksize
+    :: prefetchrows [int] -> linhas trazidas junto com a execução (apenas cx_Oracle 8+) | default: arraysize
+
+    output:
+    :: [generator] de DataFrames (com os dtypes inferidos no primeiro lote) ou de listas de tuplas
+    """
+
+    cursor = helpers.get_cursor(sql_connector)
+    _, module, _ = helpers.get_db_module_connectortype(sql_connector)
+    owns_cursor = cursor is not sql_connector
+
+    if module in ('cx_oracle', 'sqlite3'):
+        cursor.arraysize = arraysize or chunksize
+        if hasattr(cursor, 'prefetchrows'):
+            cursor.prefetchrows = prefetchrows or cursor.arraysize
+
+    if as_df:
+        import pandas as pd
+
+    try:
+        result = tracing.execute(cursor, q, params)
+        if result is None:
+            result = cursor
+        if hasattr(result, 'keys'):
+            columns = list(result.keys())
+        else:
+            columns = [d[0] for d in cursor.description]
+
+        dtypes = None
+        while True:
+            rows = tracing.fetchmany(result, chunksize, q)
+            if not rows:
+                break
+            if not as_df:
+                yield rows
+                continue
+
+            chunk = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+            if dtypes is None:
+                dtypes = chunk.dtypes.to_dict() # inferidos apenas no primeiro lote
+            else:
+                for c, t in dtypes.items():
+                    if chunk[c].dtype != t:
+                        try:
+                            chunk[c] = chunk[c].astype(t)
+                        except (ValueError, TypeError):
+                            pass # e.g. nulos em coluna inteira: mantém o dtype inferido neste lote
+            yield chunk
+    finally:
+        if owns_cursor:
+            cursor.close()
+
+
 #
 # OPERATIONS
 #
@@ -363,13 +595,22 @@ def create_table(table_name, sql_connector, **kwargs):
     cursor = helpers.get_cursor(sql_connector)
     assert cursor
 
-    # montando a query
+    # construíndo a tabela
+    tracing.execute(cursor, get_create_table_query(table_name, **kwargs))
+    catalog.invalidate(sql_connector, table_name)
+
+
+def get_create_table_query(table_name, **kwargs):
+    """Monta o CREATE TABLE de create_table (colunas como em helpers.format_columns, if_not_exists, nologging)"""
+
+    # DDL não aceita bind: o nome da tabela é validado
+    helpers.check_identifier(table_name)
     columns = helpers.format_columns(**kwargs)
     if_not_exists = kwargs.get('if_not_exists', False) # por padrão apenas cria sem checar se já existe ou não
     q = f'CREATE TABLE {"IF NOT EXISTS " if if_not_exists else ""}{table_name} ({columns})'
-    
-    # construíndo a tabela
-    cursor.execute(q)
+    if kwargs.get('nologging', False): # apenas oracle: tabela de staging sem geração de redo nas cargas direct-path
+        q += ' NOLOGGING'
+    return q
 
 
 def drop_table(table_name, sql_connector):
@@ -377,15 +618,51 @@ def drop_table(table_name, sql_connector):
     # a função aceita qualquer tipo de conexão. aqui extrai-se o cursor necessário para dropar-se a tabela
     cursor = helpers.get_cursor(sql_connector)
 
+    # DDL não aceita bind: o nome da tabela é validado
+    helpers.check_identifier(table_name)
     q = f'DROP TABLE {table_name}'
-    cursor.execute(q)
+    tracing.execute(cursor, q)
+    catalog.invalidate(sql_connector, table_name)
 
 
-def insert_rows(rows, cols, table_name, sql_connector, db='oracle'):
+def insert_rows(rows, cols, table_name, sql_connector, db='oracle', batch_size=None, commit_every=None, input_sizes=None,
+                workers=None, connection_name=None, executor='thread', atomic=False, config_filename='connections.json', v=False):
     """
     sql_connector: cx_Oracle/sqlite3.Connection, cx_Oracle/sqlite3.Cursor, Engine
+
+    inputs:
+    :: rows [iterable] -> linhas a serem inseridas
+    :: cols [list] -> nomes das colunas
+    :: table_name [str] -> tabela de destino
+    :: batch_size [int] -> se informado, rows é inserido em lotes de batch_size linhas (pode ser um generator)
+    :: commit_every [int] -> commit a cada commit_every lotes (apenas com batch_size)
+    :: input_sizes [list] -> tipos/tamanhos de bind por coluna para cursor.setinputsizes
+    :: workers [int] -> carga paralela por workers conexões de connection_name (ver parallel.insert_rows_parallel).
+       não aceita commit_every
+    :: connection_name [str] -> conexão salva usada pelos workers (obrigatória com workers)
+    :: executor [str] -> com workers, "thread" (default) ou "process"
+    :: atomic [bool] -> com workers, tudo ou nada por meio de uma staging | default: False
+    :: config_filename -> com workers, arquivo onde está salva connection_name (default: "connections.json")
+    :: v [bool] -> imprime as estatísticas da carga
+
+    output:
+    :: [dict] com estatísticas da carga ("rows", "batches", "seconds", "rows_per_sec"), quando batch_size é informado
     """
 
+    if workers:
+        assert connection_name, 'workers exige connection_name'
+        if commit_every:
+            # cada worker faz o commit da sua partição (ou atomic, tudo ou nada)
+            print('commit_every não é suportado com workers')
+            raise ValueError
+        return parallel.insert_rows_parallel(rows, cols, table_name, connection_name, sql_connector=sql_connector, workers=workers,
+                                             executor=executor, batch_size=batch_size or 50000, atomic=atomic,
+                                             input_sizes=input_sizes, config_filename=config_filename, v=v)
+
+    if batch_size:
+        return insert_batches(helpers.iter_batches(rows, batch_size), cols, table_name, sql_connector, 
+                              commit_every=commit_every, input_sizes=input_sizes, v=v)
+
     try:
         db, module, connection = helpers.get_db_module_connectortype(sql_connector)
         cursor = helpers.get_cursor(sql_connector)
@@ -393,10 +670,19 @@ def insert_rows(rows, cols, table_name, sql_connector, db='oracle'):
         print(f'sql_connector inválido: {sql_connector}')
         raise
 
+    q = get_insert_query(db, table_name, cols)
+    if input_sizes and db == 'oracle':
+        cursor.setinputsizes(*input_sizes)
+    tracing.executemany(cursor, q, rows)
+
+
+def get_insert_query(db, table_name, cols, direct_path=False):
+    """Monta a query de insert parametrizada para o banco db (com direct_path, usa o hint APPEND_VALUES no oracle)"""
+
     columns = [c.upper() for c in cols]
     if db == 'oracle':
         q = f"""
-        insert into {table_name} ({', '.join(columns)}) 
+        insert {"/*+ APPEND_VALUES */ " if direct_path else ""}into {table_name} ({', '.join(columns)}) 
         values ({', '.join(f':{i}' for i in range(1, len(columns)+1))})
         """
     elif db == 'sqlite':
@@ -407,17 +693,238 @@ def insert_rows(rows, cols, table_name, sql_connector, db='oracle'):
     else:
         print(f'db {db} não implementada')
         raise NotImplementedError
+    return q
+
 
-    cursor.executemany(q, rows)
+def insert_batches(batches, cols, table_name, sql_connector, commit_every=None, input_sizes=None, direct_path=False,
+                   batch_errors=False, on_commit=None, v=False):
+    """
+    Insere lotes de linhas com um executemany por lote, reaproveitando o mesmo cursor e query.
 
+    inputs:
+    :: batches [iterable] -> lotes (listas de tuplas) a serem inseridos, e.g. helpers.iter_df_batches(df, 50000)
+    :: cols [list] -> nomes das colunas
+    :: table_name [str] -> tabela de destino
+    :: sql_connector [connector object] -> conexão ou cursor cx_Oracle/sqlite3
+    :: commit_every [int] -> commit a cada commit_every lotes | default: None (sem commit, fica a cargo de quem chama)
+    :: input_sizes [list] -> tipos/tamanhos de bind por coluna para cursor.setinputsizes (apenas oracle)
+    :: direct_path [bool] -> insert direct-path (/*+ APPEND_VALUES */) no oracle. o oracle exige commit antes
+       do próximo insert na tabela, então há commit a cada lote
+    :: batch_errors [bool] -> no oracle, linhas com erro não abortam o lote; são retornadas em "errors"
+    :: on_commit [callable] -> chamado com (linhas, lotes) inseridos até então imediatamente antes de cada commit,
+       na mesma transação (e.g. registro de progresso, ver checkpoint.py)
+    :: v [bool] -> imprime as estatísticas da carga
+
+    com sql_connector failover.ManagedConnection e commit_every, se a sessão cair (erro transitório, ver failover.is_transient)
+    a conexão é refeita e os lotes desde o último commit são reenviados (até failover.MAX_REPLAYS reconexões seguidas,
+    inclusive se a sessão cair de novo durante o reenvio). se a queda for durante o próprio commit,
+    os lotes podem já ter sido gravados e serão duplicados
 
-def insert_df(df, table_name, sql_connector, if_exists='fail'):
+    output:
+    :: [dict] com estatísticas da carga ("rows", "batches", "seconds", "rows_per_sec", "errors", "reconnects"), 
+       "errors" é uma lista de (posição da linha na carga, mensagem)
+    """
+
+    try:
+        db, module, connection = helpers.get_db_module_connectortype(sql_connector)
+        cursor = helpers.get_cursor(sql_connector)
+    except:
+        print(f'sql_connector inválido: {sql_connector}')
+        raise
 
+    if module not in ('cx_oracle', 'sqlite3'):
+        print(f'insert em lotes não implementado para {module}')
+        raise NotImplementedError
+
+    direct_path = direct_path and db == 'oracle'
+    batch_errors = batch_errors and db == 'oracle'
+    if direct_path:
+        commit_every = 1
+    q = get_insert_query(db, table_name, cols, direct_path=direct_path)
+    
+    def send(cursor, batch, offset):
+        if input_sizes and db == 'oracle':
+            cursor.setinputsizes(*input_sizes) # o executemany limpa os binds, logo os tamanhos são redefinidos a cada lote
+        if batch_errors:
+            tracing.executemany(cursor, q, batch, batcherrors=True)
+            errors.extend((offset + e.offset, e.message) for e in cursor.getbatcherrors())
+        else:
+            tracing.executemany(cursor, q, batch)
+
+    def commit(cursor):
+        if on_commit:
+            on_commit(n_rows, n_batches)
+        cursor.connection.commit()
+
+    # lotes desde o último commit, reenviados após uma reconexão (apenas com ManagedConnection)
+    reconnectable = bool(commit_every) and isinstance(sql_connector, failover.ManagedConnection)
+    pending, committed = [], (0, 0, 0) # committed: (linhas, lotes, erros) no último commit
+    reconnects = 0
+
+    n_rows, n_batches, errors = 0, 0, []
+    start = time.perf_counter()
+    for batch in batches:
+        if reconnectable:
+            pending.append(batch)
+        try:
+            send(cursor, batch, n_rows)
+            n_rows += len(batch)
+            n_batches += 1
+            if commit_every and n_batches % commit_every == 0:
+                commit(cursor)
+                pending, committed = [], (n_rows, n_batches, len(errors))
+            continue
+        except Exception as e:
+            if not reconnectable or not failover.is_transient(e):
+                raise
+            error = e
+
+        # reconexão e reenvio dos lotes desde o último commit; uma nova queda durante o reenvio recomeça a partir
+        # do mesmo commit, até failover.MAX_REPLAYS reconexões seguidas
+        for attempt in range(1, failover.MAX_REPLAYS + 1):
+            if v:
+                print(f'{table_name}: sessão perdida ({error}), reconectando e reenviando {len(pending)} lotes '
+                      f'(tentativa {attempt}/{failover.MAX_REPLAYS})')
+            sql_connector.reconnect()
+            cursor = helpers.get_cursor(sql_connector)
+            reconnects += 1
+            n_rows, n_batches, n_errors = committed
+            del errors[n_errors:]
+            try:
+                for replayed in pending:
+                    send(cursor, replayed, n_rows)
+                    n_rows += len(replayed)
+                    n_batches += 1
+                failover.record(replayed_batches=len(pending))
+                if n_batches % commit_every == 0:
+                    commit(cursor)
+                    pending, committed = [], (n_rows, n_batches, len(errors))
+                break
+            except Exception as e:
+                if not failover.is_transient(e) or attempt == failover.MAX_REPLAYS:
+                    print(f'{table_name}: falha ao reenviar os lotes após {attempt} reconexões: {e!r}')
+                    raise
+                error = e
+    if commit_every and n_batches % commit_every:
+        commit(cursor)
+    seconds = time.perf_counter() - start
+
+    stats = {
+        'rows': n_rows, 
+        'batches': n_batches, 
+        'seconds': seconds, 
+        'rows_per_sec': n_rows / seconds if seconds else float('inf'),
+        'errors': errors,
+        'reconnects': reconnects
+    }
+    if v:
+        print(f'{table_name}: {n_rows} linhas em {n_batches} lotes | {seconds:.2f}s | {stats["rows_per_sec"]:,.0f} linhas/s')
+        if errors:
+            print(f'{table_name}: {len(errors)} linhas rejeitadas, e.g. linha {errors[0][0]}: {errors[0][1]}')
+    return stats
+
+
+def move_staging(staging_table, table_name, sql_connector, cols=None, exchange_partition=None, drop=True):
+    """
+    Move os dados de uma tabela de staging para table_name em uma única operação e faz o commit
+
+    inputs:
+    :: staging_table [str] -> tabela de staging já carregada
+    :: table_name [str] -> tabela de destino
+    :: sql_connector [connector object] -> conexão ou cursor cx_Oracle/sqlite3
+    :: cols [list] -> colunas a serem movidas | default: todas (select *)
+    :: exchange_partition [str] -> apenas oracle: troca a partição de table_name pela staging
+       (ALTER TABLE ... EXCHANGE PARTITION) em vez de copiar os dados
+    :: drop [bool] -> dropa a staging ao final | default: True
+    """
+
+    db, _, _ = helpers.get_db_module_connectortype(sql_connector)
+    cursor = helpers.get_cursor(sql_connector)
+
+    if exchange_partition:
+        if db != 'oracle':
+            print(f'exchange_partition não implementado para {db}')
+            raise NotImplementedError
+        tracing.execute(cursor, f'ALTER TABLE {table_name} EXCHANGE PARTITION {exchange_partition} WITH TABLE {staging_table}')
+    else:
+        columns = ', '.join(c.upper() for c in cols) if cols else '*'
+        hint = '/*+ APPEND */ ' if db == 'oracle' else ''
+        tracing.execute(cursor, f'INSERT {hint}INTO {table_name}{f" ({columns})" if cols else ""} SELECT {columns} FROM {staging_table}')
+    helpers.get_connection(sql_connector).commit()
+
+    if drop:
+        drop_table(staging_table, sql_connector)
+
+
+def insert_df(df, table_name, sql_connector, if_exists='fail', batch_size=None, commit_every=None, direct_path=False,
+              staging_table=None, exchange_partition=None, batch_errors=False, keys=None, detect_changes=True, hash_column=None,
+              checkpoint=None, workers=None, connection_name=None, executor='thread', atomic=False, config_filename='connections.json',
+              v=False):
+    """
+    Insere o DataFrame df na tabela table_name, criando-a se necessário
+
+    inputs:
+    :: df [pd.DataFrame] -> dados a serem inseridos
+    :: table_name [str] -> tabela de destino
+    :: sql_connector [connector object] -> conexão ou cursor cx_Oracle/sqlite3
+    :: if_exists [str] -> comportamento caso a tabela exista | "fail" (default), "replace", "append", "upsert".
+       "upsert" sincroniza a tabela pelas colunas keys com MERGE / INSERT ... ON CONFLICT (ver sync.sync_df)
+    :: batch_size [int] -> se informado, o DataFrame é inserido em lotes de batch_size linhas,
+       convertidos coluna a coluna e com os tamanhos de bind definidos previamente
+    :: commit_every [int] -> commit a cada commit_every lotes (apenas com batch_size)
+    :: direct_path [bool] -> carga direct-path no oracle (/*+ APPEND_VALUES */, commit por lote, ver insert_batches).
+       sem batch_size, utiliza lotes de 100000 linhas
+    :: staging_table [str] -> carrega primeiro em staging_table (criada NOLOGGING no oracle) e depois move
+       para table_name com um único INSERT /*+ APPEND */ ... SELECT (ver move_staging)
+    :: exchange_partition [str] -> com staging_table, troca esta partição de table_name pela staging
+    :: batch_errors [bool] -> no oracle, linhas com erro não abortam o lote (retornadas em "errors")
+    :: keys [list] -> colunas chave do "upsert"
+    :: detect_changes [bool] -> no "upsert", envia apenas as linhas novas ou alteradas (comparando hashes) | default: True
+    :: hash_column [str] -> no "upsert", coluna do destino que guarda o hash das linhas | default: None
+    :: checkpoint [bool, str ou store] -> carga com commit por lote e progresso registrado, retomada do último lote
+       gravado se interrompida: True (arquivo "<table_name>.checkpoint.json"), path do arquivo de estado ou
+       checkpoint.ControlTable(...) (ver checkpoint.load_df) | default: None
+    :: workers [int] -> carga paralela: partições de df inseridas ao mesmo tempo por workers conexões de
+       connection_name (ver parallel.insert_df_parallel). não aceita "upsert", commit_every, direct_path,
+       batch_errors, checkpoint nem exchange_partition | default: None
+    :: connection_name [str] -> conexão salva usada pelos workers (obrigatória com workers)
+    :: executor [str] -> com workers, "thread" (default) ou "process"
+    :: atomic [bool] -> com workers, tudo ou nada por meio de staging_table | default: False
+    :: config_filename -> com workers, arquivo onde está salva connection_name (default: "connections.json")
+    :: v [bool] -> imprime as estatísticas da carga
+
+    output:
+    :: [dict] com estatísticas da carga, quando batch_size é informado.
+       no "upsert", com as contagens "inserted", "updated" e "unchanged"
+    """
+
+    if workers:
+        # opções do caminho serial sem equivalente na carga paralela: falha em vez de ignorá-las
+        unsupported = [name for name, value in [('if_exists="upsert"', if_exists == 'upsert'), ('commit_every', commit_every),
+                                                ('direct_path', direct_path), ('batch_errors', batch_errors),
+                                                ('checkpoint', checkpoint), ('exchange_partition', exchange_partition)] if value]
+        if unsupported:
+            print(f'Opções não suportadas com workers: {", ".join(unsupported)}')
+            raise ValueError
+    if if_exists == 'upsert':
+        assert keys, 'if_exists="upsert" exige keys'
+        return sync.sync_df(df, table_name, sql_connector, keys, detect_changes=detect_changes, hash_column=hash_column,
+                            staging_table=staging_table, batch_size=batch_size or 100000, direct_path=direct_path, v=v)
+    if workers:
+        assert connection_name, 'workers exige connection_name'
+        return parallel.insert_df_parallel(df, table_name, connection_name, sql_connector=sql_connector, if_exists=if_exists,
+                                           workers=workers, executor=executor, batch_size=batch_size or 50000, atomic=atomic,
+                                           staging_table=staging_table, config_filename=config_filename, v=v)
+    if checkpoint:
+        return checkpoint_.load_df(df, table_name, sql_connector, checkpoint=checkpoint, if_exists=if_exists,
+                                   batch_size=batch_size or 100000, direct_path=direct_path, batch_errors=batch_errors, v=v)
+
+    db, _, _ = helpers.get_db_module_connectortype(sql_connector)
+    df_schema = schema.infer_schema(df, db=db)
     columns = [c.upper() for c in df.columns]
-    types = [t.upper() for t in get_types_pd2oracle(df)]
-    rows = df.values.tolist()
+    types = [c['type'].upper() for c in df_schema]
 
-    if table_exists(table_name, sbd_owned=True):
+    if table_exists(sql_connector, table_name):
         if if_exists == 'replace':
             drop_table(table_name, sql_connector)
             create_table(table_name, sql_connector, cols=columns, types=types)
@@ -427,25 +934,34 @@ def insert_df(df, table_name, sql_connector, if_exists='fail'):
     else:
         create_table(table_name, sql_connector, cols=columns, types=types)
     
-    insert_rows(table_name=table_name, sql_connector=sql_connector, cols=columns, rows=rows)
-    sql_connector.commit()
+    stats = None
+    if (direct_path or staging_table or batch_errors) and not batch_size:
+        batch_size = 100000
+    if staging_table:
+        create_table(staging_table, sql_connector, cols=columns, types=types, nologging=db == 'oracle')
+    if batch_size:
+        stats = insert_batches(helpers.iter_df_batches(df, batch_size, db), columns, staging_table or table_name, sql_connector,
+                               commit_every=commit_every, input_sizes=schema.get_input_sizes(df_schema, db),
+                               direct_path=direct_path, batch_errors=batch_errors, v=v)
+    else:
+        insert_rows(table_name=table_name, sql_connector=sql_connector, cols=columns, rows=binds.to_rows(df, db),
+                    input_sizes=schema.get_input_sizes(df_schema, db))
+    helpers.get_connection(sql_connector).commit()
+    if staging_table:
+        move_staging(staging_table, table_name, sql_connector, cols=columns, exchange_partition=exchange_partition)
+    return stats
 
 
 def get_types_pd2oracle(df):
+    """Tipos oracle (NUMBER(p,s), VARCHAR2(n), CLOB, DATE/TIMESTAMP) das colunas de df, ver schema.infer_schema"""
 
-    types = []
-    for t in df.dtypes:
-        if 'int' in str(t):
-            types.append('integer')
-        elif 'float' in str(t):
-            types.append('float')
-        elif 'object' in str(t):
-            types.append('varchar(40)')
-        elif 'date' in str(t):
-            types.append('date')
-        else:
-            types.append('varchar(40)')
-    return types
+    return [c['type'] for c in schema.infer_schema(df, db='oracle')]
+
+
+def get_types_pd2sqlite(df):
+    """Afinidades sqlite (INTEGER, REAL, TEXT) das colunas de df, ver schema.infer_schema"""
+
+    return [c['type'] for c in schema.infer_schema(df, db='sqlite')]
 
 
 if __name__ == '__main__':
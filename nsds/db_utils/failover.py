@@ -0,0 +1,274 @@
+import time
+import random
+import threading
+
+from . import db_utils
+from . import helpers
+from . import tracing
+
+
+# # # # # # # # # # # # # # # # # # #
+#                                   #
+#   RETRY, FAILOVER E RECONEXÃO     #
+#                                   #
+# # # # # # # # # # # # # # # # # # #
+
+DEFAULT_PORT = 1521
+DEFAULT_RETRIES = 2 # novas rodadas por todos os DSNs após a primeira
+DEFAULT_BACKOFF = 1.0 # segundos antes da primeira nova rodada, dobrando a cada uma
+MAX_BACKOFF = 30.0
+DEFAULT_PING_INTERVAL = 60 # segundos ociosa antes de uma conexão do pool ser testada
+MAX_REPLAYS = 3 # reconexões seguidas para reenviar os lotes não commitados de um insert_batches
+
+# erros ORA de rede, listener ou instância indisponível/reiniciando: a mesma operação pode funcionar
+# em outra tentativa ou em outro nó. erros como senha inválida (ORA-01017) falham na hora
+TRANSIENT_ORA_CODES = {
+    28,    # sessão encerrada (kill session)
+    1012,  # not logged on
+    1033,  # inicialização ou shutdown em andamento
+    1034,  # oracle não disponível
+    1089,  # shutdown immediate em andamento
+    2396,  # tempo ocioso máximo excedido
+    3113,  # end-of-file on communication channel
+    3114,  # not connected to oracle
+    3135,  # conexão perdeu o contato
+    12170, # timeout de conexão
+    12514, # listener não conhece o serviço (e.g. nó saindo do cluster)
+    12516, 12519, 12520, 12521, 12528, # listener sem handler disponível / instância bloqueada
+    12537, 12541, 12543, 12545, 12547, 12571, # conexão fechada, sem listener, host inacessível
+    25408, # não é seguro repetir a chamada (failover de TAF)
+}
+# "database is locked" do sqlite não entra: é disputa de lock, tratada pelo busy timeout da conexão
+# (timeout do connect_sqlite), e não queda de sessão que justifique reconectar
+TRANSIENT_MESSAGES = ('DPI-1010', 'DPI-1080')
+
+_metrics = {
+    'connects': 0,
+    'connect_attempts': 0,
+    'connect_failures': 0,
+    'retries': 0,
+    'failovers': 0,
+    'reconnects': 0,
+    'reconnect_seconds': 0.0,
+    'max_reconnect_seconds': 0.0,
+    'ping_failures': 0,
+    'replayed_batches': 0,
+}
+_lock = threading.Lock()
+
+
+def record(**increments):
+    """Soma increments às métricas do processo (e.g. record(ping_failures=1))"""
+
+    with _lock:
+        for k, v in increments.items():
+            _metrics[k] += v
+
+
+def get_metrics():
+    """
+    Métricas de conexão do processo: conexões, tentativas e falhas, novas rodadas com backoff, failovers
+    (conexão em um DSN que não o primeiro), reconexões e seu tempo, pings com falha e lotes reenviados
+    """
+
+    with _lock:
+        metrics = dict(_metrics)
+    metrics['avg_reconnect_seconds'] = metrics['reconnect_seconds'] / metrics['reconnects'] if metrics['reconnects'] else None
+    return metrics
+
+
+def reset_metrics():
+    with _lock:
+        for k in _metrics:
+            _metrics[k] = 0.0 if k.endswith('seconds') else 0
+
+
+def _addresses(connection_info):
+    # (host, porta) de cada host de "host" (str separada por vírgulas ou lista; "host:porta" sobrescreve "port")
+    hosts = connection_info.get('host')
+    if isinstance(hosts, str):
+        hosts = [h.strip() for h in hosts.split(',') if h.strip()]
+    port = int(connection_info.get('port') or DEFAULT_PORT)
+    addresses = []
+    for host in hosts or []:
+        name, _, host_port = host.partition(':')
+        addresses.append((name, int(host_port) if host_port else port))
+    return addresses
+
+
+def get_dsns(connection_info, descriptor=False):
+    """
+    DSNs de uma conexão oracle salva, na ordem em que são tentados
+
+    inputs:
+    :: connection_info [dict] -> dados da conexão: "dsn" (str ou lista, usados como estão: "host:porta/serviço",
+       alias do tnsnames ou descritor) ou "host" (str separada por vírgulas ou lista), "port" (default: 1521) e "service"
+    :: descriptor [bool] -> com vários hosts, um único descritor com FAILOVER=on, em que o próprio client
+       troca de host a cada nova sessão (usado por pools e engines) | default: False (um DSN por host)
+
+    output:
+    :: [list] de str
+    """
+
+    dsn = connection_info.get('dsn')
+    if dsn:
+        return list(dsn) if isinstance(dsn, (list, tuple)) else [dsn]
+
+    service = connection_info.get('service')
+    addresses = _addresses(connection_info)
+    if descriptor and len(addresses) > 1:
+        address_list = ''.join(f'(ADDRESS=(PROTOCOL=TCP)(HOST={h})(PORT={p}))' for h, p in addresses)
+        return [f'(DESCRIPTION=(FAILOVER=on)(ADDRESS_LIST={address_list})(CONNECT_DATA=(SERVICE_NAME={service})))']
+    return [f'{h}:{p}/{service}' for h, p in addresses]
+
+
+def is_transient(error):
+    """Se error é uma falha de rede/listener/instância que pode passar em uma nova tentativa (ver TRANSIENT_ORA_CODES)"""
+
+    arg = error.args[0] if getattr(error, 'args', None) else None
+    if getattr(arg, 'code', None) in TRANSIENT_ORA_CODES:
+        return True
+    message = str(getattr(arg, 'message', None) or error)
+    return any(m in message for m in TRANSIENT_MESSAGES)
+
+
+def connect(connect_fn, dsns, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, max_backoff=MAX_BACKOFF):
+    """
+    Chama connect_fn(dsn) em cada DSN até uma funcionar; se todas falharem por erros transitórios,
+    aguarda um backoff exponencial (com jitter) e faz uma nova rodada, até retries vezes.
+    Erros não transitórios (e.g. senha inválida) são repassados na hora.
+
+    inputs:
+    :: connect_fn [callable] -> função que recebe um DSN e retorna a conexão (ou pool)
+    :: dsns [list] -> DSNs em ordem de preferência
+    :: retries [int] -> novas rodadas após a primeira | default: 2
+    :: backoff [float] -> segundos antes da primeira nova rodada, dobrando a cada uma | default: 1
+    :: max_backoff [float] -> espera máxima entre rodadas | default: 30
+
+    output:
+    :: retorno de connect_fn
+    """
+
+    last_error = None
+    for attempt in range(retries + 1):
+        for i, dsn in enumerate(dsns):
+            record(connect_attempts=1)
+            try:
+                result = connect_fn(dsn)
+            except Exception as e:
+                record(connect_failures=1)
+                if not is_transient(e):
+                    raise
+                last_error = e
+                continue
+            record(connects=1, failovers=1 if i else 0)
+            return result
+        if attempt < retries:
+            record(retries=1)
+            time.sleep(min(max_backoff, backoff * 2 ** attempt) * random.uniform(0.5, 1.0))
+    print(f'Falha ao conectar após {retries + 1} rodada(s) em {len(dsns)} DSN(s): {last_error!r}')
+    raise last_error
+
+
+def ping(connection):
+    """Se a conexão (cx_Oracle/sqlite3) ainda responde: ping do oracle (um round trip leve) ou "select 1" no sqlite"""
+
+    try:
+        if hasattr(connection, 'ping'):
+            connection.ping()
+        else:
+            connection.execute('select 1').fetchone()
+        return True
+    except Exception:
+        record(ping_failures=1)
+        return False
+
+
+class ManagedConnection:
+    """
+    Conexão de uma conexão salva que se refaz quando a sessão cai. Aceita em todas as funções do db_utils
+    como uma conexão comum; insert_batches (e com ele insert_df/insert_rows com batch_size e commit_every)
+    reconecta e reenvia os lotes ainda não commitados quando a sessão cai entre lotes.
+    A abertura usa retry com backoff e os DSNs da conexão salva (ver connect_oracle).
+
+    inputs:
+    :: connection_name [str] -> nome da conexão
+    :: config_filename -> arquivo onde estão salvos os dados de conexão (default: "connections.json")
+    :: ping_interval [float] -> segundos ociosa antes de a conexão ser testada (ver ensure, chamado a cada cursor()) | default: 60
+    :: kwargs -> repassados para db_utils.connect (e.g. retries, backoff, encoding)
+    """
+
+    def __init__(self, connection_name, config_filename='connections.json', ping_interval=DEFAULT_PING_INTERVAL, **kwargs):
+        self.connection_name = connection_name
+        self.config_filename = config_filename
+        self.ping_interval = ping_interval
+        self.connect_kwargs = kwargs
+        self.db = helpers.get_flavor(db_utils.get_connection_info(connection_name, config_filename=config_filename))
+        self.module = 'cx_oracle' if self.db == 'oracle' else 'sqlite3'
+        self.connection = self._connect()
+        self.last_used = time.monotonic()
+
+    def _connect(self):
+        return db_utils.connect(self.connection_name, config_filename=self.config_filename, **self.connect_kwargs)
+
+    def __getattr__(self, name):
+        # atributos da conexão atual (e.g. stmtcachesize, in_transaction)
+        if name == 'connection':
+            raise AttributeError(name)
+        return getattr(self.connection, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.rollback()
+        finally:
+            self.close()
+
+    def cursor(self):
+        # todas as funções do db_utils obtêm o cursor por aqui (helpers.get_cursor): a conexão ociosa é testada antes
+        self.ensure()
+        return self.connection.cursor()
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        self.connection.close()
+
+    def ping(self):
+        return ping(self.connection)
+
+    def reconnect(self):
+        """Descarta a conexão atual e abre uma nova (com retry e failover), registrando o tempo gasto"""
+
+        start = time.perf_counter()
+        with tracing.span('reconnect', connection=self.connection_name.upper()):
+            try:
+                self.connection.close()
+            except Exception:
+                pass # a sessão já caiu
+            self.connection = self._connect()
+        seconds = time.perf_counter() - start
+        with _lock:
+            _metrics['reconnects'] += 1
+            _metrics['reconnect_seconds'] += seconds
+            _metrics['max_reconnect_seconds'] = max(_metrics['max_reconnect_seconds'], seconds)
+        self.last_used = time.monotonic()
+
+    def ensure(self):
+        """Testa a conexão se ociosa há mais de ping_interval segundos e reconecta se não responder"""
+
+        if self.ping_interval is not None and time.monotonic() - self.last_used >= self.ping_interval and not self.ping():
+            self.reconnect()
+        self.last_used = time.monotonic()
+
+
+helpers.register_connector(ManagedConnection, lambda c: c.db, lambda c: c.module, 'connection')
@@ -1,5 +1,13 @@
 import re
-import cx_Oracle, sqlite3, sqlalchemy
+import itertools
+import threading
+
+from . import backends
+from . import binds
+
+# conexões sqlalchemy abertas por get_cursor a partir de engines: uma por engine e thread, reaproveitada
+# entre chamadas (antes cada chamada abria uma conexão que nunca era fechada)
+_engine_connections = threading.local()
 
 
 def format_connection_type(connection_type):
@@ -56,52 +64,168 @@ def get_connection_type(connection_type, kwargs):
     return connection_type
 
 
-def get_db_module_connectortype(sql_connector):
+def get_flavor(connection_info):
     """
-    A partir do objeto conector a banco de dados inserido, retorna-se o banco e o tipo de conexão
+    Banco de uma conexão salva: usa o campo "flavor" se houver, senão infere pelos campos presentes
 
     inputs:
-    :: connector [connector object] -> conector a um banco de dados
+    :: connection_info [dict] -> dados de conexão (ver get_connection_info)
 
     output:
-    :: [tuple de str] com (db, tipo de conexão) 
+    :: [str] 'oracle' ou 'sqlite'
+    """
+
+    flavor = connection_info.get('flavor')
+    if flavor:
+        return flavor.lower()
+    return 'sqlite' if 'dbpath' in connection_info else 'oracle'
+
+
+def format_sqlite_path(dbpath):
+    """
+    Path do arquivo .db usado pelo sqlite3 (adiciona a extensão .db se necessário).
+    ":memory:" e uris "file:..." são mantidos como estão
+    """
+
+    assert dbpath, 'dbpath deve ser fornecido'
+    if dbpath == ':memory:' or dbpath.startswith('file:'):
+        return dbpath
+    if not dbpath[-3:] == '.db':
+        dbpath += '.db'
+    return dbpath
+
+
+# registro de tipos de conector: classe -> (db, módulo, tipo de conexão).
+# db e módulo podem ser funções do conector quando dependem da instância (e.g. engines sqlalchemy)
+_connector_registry = {}
+_connector_cache = {} # type(sql_connector) -> entrada resolvida do registro
+
+
+def register_connector(connector_class, db, module, connector_type):
     """
+    Registra um tipo de conector para get_db_module_connectortype/get_cursor.
+    Instâncias de subclasses de connector_class também são reconhecidas.
+
+    inputs:
+    :: connector_class [type] -> classe do conector (e.g. sqlite3.Connection)
+    :: db [str ou callable] -> banco ('oracle', 'sqlite', ...) ou função que recebe o conector e retorna o banco
+    :: module [str ou callable] -> módulo do driver em minúsculas (e.g. 'sqlite3', 'cx_oracle', 'sqlalchemy')
+       ou função que recebe o conector e retorna o módulo (e.g. failover.ManagedConnection)
+    :: connector_type [str] -> 'connection', 'cursor' ou 'engine'
+    """
+
+    _connector_registry[connector_class] = (db, module, connector_type)
+    _connector_cache.clear()
+
 
-    connector_class = re.search(r"'(.+?)'", str(type(sql_connector))).group(1).split('.')
-    module, connector_type = connector_class[0].lower(), connector_class[-1].lower()
+def _get_sqlalchemy_db(sql_connector):
+    """Banco de uma engine/conexão sqlalchemy, como aparece na url (e.g. 'oracle', 'sqlite', 'oracle+cx_oracle')"""
+
+    engine = getattr(sql_connector, 'engine', sql_connector)
+    try:
+        return engine.url.drivername
+    except AttributeError:
+        try:
+            return re.search(r"(.+?)://", str(sql_connector)).group(1).split('(')[1]
+        except AttributeError:
+            print(f'Conector inválido: {sql_connector}')
+            raise
+
+
+def _resolve_connector(connector_class):
+    # um conector criado fora do nsds pode ser de um backend ainda não carregado: o import do driver já foi feito
+    # por quem criou o conector, então carregar o backend apenas registra os seus tipos
+    backends.load_module(connector_class.__module__)
+
+    for registered_class, entry in _connector_registry.items():
+        if issubclass(connector_class, registered_class):
+            return entry
+
+    # tipos não registrados: banco inferido pelo módulo do tipo
+    module, connector_type = connector_class.__module__.split('.')[0].lower(), connector_class.__name__.lower()
     if 'oracle' in module:
         db = 'oracle'
     elif 'sqlite' in module:
         db = 'sqlite'
     else:
-        try:
-            db = re.search(r"(.+?)://", str(sql_connector)).group(1).split('(')[1]
-        except AttributeError:
-            print(f'Conector inválido: {sql_connector}')
-            raise
+        db = _get_sqlalchemy_db
     return db, module, connector_type
 
+
+def get_db_module_connectortype(sql_connector):
+    """
+    A partir do objeto conector a banco de dados inserido, retorna-se o banco e o tipo de conexão.
+    A resolução é feita uma vez por tipo de conector (ver register_connector) e memorizada.
+
+    inputs:
+    :: connector [connector object] -> conector a um banco de dados
+
+    output:
+    :: [tuple de str] com (db, módulo, tipo de conexão) 
+    """
+
+    connector_class = type(sql_connector)
     try:
-        a = re.search(r"^<(.+?) ", str(sql_connector)).group(1).split('.')[0]
-    except AttributeError:
-        try:
-            a = re.search(r"(.+?)://", str(sql_connector)).group(1).split('(')[1]
-        except AttributeError:
-            print(f'Conector inválido: {sql_connector}')
-            raise
+        db, module, connector_type = _connector_cache[connector_class]
+    except KeyError:
+        db, module, connector_type = _connector_cache.setdefault(connector_class, _resolve_connector(connector_class))
+    if callable(db):
+        db = db(sql_connector)
+    if callable(module):
+        module = module(sql_connector)
+    return db, module, connector_type
+
+
+def _register_oracle(cx_Oracle):
+    register_connector(cx_Oracle.Connection, 'oracle', 'cx_oracle', 'connection')
+    register_connector(cx_Oracle.Cursor, 'oracle', 'cx_oracle', 'cursor')
+
+
+def _register_sqlite(sqlite3):
+    register_connector(sqlite3.Connection, 'sqlite', 'sqlite3', 'connection')
+    register_connector(sqlite3.Cursor, 'sqlite', 'sqlite3', 'cursor')
+
+
+def _register_sqlalchemy(sqlalchemy):
+    register_connector(sqlalchemy.engine.Engine, _get_sqlalchemy_db, 'sqlalchemy', 'engine')
+    register_connector(sqlalchemy.engine.Connection, _get_sqlalchemy_db, 'sqlalchemy', 'connection')
+
+
+# os tipos de conector de cada driver são registrados quando o backend é carregado (ver backends.py)
+backends.register_backend('oracle', 'cx_Oracle', _register_oracle)
+backends.register_backend('sqlite', 'sqlite3', _register_sqlite)
+backends.register_backend('sqlalchemy', 'sqlalchemy', _register_sqlalchemy)
+
+
+def _engine_connection(engine):
+    # conexão da thread atual para engine, reaberta se quem a recebeu a fechou
+    connections = _engine_connections.__dict__.setdefault('connections', {})
+    entry = connections.get(id(engine))
+    if entry is None or entry[0] is not engine or entry[1].closed:
+        entry = connections[id(engine)] = (engine, engine.connect())
+    return entry[1]
+
+
+def close_engine_connections(engine=None):
+    """Fecha as conexões abertas por get_cursor na thread atual para engine (ou para todos os engines, se None)"""
+
+    connections = _engine_connections.__dict__.get('connections', {})
+    for key, (e, connection) in list(connections.items()):
+        if engine is None or e is engine:
+            connection.close()
+            del connections[key]
 
 
 def get_cursor(sql_connector):
 
     db, module, connector_type = get_db_module_connectortype(sql_connector)
-    db, module, connector_type = db.lower(), module.lower(), connector_type.lower() 
 
     implemented = ('cx_oracle', 'sqlite3', 'sqlalchemy')
     if module not in implemented:
         raise NotImplementedError
     if module == 'sqlalchemy':
         if connector_type == 'engine':
-            cursor = sql_connector.connect()
+            cursor = _engine_connection(sql_connector)
         elif connector_type == 'connection':
             cursor = sql_connector
     else:
@@ -112,6 +236,28 @@ def get_cursor(sql_connector):
     return cursor
 
 
+def check_identifier(name):
+    """
+    Valida nomes usados diretamente no texto de DDL (que não aceita bind): identificadores simples
+    ou "owner.tabela", opcionalmente entre aspas duplas
+    """
+
+    part = r'(?:[A-Za-z_][A-Za-z0-9_$#]*|"[^"]+")'
+    if not isinstance(name, str) or not re.fullmatch(rf'{part}(?:\.{part})?', name):
+        print(f'Nome inválido: {name}')
+        raise ValueError
+    return name
+
+
+def check_dictionary_views(tables):
+    """Valida o prefixo das visões do dicionário oracle ("dba", "all" ou "user"), interpolado no texto da query"""
+
+    if tables not in ('dba', 'all', 'user'):
+        print(f'tables inválido: {tables} | "dba", "all" ou "user"')
+        raise ValueError
+    return tables
+
+
 def format_columns(**kwargs):
 
     cols_types = kwargs.get('cols_types')
@@ -139,3 +285,63 @@ def format_columns(**kwargs):
         raise ValueError
 
     return ', '.join([ct.upper() for ct in cols_types])
+
+
+def get_connection(sql_connector):
+    """
+    A partir do objeto conector inserido, retorna a conexão (objeto com .commit()) associada
+
+    inputs:
+    :: sql_connector [connector object] -> conexão ou cursor cx_Oracle/sqlite3
+
+    output:
+    :: [connection object] conexão à qual o conector pertence
+    """
+
+    _, module, connector_type = get_db_module_connectortype(sql_connector)
+    if module == 'sqlalchemy' or connector_type == 'connection':
+        return sql_connector
+    elif connector_type == 'cursor':
+        return sql_connector.connection
+    raise NotImplementedError
+
+
+def iter_batches(rows, batch_size):
+    """
+    Quebra um iterável de linhas em listas de até batch_size linhas, sem materializar o iterável inteiro
+
+    inputs:
+    :: rows [iterable] -> linhas a serem inseridas
+    :: batch_size [int] -> número máximo de linhas por lote
+
+    output:
+    :: [generator] de listas de linhas
+    """
+
+    assert batch_size and batch_size > 0, 'batch_size deve ser um inteiro positivo'
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_df_batches(df, batch_size, db='oracle'):
+    """
+    Percorre o DataFrame em lotes de batch_size linhas convertendo coluna a coluna, 
+    evitando o df.values.tolist() do DataFrame inteiro (que converte tudo para object).
+    Nulos viram None, datas viram datetime (texto no sqlite) e bools 0/1, ver binds.py
+
+    inputs:
+    :: df [pd.DataFrame] -> dados a serem inseridos
+    :: batch_size [int] -> número máximo de linhas por lote
+    :: db [str] -> banco de destino ('oracle', 'sqlite') | default: "oracle"
+
+    output:
+    :: [generator] de listas de tuplas prontas para o executemany
+    """
+
+    assert batch_size and batch_size > 0, 'batch_size deve ser um inteiro positivo'
+    yield from binds.iter_rows(df, batch_size, db=db)
+
@@ -0,0 +1,481 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from . import catalog
+from . import db_utils
+from . import helpers
+from . import pool
+from . import schema
+from . import tracing
+
+
+# # # # # # # # # # # # # # # #
+#                             #
+#   EXTRAÇÃO PARALELA         #
+#                             #
+# # # # # # # # # # # # # # # #
+
+def _group_extents(extents, partitions):
+    # extents (data_object_id, relative_fno, block_id, blocks, rowid inicial, rowid final) em até partitions grupos
+    # contíguos na ordem (objeto, arquivo, bloco), com números de blocos parecidos. cada grupo vira uma faixa de rowid
+    # por objeto e arquivo: como os grupos são contíguos, a faixa não alcança extents de outro grupo
+    extents = sorted(extents, key=lambda e: e[:3])
+    total = sum(e[3] for e in extents)
+    groups = [{} for _ in range(partitions)]
+    seen = 0
+    for obj, fno, block, blocks, low, high in extents:
+        group = groups[min(partitions - 1, seen * partitions // total)]
+        seen += blocks
+        if (obj, fno) in group:
+            group[(obj, fno)] = (group[(obj, fno)][0], high)
+        else:
+            group[(obj, fno)] = (low, high)
+    return [list(g.values()) for g in groups if g]
+
+
+def _get_oracle_rowid_filters(cursor, table_name, partitions):
+    # faixas de ROWID a partir dos extents da tabela (e das suas partições): cada filtro é lido por range scan
+    # de rowid, só nos blocos da faixa. tabelas de outro owner ("owner.tabela") exigem acesso a dba_extents
+    if '.' in table_name:
+        owner, name = table_name.upper().split('.')
+        views, owner_filter, params = ('dba_extents', 'dba_objects'), ' and e.owner = :owner and o.owner = :owner', {'owner': owner}
+    else:
+        name = table_name.upper()
+        views, owner_filter, params = ('user_extents', 'user_objects'), '', {}
+    params['name'] = name
+    q = f"""
+        select o.data_object_id, e.relative_fno, e.block_id, e.blocks,
+               dbms_rowid.rowid_create(1, o.data_object_id, e.relative_fno, e.block_id, 0),
+               dbms_rowid.rowid_create(1, o.data_object_id, e.relative_fno, e.block_id + e.blocks - 1, 32767)
+        from {views[0]} e
+        join {views[1]} o on o.object_name = e.segment_name and nvl(o.subobject_name, '-') = nvl(e.partition_name, '-')
+        where e.segment_name = :name and e.segment_type like 'TABLE%' and o.object_type like 'TABLE%'{owner_filter}
+    """
+    extents = tracing.execute(cursor, q, params).fetchall()
+    if not extents:
+        return ['1 = 1'] # tabela sem segmento (vazia)
+    return [
+        ' or '.join(f"rowid between chartorowid('{low}') and chartorowid('{high}')" for low, high in ranges)
+        for ranges in _group_extents(extents, partitions)
+    ]
+
+
+def get_partition_filters(sql_connector, table_name, partition_by='rowid', column=None, partitions=4):
+    """
+    Filtros (cláusulas where) que dividem table_name em partições disjuntas
+
+    inputs:
+    :: sql_connector [connector object] -> conector ao banco, usado para obter os limites das partições
+    :: table_name [str] -> tabela a ser dividida
+    :: partition_by [str] -> estratégia de divisão
+       "rowid" (default): oracle divide os extents da tabela em faixas de ROWID (cada worker lê apenas os seus blocos),
+       sqlite por faixas de rowid;
+       "key": faixas de valores da coluna numérica column;
+       "hash": buckets ORA_HASH(column) (apenas oracle)
+    :: column [str] -> coluna usada por "key" e "hash"
+    :: partitions [int] -> número de partições
+
+    output:
+    :: [list de str] um filtro por partição
+    """
+
+    db, _, _ = helpers.get_db_module_connectortype(sql_connector)
+    db = db.lower()
+    cursor = helpers.get_cursor(sql_connector)
+
+    if partition_by == 'hash':
+        assert column, 'partition_by="hash" exige column'
+        if db != 'oracle':
+            print(f'partition_by="hash" não implementado para {db}')
+            raise NotImplementedError
+        return [f'ora_hash({column}, {partitions - 1}) = {i}' for i in range(partitions)]
+
+    if partition_by == 'rowid' and db == 'oracle':
+        return _get_oracle_rowid_filters(cursor, table_name, partitions)
+
+    if partition_by == 'rowid':
+        column = 'rowid'
+    elif partition_by != 'key':
+        print(f'partition_by inválido: {partition_by}')
+        raise ValueError
+    assert column, 'partition_by="key" exige column'
+
+    low, high = tracing.execute(cursor, f'select min({column}), max({column}) from {table_name}').fetchone()
+    if low is None:
+        return [f'{column} is not null']
+    step = (high - low) / partitions
+    bounds = [low + step * i for i in range(partitions)] + [high]
+    filters = [f'{column} >= {bounds[i]!r} and {column} < {bounds[i + 1]!r}' for i in range(partitions - 1)]
+    filters.append(f'{column} >= {bounds[-2]!r} and {column} <= {high!r}')
+    return filters
+
+
+def _read_partition(connection_name, q, config_filename, chunksize, output_path):
+    # executado em cada worker, com a sua própria conexão
+    import pandas as pd
+
+    connection = db_utils.connect(connection_name, config_filename=config_filename)
+    try:
+        chunks = list(db_utils.read_query(connection, q, chunksize=chunksize))
+    finally:
+        connection.close()
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+    if not output_path:
+        return df
+    if output_path.endswith('.parquet'):
+        df.to_parquet(output_path, index=False)
+    elif output_path.endswith('.csv'):
+        df.to_csv(output_path, index=False)
+    else:
+        df.to_pickle(output_path)
+    return output_path
+
+
+def read_table_parallel(connection_name, table_name, partition_by='rowid', column=None, workers=4, partitions=None,
+                        columns='*', where=None, executor='thread', output_dir=None, fmt='parquet', chunksize=50000,
+                        config_filename='connections.json'):
+    """
+    Extrai table_name dividida em partições, cada uma lida por um worker com a sua própria conexão
+
+    inputs:
+    :: connection_name [str] -> nome da conexão salva (oracle ou sqlite)
+    :: table_name [str] -> tabela a ser extraída
+    :: partition_by [str] -> "rowid" (default), "key" ou "hash" (ver get_partition_filters)
+    :: column [str] -> coluna usada por "key" e "hash"
+    :: workers [int] -> número de threads/processos | default: 4
+    :: partitions [int] -> número de partições | default: workers
+    :: columns [str] -> colunas selecionadas | default: "*"
+    :: where [str] -> filtro adicional aplicado a todas as partições
+    :: executor [str] -> "thread" (default; os drivers liberam o GIL durante o fetch) ou "process"
+    :: output_dir [str] -> se informado, cada partição é salva em output_dir/part-NNNNN.fmt
+    :: fmt [str] -> formato dos arquivos de partição | "parquet" (default), "csv", "pickle"
+    :: chunksize [int] -> linhas por fetch em cada worker | default: 50000
+    :: config_filename -> arquivo onde estão salvos os dados de conexão (default: "connections.json")
+
+    output:
+    :: [pd.DataFrame] com as partições concatenadas ou [list] com os paths dos arquivos, se output_dir
+    """
+
+    partitions = partitions or workers
+    connection = db_utils.connect(connection_name, config_filename=config_filename)
+    try:
+        filters = get_partition_filters(connection, table_name, partition_by=partition_by, column=column, partitions=partitions)
+    finally:
+        connection.close()
+
+    queries = [
+        f'select {columns} from {table_name} where ({f}){f" and ({where})" if where else ""}'
+        for f in filters
+    ]
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        paths = [os.path.join(output_dir, f'part-{i:05d}.{fmt}') for i in range(len(queries))]
+    else:
+        paths = [None] * len(queries)
+
+    if executor == 'thread':
+        pool_executor = ThreadPoolExecutor(max_workers=workers)
+    elif executor == 'process':
+        pool_executor = ProcessPoolExecutor(max_workers=workers)
+    else:
+        print(f'executor inválido: {executor}')
+        raise ValueError
+
+    with pool_executor:
+        results = list(pool_executor.map(
+            _read_partition,
+            [connection_name] * len(queries), queries, [config_filename] * len(queries), [chunksize] * len(queries), paths
+        ))
+
+    if output_dir:
+        return results
+
+    import pandas as pd
+    return pd.concat(results, ignore_index=True)
+
+
+# # # # # # # # # # # # # # # #
+#                             #
+#   CARGA PARALELA            #
+#                             #
+# # # # # # # # # # # # # # # #
+
+class PartitionLoadError(RuntimeError):
+    """
+    Falha de uma ou mais partições de uma carga paralela
+
+    atributos:
+    :: errors [list] -> partições que falharam, com "partition", "start", "stop" e "error"
+    :: stats [dict] -> estatísticas da carga (ver insert_df_parallel); sem atomic, "rows" são as linhas gravadas
+    """
+
+    def __init__(self, message, errors, stats):
+        super().__init__(message)
+        self.errors = errors
+        self.stats = stats
+
+
+def _get_dependent_ddl(sql_connector, table_name, db):
+    # DDL dos objetos que dependem de table_name e se perdem no DROP: índices e triggers no sqlite; índices
+    # (exceto os de constraints, recriados por elas), constraints e grants no oracle
+    cursor = helpers.get_cursor(sql_connector)
+    if db == 'sqlite':
+        q = "SELECT sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND upper(tbl_name) = upper(:name) AND sql IS NOT NULL"
+        return [sql for sql, in tracing.execute(cursor, q, {'name': table_name}).fetchall()]
+
+    name = table_name.upper()
+    q = """
+        select dbms_metadata.get_ddl(object_type, object_name) from (
+            select 'INDEX' object_type, index_name object_name, 1 seq from user_indexes
+            where table_name = :name and index_name not in (
+                select index_name from user_constraints where table_name = :name and index_name is not null
+            )
+            union all
+            select decode(constraint_type, 'R', 'REF_CONSTRAINT', 'CONSTRAINT'), constraint_name, decode(constraint_type, 'R', 3, 2)
+            from user_constraints where table_name = :name and constraint_type in ('P', 'U', 'R', 'C')
+        ) order by seq
+    """
+    ddl = [str(d.read() if hasattr(d, 'read') else d) for d, in tracing.execute(cursor, q, {'name': name}).fetchall()]
+    q = 'select privilege, grantee, grantable from user_tab_privs_made where table_name = :name'
+    for privilege, grantee, grantable in tracing.execute(cursor, q, {'name': name}).fetchall():
+        ddl.append(f'GRANT {privilege} ON {name} TO "{grantee}"{" WITH GRANT OPTION" if grantable == "YES" else ""}')
+    return ddl
+
+
+def swap_tables(staging_table, table_name, sql_connector):
+    """
+    Substitui table_name por staging_table: DROP de table_name, RENAME da staging e recriação dos índices, triggers (sqlite),
+    constraints e grants (oracle) que table_name tinha. No sqlite tudo ocorre em uma transação; no oracle cada DDL
+    faz commit, então table_name fica ausente entre o DROP e o RENAME e, se a recriação falhar, a tabela fica
+    sem os dependentes (o DDL que falhou é impresso). Triggers do oracle, comentários e estatísticas não são recriados.
+
+    inputs:
+    :: staging_table [str] -> tabela já carregada, que passa a se chamar table_name
+    :: table_name [str] -> tabela substituída
+    :: sql_connector [connector object] -> conexão ou cursor cx_Oracle/sqlite3
+    """
+
+    helpers.check_identifier(staging_table)
+    helpers.check_identifier(table_name)
+    db, _, _ = helpers.get_db_module_connectortype(sql_connector)
+    db = db.lower()
+    connection = helpers.get_connection(sql_connector)
+    cursor = helpers.get_cursor(sql_connector)
+    dependents = _get_dependent_ddl(sql_connector, table_name, db)
+
+    if db == 'sqlite':
+        connection.commit()
+        tracing.execute(cursor, 'BEGIN')
+    try:
+        db_utils.drop_table(table_name, sql_connector)
+        tracing.execute(cursor, f'ALTER TABLE {staging_table} RENAME TO {table_name}')
+        for ddl in dependents:
+            try:
+                tracing.execute(cursor, ddl)
+            except Exception:
+                print(f'{table_name}: falha ao recriar dependente após a troca de tabelas: {ddl}')
+                raise
+    except:
+        if db == 'sqlite':
+            connection.rollback()
+        raise
+    finally:
+        catalog.invalidate(sql_connector, staging_table)
+        catalog.invalidate(sql_connector, table_name)
+    connection.commit()
+
+
+def _load_partition(connection_name, config_filename, workers, part, cols, table_name, batch_size, input_sizes):
+    # executado em cada worker, com uma conexão do pool do processo (ver pool.py).
+    # a partição inteira é uma transação: commit no fim, rollback (no release) em erro
+    start = time.perf_counter()
+    try:
+        with pool.get_pool(connection_name, config_filename=config_filename, max=workers).connection() as connection:
+            if hasattr(part, 'iloc'):
+                db, _, _ = helpers.get_db_module_connectortype(connection)
+                batches = helpers.iter_df_batches(part, batch_size, db)
+            else:
+                batches = helpers.iter_batches(part, batch_size)
+            stats = db_utils.insert_batches(batches, cols, table_name, connection, input_sizes=input_sizes)
+            connection.commit()
+    except Exception as e:
+        return {'rows': 0, 'seconds': time.perf_counter() - start, 'error': repr(e)}
+    return {'rows': stats['rows'], 'seconds': time.perf_counter() - start, 'error': None}
+
+
+def _insert_parallel(source, cols, types, table_name, connection_name, sql_connector, input_sizes, workers, executor, batch_size,
+                     partition_rows, max_pending, atomic, staging_table, swap, config_filename, v):
+    n = len(source)
+    partition_rows = partition_rows or max(batch_size, -(-n // (workers * 4)))
+    ranges = [(start, min(start + partition_rows, n)) for start in range(0, n, partition_rows)]
+    target = (staging_table or f'{table_name}_STG') if atomic else table_name
+    db, _, _ = helpers.get_db_module_connectortype(sql_connector)
+
+    if atomic:
+        helpers.check_identifier(target)
+        if db_utils.table_exists(sql_connector, target):
+            db_utils.drop_table(target, sql_connector) # sobra de uma carga interrompida
+        nologging = db == 'oracle'
+        if types:
+            # staging com o schema inferido dos dados (em um "replace", pode diferir do da tabela atual)
+            db_utils.create_table(target, sql_connector, cols=cols, types=types, nologging=nologging)
+        elif db_utils.table_exists(sql_connector, table_name):
+            # linhas sem tipos: staging com a estrutura do destino
+            tracing.execute(helpers.get_cursor(sql_connector),
+                            f'CREATE TABLE {target}{" NOLOGGING" if nologging else ""} AS SELECT {", ".join(cols)} FROM {table_name} WHERE 1 = 0')
+            catalog.invalidate(sql_connector, target)
+        else:
+            print(f'Tabela {table_name} não encontrada: a carga atomic de linhas exige a tabela de destino')
+            raise ValueError
+        helpers.get_connection(sql_connector).commit()
+
+    if executor == 'thread':
+        pool_executor = ThreadPoolExecutor(max_workers=workers)
+    elif executor == 'process':
+        pool_executor = ProcessPoolExecutor(max_workers=workers)
+    else:
+        print(f'executor inválido: {executor}')
+        raise ValueError
+
+    # back-pressure: no máximo max_pending partições em voo (com processos, cada uma é uma cópia serializada)
+    slots = threading.BoundedSemaphore(max_pending or 2 * workers)
+    start = time.perf_counter()
+    futures = []
+    with pool_executor:
+        for a, b in ranges:
+            slots.acquire()
+            part = source.iloc[a:b] if hasattr(source, 'iloc') else source[a:b]
+            future = pool_executor.submit(_load_partition, connection_name, config_filename, workers, part, cols, target,
+                                          batch_size, input_sizes)
+            future.add_done_callback(lambda _: slots.release())
+            futures.append(future)
+
+    errors = []
+    n_rows = 0
+    for i, ((a, b), future) in enumerate(zip(ranges, futures)):
+        result = {'rows': 0, 'error': repr(future.exception())} if future.exception() else future.result()
+        n_rows += result['rows']
+        if result['error']:
+            errors.append({'partition': i, 'start': a, 'stop': b, 'error': result['error']})
+
+    if atomic and errors:
+        db_utils.drop_table(target, sql_connector)
+        n_rows = 0
+    elif atomic and swap:
+        swap_tables(target, table_name, sql_connector)
+    elif atomic:
+        db_utils.move_staging(target, table_name, sql_connector, cols=cols)
+
+    seconds = time.perf_counter() - start
+    stats = {
+        'rows': n_rows,
+        'partitions': len(ranges),
+        'workers': workers,
+        'seconds': seconds,
+        'rows_per_sec': n_rows / seconds if seconds else float('inf'),
+        'errors': errors
+    }
+    if errors:
+        if atomic:
+            message = f'{table_name}: {len(errors)} de {len(ranges)} partições falharam, nada foi carregado | e.g. {errors[0]}'
+        else:
+            message = (f'{table_name}: {len(errors)} de {len(ranges)} partições falharam, {n_rows} linhas das demais '
+                       f'ficaram gravadas | e.g. {errors[0]}')
+        print(message)
+        raise PartitionLoadError(message, errors, stats)
+    if v:
+        print(f'{table_name}: {n_rows} linhas em {len(ranges)} partições, {workers} workers | {seconds:.2f}s | '
+              f'{stats["rows_per_sec"]:,.0f} linhas/s')
+    return stats
+
+
+def insert_df_parallel(df, table_name, connection_name, sql_connector=None, if_exists='fail', workers=4, executor='thread',
+                       batch_size=50000, partition_rows=None, max_pending=None, atomic=False, staging_table=None,
+                       config_filename='connections.json', v=False):
+    """
+    Carrega df em table_name dividido em partições, inseridas ao mesmo tempo por workers com conexões próprias
+
+    inputs:
+    :: df [pd.DataFrame] -> dados a serem inseridos
+    :: table_name [str] -> tabela de destino (criada a partir de df se não existir)
+    :: connection_name [str] -> conexão salva usada pelos workers, que emprestam conexões do pool do processo
+       (criado com max=workers; um pool já existente mantém o seu max)
+    :: sql_connector [connector object] -> conexão para criar/trocar tabelas | default: nova conexão de connection_name
+    :: if_exists [str] -> "fail" (default), "replace", "append" (como em insert_df)
+    :: workers [int] -> número de threads/processos | default: 4
+    :: executor [str] -> "thread" (default; os drivers liberam o GIL no executemany) ou "process"
+    :: batch_size [int] -> linhas por executemany | default: 50000
+    :: partition_rows [int] -> linhas por partição (cada partição é uma transação) | default: ~4 partições por worker
+    :: max_pending [int] -> partições em voo ao mesmo tempo, limitando a memória | default: 2 * workers
+    :: atomic [bool] -> tudo ou nada: os workers carregam staging_table (criada com o schema inferido de df) e, se todas
+       as partições forem gravadas, os dados passam para table_name em uma única operação (com if_exists="replace",
+       a staging substitui table_name, ver swap_tables); se alguma falhar, a staging é descartada e table_name
+       não é alterada | default: False
+    :: staging_table [str] -> staging do modo atomic | default: table_name + "_STG"
+    :: config_filename -> arquivo onde estão salvos os dados de conexão (default: "connections.json")
+    :: v [bool] -> imprime as estatísticas da carga
+
+    output:
+    :: [dict] com "rows", "partitions", "workers", "seconds", "rows_per_sec" e "errors" (vazio).
+       se alguma partição falhar, PartitionLoadError com as partições que falharam em "errors" e as estatísticas
+       em "stats" (sem atomic, as demais partições ficam gravadas)
+    """
+
+    owns_connector = sql_connector is None
+    if owns_connector:
+        sql_connector = db_utils.connect(connection_name, config_filename=config_filename)
+    try:
+        db, _, _ = helpers.get_db_module_connectortype(sql_connector)
+        df_schema = schema.infer_schema(df, db=db)
+        columns = [c.upper() for c in df.columns]
+        types = [c['type'].upper() for c in df_schema]
+
+        exists = db_utils.table_exists(sql_connector, table_name)
+        if exists and if_exists == 'fail':
+            print('Tabela já existe')
+            raise Exception
+        swap = atomic and exists and if_exists == 'replace'
+        if exists and if_exists == 'replace' and not atomic:
+            db_utils.drop_table(table_name, sql_connector)
+            exists = False
+        if not exists:
+            db_utils.create_table(table_name, sql_connector, cols=columns, types=types)
+            helpers.get_connection(sql_connector).commit()
+
+        return _insert_parallel(df, columns, types, table_name, connection_name, sql_connector, schema.get_input_sizes(df_schema, db),
+                                workers, executor, batch_size, partition_rows, max_pending, atomic, staging_table, swap,
+                                config_filename, v)
+    finally:
+        if owns_connector:
+            sql_connector.close()
+
+
+def insert_rows_parallel(rows, cols, table_name, connection_name, sql_connector=None, workers=4, executor='thread',
+                         batch_size=50000, partition_rows=None, max_pending=None, atomic=False, staging_table=None,
+                         input_sizes=None, config_filename='connections.json', v=False):
+    """
+    Como insert_df_parallel, para uma sequência de linhas (list de tuplas) e uma tabela já existente
+
+    inputs:
+    :: rows [list] -> linhas a serem inseridas (precisa aceitar fatiamento)
+    :: cols [list] -> nomes das colunas
+    :: input_sizes [list] -> tipos/tamanhos de bind por coluna (apenas oracle)
+    :: demais -> ver insert_df_parallel
+
+    output:
+    :: [dict] com estatísticas da carga, como em insert_df_parallel
+    """
+
+    owns_connector = sql_connector is None
+    if owns_connector:
+        sql_connector = db_utils.connect(connection_name, config_filename=config_filename)
+    try:
+        return _insert_parallel(rows, [c.upper() for c in cols], None, table_name, connection_name, sql_connector, input_sizes,
+                                workers, executor, batch_size, partition_rows, max_pending, atomic, staging_table, False,
+                                config_filename, v)
+    finally:
+        if owns_connector:
+            sql_connector.close()
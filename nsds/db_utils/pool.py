@@ -0,0 +1,372 @@
+import time
+import threading
+import queue
+from contextlib import contextmanager
+
+from . import backends
+from . import db_utils
+from . import failover
+from . import helpers
+from . import sqlite_profiles
+from . import statements
+from . import tracing
+
+
+# # # # # # # # # # # # #
+#                       #
+#   POOL DE CONEXÕES    #
+#                       #
+# # # # # # # # # # # # #
+
+# registro do processo: um pool e uma engine por nome de conexão
+_pools = {}
+_engines = {}
+_borrowed = {} # id(conexão emprestada) -> pool de origem, para o release a partir da conexão ou do cursor
+_creating = {} # nome da conexão -> lock da criação do seu pool (a criação conecta ao banco, fora de _lock)
+_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    Pool de conexões de uma conexão salva (connections.json).
+    Oracle utiliza cx_Oracle.SessionPool; SQLite mantém uma fila de conexões sqlite3 abertas.
+
+    inputs:
+    :: connection_name [str] -> nome da conexão
+    :: min [int] -> número de conexões abertas na criação do pool | default: 1
+    :: max [int] -> número máximo de conexões abertas ao mesmo tempo | default: 4
+    :: increment [int] -> conexões abertas de uma vez quando o pool cresce (apenas oracle) | default: 1
+    :: timeout [float] -> segundos aguardando uma conexão livre quando max é atingido | default: None (aguarda indefinidamente)
+    :: config_filename -> arquivo onde estão salvos os dados de conexão (default: "connections.json")
+    :: encoding [str] -> encoding a ser utilizado na conexão (apenas oracle) | default: "utf-8"
+    :: stmtcachesize [int] -> statements mantidos preparados por conexão | default: statements.DEFAULT_CACHE_SIZE
+    :: profile, pragmas, busy_timeout -> apenas sqlite: perfil de desempenho e busy timeout das conexões (ver connect_sqlite)
+       | default: os salvos na conexão
+    :: ping_interval [float] -> conexões ociosas há mais de ping_interval segundos são testadas antes de emprestadas
+       e trocadas se não responderem (0: sempre, None: nunca). no oracle, repassado ao SessionPool, que faz o teste
+       na própria aquisição | default: 60
+    :: retries, backoff -> apenas oracle: retry da criação do pool em erros de rede/listener (ver failover.connect)
+    """
+
+    def __init__(self, connection_name, min=1, max=4, increment=1, timeout=None, config_filename='connections.json', encoding='utf-8',
+                 stmtcachesize=statements.DEFAULT_CACHE_SIZE, profile=None, pragmas=None, busy_timeout=None, ping_interval=failover.DEFAULT_PING_INTERVAL,
+                 retries=None, backoff=None):
+        assert 0 <= min <= max and max > 0, 'Tamanhos do pool inválidos: deve valer 0 <= min <= max e max > 0'
+
+        self.connection_name = connection_name.upper()
+        self.min, self.max, self.timeout = min, max, timeout
+        self.stmtcachesize = stmtcachesize
+        self.ping_interval = ping_interval
+        self.hits, self.misses = 0, 0
+        self._lock = threading.Lock()
+        self._local = threading.local() # oracle: se a aquisição corrente criou uma sessão (ver _new_oracle_session)
+
+        connection_info = db_utils.get_connection_info(connection_name, config_filename=config_filename)
+        self.flavor = helpers.get_flavor(connection_info)
+
+        if self.flavor == 'oracle':
+            cx_Oracle = backends.load('oracle')
+            # com vários hosts, um descritor FAILOVER=on: cada nova sessão do pool tenta os hosts em ordem
+            self._pool = failover.connect(
+                lambda dsn: cx_Oracle.SessionPool(
+                    user=connection_info.get('user'),
+                    password=connection_info.get('password'),
+                    dsn=dsn,
+                    min=min, max=max, increment=increment,
+                    threaded=True,
+                    getmode=cx_Oracle.SPOOL_ATTRVAL_TIMEDWAIT if timeout else cx_Oracle.SPOOL_ATTRVAL_WAIT,
+                    wait_timeout=int(timeout * 1000) if timeout else 0,
+                    encoding=encoding,
+                    stmtcachesize=stmtcachesize,
+                    session_callback=self._new_oracle_session
+                ),
+                failover.get_dsns(connection_info, descriptor=True),
+                retries=retries if retries is not None else connection_info.get('retries', failover.DEFAULT_RETRIES),
+                backoff=backoff if backoff is not None else connection_info.get('backoff', failover.DEFAULT_BACKOFF)
+            )
+            self._pool.ping_interval = -1 if ping_interval is None else int(ping_interval) # negativo: sem ping
+        elif self.flavor == 'sqlite':
+            self._dbpath = helpers.format_sqlite_path(connection_info.get('dbpath'))
+            self._profile = profile or connection_info.get('profile')
+            self._pragmas = pragmas or connection_info.get('pragmas')
+            self._busy_timeout = busy_timeout if busy_timeout is not None else connection_info.get('busy_timeout', sqlite_profiles.DEFAULT_BUSY_TIMEOUT)
+            self._idle = queue.LifoQueue() # (conexão, momento da devolução), o momento para o ping das ociosas
+            self._slots = threading.BoundedSemaphore(max) # garante no máximo max conexões emprestadas
+            self._opened = 0
+            for _ in range(min):
+                self._idle.put((self._new_sqlite_connection(), None))
+        else:
+            print(f'db {self.flavor} não implementada')
+            raise NotImplementedError
+
+    def _new_sqlite_connection(self):
+        self._opened += 1
+        connection = sqlite_profiles.connect(self._dbpath, self._profile, self._pragmas, check_same_thread=False,
+                                             cached_statements=self.stmtcachesize, timeout=self._busy_timeout)
+        return statements.register(connection, self.stmtcachesize)
+
+    def _new_oracle_session(self, connection, requested_tag):
+        # session_callback do SessionPool: chamado na thread que adquire, apenas quando a sessão é nova
+        self._local.new_session = True
+        statements.register(connection, self.stmtcachesize)
+
+    def _is_stale(self, connection, released_at):
+        # conexão sqlite ociosa há mais de ping_interval que não responde ao ping (no oracle, o SessionPool testa)
+        if self.ping_interval is None or released_at is None or time.monotonic() - released_at < self.ping_interval:
+            return False
+        return not failover.ping(connection)
+
+    def _discard(self, connection):
+        # remove do pool uma conexão sqlite que não responde; a vaga fica livre para uma nova
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._opened -= 1
+        self._slots.release()
+
+    @tracing.traced('pool.acquire')
+    def acquire(self):
+        """
+        Empresta uma conexão do pool. Deve ser devolvida com release (ou utilizar o context manager connection).
+        Conexões ociosas há mais de ping_interval segundos são testadas e trocadas se a sessão caiu
+        """
+
+        for _ in range(self.max + 1):
+            connection, released_at = self._acquire()
+            if not self._is_stale(connection, released_at):
+                break
+            self._discard(connection)
+        else:
+            connection, _ = self._acquire()
+        with _lock:
+            _borrowed[id(connection)] = self
+        return connection
+
+    def _acquire(self):
+        # (conexão, momento da devolução ao pool ou None)
+        if self.flavor == 'oracle':
+            self._local.new_session = False
+            connection, released_at = self._pool.acquire(), None
+            hit = not self._local.new_session
+        else:
+            if not self._slots.acquire(timeout=self.timeout):
+                print(f'Pool {self.connection_name}: nenhuma conexão livre após {self.timeout}s')
+                raise TimeoutError
+            with self._lock:
+                try:
+                    (connection, released_at), hit = self._idle.get_nowait(), True
+                except queue.Empty:
+                    connection, released_at, hit = self._new_sqlite_connection(), None, False
+
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return connection, released_at
+
+    def release(self, connection):
+        """Devolve ao pool uma conexão obtida com acquire"""
+
+        with _lock:
+            _borrowed.pop(id(connection), None)
+        if self.flavor == 'oracle':
+            self._pool.release(connection)
+        else:
+            connection.rollback() # transações não finalizadas não passam para o próximo usuário
+            self._idle.put((connection, time.monotonic()))
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Context manager que empresta uma conexão e a devolve ao final do bloco"""
+
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    @contextmanager
+    def cursor(self):
+        """Context manager que empresta uma conexão e entrega um cursor dela, devolvendo a conexão ao final do bloco"""
+
+        with self.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+    def stats(self):
+        """Estatísticas do pool: hits (conexão reaproveitada), misses (conexão nova), abertas e emprestadas"""
+
+        if self.flavor == 'oracle':
+            opened, busy = self._pool.opened, self._pool.busy
+        else:
+            opened, busy = self._opened, self._opened - self._idle.qsize()
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else None,
+            'opened': opened,
+            'busy': busy,
+            'min': self.min,
+            'max': self.max
+        }
+
+    def close(self):
+        """Fecha as conexões do pool"""
+
+        if self.flavor == 'oracle':
+            self._pool.close(force=True)
+        else:
+            while True:
+                try:
+                    self._idle.get_nowait()[0].close()
+                except queue.Empty:
+                    break
+
+
+def get_pool(connection_name, **kwargs):
+    """
+    Pool do processo para connection_name, criado no primeiro uso.
+    kwargs (min, max, increment, timeout, config_filename, encoding, stmtcachesize, ping_interval, ...) só têm efeito na criação.
+
+    inputs:
+    :: connection_name [str] -> nome da conexão
+
+    output:
+    :: [ConnectionPool]
+    """
+
+    key = connection_name.upper()
+    with _lock:
+        if key in _pools:
+            return _pools[key]
+        creating = _creating.setdefault(key, threading.Lock())
+
+    # a criação (conexões iniciais, retry com backoff) não segura _lock: pools de outras conexões seguem disponíveis
+    # e apenas quem pede esta mesma conexão aguarda
+    with creating:
+        with _lock:
+            if key in _pools:
+                return _pools[key]
+        new_pool = ConnectionPool(connection_name, **kwargs)
+        with _lock:
+            _pools[key] = new_pool
+            _creating.pop(key, None)
+        return new_pool
+
+
+def get_engine(connection_name, config_filename='connections.json', **kwargs):
+    """
+    Engine SQLAlchemy compartilhada pelo processo para connection_name (e com ela seu pool de conexões)
+
+    inputs:
+    :: connection_name [str] -> nome da conexão
+    :: config_filename -> arquivo onde estão salvos os dados de conexão (default: "connections.json")
+
+    output:
+    :: [sqlalchemy.engine.Engine]
+    """
+
+    key = connection_name.upper()
+    with _lock:
+        if key not in _engines:
+            _engines[key] = db_utils.connect(connection_name, 'engine', config_filename=config_filename, **kwargs)
+        return _engines[key]
+
+
+def connect_pooled(connection_name, connection_type, config_filename='connections.json', **kwargs):
+    """
+    Implementação de connect_oracle/connect_sqlite com pooled=True
+
+    inputs:
+    :: connection_name [str] -> nome da conexão
+    :: connection_type [list] -> tipos de conexão já formatados por helpers.get_connection_type
+    :: config_filename -> arquivo onde estão salvos os dados de conexão (default: "connections.json")
+    :: min, max, increment, timeout, encoding, stmtcachesize, profile, pragmas, busy_timeout, ping_interval, retries, backoff ->
+       repassados para a criação do pool
+
+    output:
+    :: objeto conector ou tupla de objetos conectores, como em connect_oracle
+    """
+
+    assert connection_name, 'Conexões do pool exigem connection_name'
+    pool_kwargs = {k: kwargs[k] for k in ('min', 'max', 'increment', 'timeout', 'encoding', 'stmtcachesize', 'profile', 'pragmas', 'busy_timeout',
+                                            'ping_interval', 'retries', 'backoff') if k in kwargs}
+    engine_kwargs = {k: kwargs[k] for k in ('encoding',) if k in kwargs}
+
+    cnxn_objects = []
+    for ct in connection_type:
+        if ct == 'cc':
+            connection = get_pool(connection_name, config_filename=config_filename, **pool_kwargs).acquire()
+            cnxn_objects = [connection, connection.cursor()]
+        elif ct == 'connection':
+            cnxn_objects.append(get_pool(connection_name, config_filename=config_filename, **pool_kwargs).acquire())
+        elif ct == 'cursor':
+            cnxn_objects.append(get_pool(connection_name, config_filename=config_filename, **pool_kwargs).acquire().cursor())
+        elif ct == 'engine':
+            cnxn_objects.append(get_engine(connection_name, config_filename=config_filename, **engine_kwargs))
+
+    if len(cnxn_objects) > 1:
+        return tuple(cnxn_objects)
+    else:
+        return cnxn_objects[0]
+
+
+def release(sql_connector):
+    """
+    Devolve ao pool de origem uma conexão (ou a conexão de um cursor) obtida com pooled=True
+
+    inputs:
+    :: sql_connector [connector object] -> conexão ou cursor emprestado do pool
+    """
+
+    connection = helpers.get_connection(sql_connector)
+    with _lock:
+        origin = _borrowed.get(id(connection))
+    if origin is None:
+        print(f'Conexão {connection} não pertence a nenhum pool')
+        raise ValueError
+    origin.release(connection)
+
+
+@contextmanager
+def pooled_connection(connection_name, **kwargs):
+    """
+    Context manager que empresta uma conexão do pool de connection_name e a devolve ao final do bloco
+
+    inputs:
+    :: connection_name [str] -> nome da conexão
+    :: min, max, increment, timeout, config_filename, encoding -> repassados para a criação do pool
+    """
+
+    with get_pool(connection_name, **kwargs).connection() as connection:
+        yield connection
+
+
+def pool_stats():
+    """Estatísticas de todos os pools do processo, por nome de conexão"""
+
+    with _lock:
+        pools = dict(_pools)
+    return {name: p.stats() for name, p in pools.items()}
+
+
+def close_all():
+    """Fecha e remove do registro todos os pools e engines do processo"""
+
+    with _lock:
+        pools, engines = list(_pools.values()), list(_engines.values())
+        _pools.clear()
+        _engines.clear()
+        _borrowed.clear()
+    for p in pools:
+        p.close()
+    for engine in engines:
+        engine.dispose()
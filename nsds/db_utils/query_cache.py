@@ -0,0 +1,304 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+
+from . import config
+from . import db_utils
+from . import helpers
+from . import staging
+from . import tracing
+
+
+# # # # # # # # # # # # # # # # #
+#                               #
+#   CACHE DE RESULTADOS         #
+#                               #
+# # # # # # # # # # # # # # # # #
+
+# diretório padrão do cache; pode ser trocado pela variável de ambiente
+CACHE_DIR_ENV_VAR = 'NSDS_CACHE_DIR'
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'nsds', 'queries')
+
+_caches = {}
+_lock = threading.Lock()
+
+
+def normalize_sql(q):
+    """
+    Texto da consulta usado na chave do cache: espaços colapsados, minúsculas e sem ";" final,
+    preservando os literais entre aspas simples e os identificadores entre aspas duplas
+    (e.g. SELECT "Id"\\n FROM T where a = 'X' -> select "Id" from t where a = 'X')
+    """
+
+    parts = re.split(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""", q)
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r'\s+', ' ', parts[i]).lower()
+    return ''.join(parts).strip().rstrip(';').strip()
+
+
+def get_tables(q):
+    """Tabelas citadas após FROM/JOIN em q (detecção simples, usada por depends_on="auto")"""
+
+    names = re.findall(r'\b(?:from|join)\s+([a-z_][\w$#]*(?:\.[a-z_][\w$#]*)?)', normalize_sql(q))
+    return sorted(set(n.upper() for n in names) - {'DUAL'})
+
+
+def get_key(connection_name, q, params=None):
+    """Chave do cache: hash de nome da conexão + consulta normalizada + binds"""
+
+    if isinstance(params, dict):
+        params = sorted(params.items())
+    content = json.dumps([connection_name.upper(), normalize_sql(q), params], default=str)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def get_version(sql_connector, tables, validate='ddl', dbpath=None):
+    """
+    Versão dos dados das tabelas, comparada na leitura para invalidar entradas antigas
+
+    inputs:
+    :: sql_connector [connector object] -> conector ao banco (não usado no sqlite)
+    :: tables [list] -> tabelas ("owner.tabela" ou "tabela")
+    :: validate [str] -> oracle: "ddl" (max(last_ddl_time) em all_objects; muda com DDL, truncate e operações
+       de partição, não com DML) ou "scn" (max(ora_rowscn) de cada tabela; muda com DML, mas percorre a tabela)
+    :: dbpath [str] -> sqlite: arquivo do banco; a versão é a data de modificação e o tamanho do arquivo e do seu
+       "-wal" (em modo WAL, os commits ficam no -wal e o arquivo principal só muda no checkpoint)
+
+    output:
+    :: [str] versão
+    """
+
+    if dbpath:
+        version = []
+        for path in (dbpath, f'{dbpath}-wal'):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError: # sem -wal: journal de rollback ou WAL sem conexões abertas
+                continue
+            version.append(f'{stat.st_mtime_ns}-{stat.st_size}')
+        return '/'.join(version)
+
+    cursor = helpers.get_cursor(sql_connector)
+    if validate == 'scn':
+        return str(max(tracing.execute(cursor, f'SELECT max(ora_rowscn) FROM {t}').fetchone()[0] or 0 for t in tables))
+    if validate != 'ddl':
+        print(f'validate inválido: {validate} | "ddl" ou "scn"')
+        raise ValueError
+
+    filters, params = [], {}
+    for i, table in enumerate(tables):
+        owner, name = table.split('.') if '.' in table else (None, table)
+        params[f'name{i}'] = name.upper()
+        if owner:
+            params[f'owner{i}'] = owner.upper()
+            filters.append(f'(object_name = :name{i} and owner = :owner{i})')
+        else:
+            filters.append(f'object_name = :name{i}')
+    q = f"select max(last_ddl_time) from all_objects where object_type = 'TABLE' and ({' or '.join(filters)})"
+    last_ddl_time = tracing.execute(cursor, q, params).fetchone()[0]
+    return last_ddl_time.isoformat() if last_ddl_time else ''
+
+
+class QueryCache:
+    """
+    Cache em disco de resultados de consultas, em arquivos Arrow IPC (feather) comprimidos.
+    Cada entrada é <chave>.arrow mais <chave>.json com os metadados; a data de modificação do .arrow
+    marca o último acesso, usado na remoção LRU quando o diretório passa de max_bytes.
+
+    inputs:
+    :: directory [str] -> diretório do cache | default: $NSDS_CACHE_DIR ou ~/.cache/nsds/queries
+    :: max_bytes [int] -> tamanho máximo do cache em disco | default: 2GB
+    :: compression [str] -> "zstd" (default), "lz4" ou None. sem compressão, a leitura por memory map não copia
+       os dados das colunas; com compressão, os buffers são descomprimidos na leitura
+    """
+
+    def __init__(self, directory=None, max_bytes=2 * 1024 ** 3, compression='zstd'):
+        self.directory = directory or os.environ.get(CACHE_DIR_ENV_VAR) or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.hits, self.misses = 0, 0
+        self._lock = threading.Lock() # o cache do processo é compartilhado entre threads
+        os.makedirs(self.directory, exist_ok=True)
+
+    def record(self, hit):
+        """Conta um acerto (hit=True) ou uma falta nas estatísticas"""
+
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _paths(self, key):
+        return os.path.join(self.directory, f'{key}.arrow'), os.path.join(self.directory, f'{key}.json')
+
+    def get(self, key, ttl=None, version=None):
+        """DataFrame da entrada key ou None se ausente, expirada (ttl em segundos) ou de outra versão"""
+
+        pyarrow = staging._import_pyarrow()
+        import pyarrow.feather
+
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as fp:
+                meta = json.load(fp)
+        except (FileNotFoundError, ValueError):
+            return None
+        if ttl is not None and time.time() - meta['created'] > ttl:
+            return None
+        if version is not None and meta.get('version') != version:
+            return None
+        try:
+            table = pyarrow.feather.read_table(data_path, memory_map=True)
+            os.utime(data_path) # último acesso, para o LRU
+        except (FileNotFoundError, OSError, pyarrow.ArrowInvalid):
+            return None
+        return table.to_pandas()
+
+    def put(self, key, df, **meta):
+        """Grava df na entrada key (escrita atômica) e remove as entradas menos usadas se passar de max_bytes"""
+
+        staging._import_pyarrow()
+        import pyarrow.feather
+
+        data_path, meta_path = self._paths(key)
+        tmp_path = f'{data_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            pyarrow.feather.write_feather(df, tmp_path, compression=self.compression or 'uncompressed')
+            os.replace(tmp_path, data_path)
+        except:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        config.write_json_atomic(meta_path, dict(meta, created=time.time(), bytes=os.path.getsize(data_path)))
+        self.evict()
+
+    def entries(self):
+        """Entradas do cache: [(chave, bytes, último acesso)], da menos para a mais recente"""
+
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.arrow'):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((name[:-len('.arrow')], stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda e: e[2])
+
+    def evict(self):
+        """Remove as entradas menos recentemente usadas até o cache caber em max_bytes"""
+
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+        for key, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            self.invalidate(key)
+            total -= size
+
+    def invalidate(self, key):
+        """Remove a entrada key"""
+
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        """Remove todas as entradas"""
+
+        for key, _, _ in self.entries():
+            self.invalidate(key)
+
+    def stats(self):
+        entries = self.entries()
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else None,
+            'entries': len(entries),
+            'bytes': sum(e[1] for e in entries),
+            'max_bytes': self.max_bytes
+        }
+
+
+def get_cache(directory=None, **kwargs):
+    """Cache do processo para directory (kwargs só têm efeito na criação)"""
+
+    directory = directory or os.environ.get(CACHE_DIR_ENV_VAR) or DEFAULT_CACHE_DIR
+    with _lock:
+        if directory not in _caches:
+            _caches[directory] = QueryCache(directory, **kwargs)
+        return _caches[directory]
+
+
+def read_cached(connection_name, q, params=None, ttl=None, depends_on=None, validate='ddl', refresh=False, cache=None,
+                chunksize=100000, config_filename='connections.json'):
+    """
+    Resultado de q como DataFrame, lido do cache em disco quando possível e do banco caso contrário.
+    Um acerto só com ttl não abre conexão; com depends_on, apenas a versão das tabelas é consultada.
+
+    inputs:
+    :: connection_name [str] -> conexão salva (oracle ou sqlite)
+    :: q [str] -> consulta
+    :: params [dict ou list] -> parâmetros de bind (fazem parte da chave)
+    :: ttl [float] -> segundos de validade da entrada | default: None (sem expiração)
+    :: depends_on [list ou str] -> tabelas cuja versão invalida a entrada, ou "auto" (tabelas após FROM/JOIN).
+       no sqlite, a versão é a data de modificação do arquivo do banco e do seu -wal | default: None
+    :: validate [str] -> versão das tabelas no oracle: "ddl" (last_ddl_time) ou "scn" (ora_rowscn), ver get_version
+    :: refresh [bool] -> ignora a entrada existente e consulta o banco | default: False
+    :: cache [QueryCache] -> cache a ser utilizado | default: get_cache()
+    :: chunksize [int] -> linhas por fetch na leitura do banco | default: 100000
+    :: config_filename -> arquivo onde estão salvos os dados de conexão (default: "connections.json")
+
+    output:
+    :: [pd.DataFrame]
+    """
+
+    import pandas as pd
+
+    cache = cache or get_cache()
+    key = get_key(connection_name, q, params)
+    if depends_on == 'auto':
+        depends_on = get_tables(q)
+
+    connection = None
+    try:
+        version = None
+        if depends_on:
+            connection_info = db_utils.get_connection_info(connection_name, config_filename=config_filename)
+            if helpers.get_flavor(connection_info) == 'sqlite':
+                version = get_version(None, depends_on, dbpath=helpers.format_sqlite_path(connection_info['dbpath']))
+            else:
+                connection = db_utils.connect(connection_name, config_filename=config_filename)
+                version = get_version(connection, depends_on, validate=validate)
+
+        if not refresh:
+            with tracing.span('cache.get', tracing.fingerprint(q)):
+                df = cache.get(key, ttl=ttl, version=version)
+            if df is not None:
+                cache.record(True)
+                return df
+        cache.record(False)
+
+        connection = connection or db_utils.connect(connection_name, config_filename=config_filename)
+        chunks = list(db_utils.read_query(connection, q, params=params, chunksize=chunksize))
+        df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+        try:
+            cache.put(key, df, connection=connection_name.upper(), sql=normalize_sql(q), tables=depends_on, version=version)
+        except Exception as e:
+            # a leitura já funcionou: uma falha na gravação (e.g. coluna object com tipos mistos que o arrow não converte)
+            # apenas deixa a consulta fora do cache
+            print(f'Resultado não gravado no cache: {e!r}')
+        return df
+    finally:
+        if connection is not None:
+            connection.close()
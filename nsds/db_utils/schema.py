@@ -0,0 +1,306 @@
+import decimal
+
+from . import backends
+
+
+# # # # # # # # # # # # # # # #
+#                             #
+#   INFERÊNCIA DE SCHEMA      #
+#                             #
+# # # # # # # # # # # # # # # #
+
+ORACLE_MAX_VARCHAR = 4000 # bytes; acima disso a coluna vira CLOB
+ORACLE_MAX_PRECISION = 38
+MAX_SCALE = 10 # casas decimais testadas para floats; acima disso a coluna vira BINARY_DOUBLE
+
+
+def _digits(value):
+    return len(str(int(abs(value))))
+
+
+def _infer_float_scale(values):
+    # menor número de casas decimais que representa todos os valores exatamente (vetorizado por escala testada).
+    # a comparação é exata: np.round(v, s) == v apenas quando v é o float do decimal com s casas, ou seja, quando
+    # o NUMBER(p,s) do oracle devolve o mesmo valor. sem escala exata até MAX_SCALE, None (coluna BINARY_DOUBLE)
+    import numpy as np
+
+    for scale in range(MAX_SCALE + 1):
+        if (np.round(values, scale) == values).all():
+            return scale
+    return None
+
+
+def _bind_type(db, name):
+    # tipos de bind só existem no oracle; o driver é carregado apenas quando o destino é oracle
+    return getattr(backends.load('oracle'), name) if db == 'oracle' else None
+
+
+def infer_column(series, db='oracle'):
+    """
+    Tipo SQL e tipo de bind de uma coluna, a partir de uma varredura vetorizada dos seus valores
+
+    inputs:
+    :: series [pd.Series] -> coluna do DataFrame
+    :: db [str] -> banco de destino ('oracle', 'sqlite')
+
+    output:
+    :: [dict] com "column", "type" (e.g. "NUMBER(5)", "VARCHAR2(12)"), "input_size" (para cursor.setinputsizes)
+       e "nullable"
+    """
+
+    import pandas as pd
+
+    kind = series.dtype
+    if isinstance(kind, pd.CategoricalDtype):
+        series = series.astype(kind.categories.dtype)
+        kind = series.dtype
+    values = series.dropna()
+    info = {'column': series.name, 'nullable': bool(len(values) < len(series))}
+
+    if pd.api.types.is_bool_dtype(kind):
+        info['type'] = 'NUMBER(1)' if db == 'oracle' else 'INTEGER'
+        info['input_size'] = _bind_type(db, 'NUMBER')
+
+    elif pd.api.types.is_integer_dtype(kind):
+        precision = max(_digits(values.min()), _digits(values.max())) if len(values) else 1
+        info['type'] = f'NUMBER({min(precision, ORACLE_MAX_PRECISION)})' if db == 'oracle' else 'INTEGER'
+        info['input_size'] = _bind_type(db, 'NUMBER')
+
+    elif pd.api.types.is_float_dtype(kind):
+        import numpy as np
+
+        values = values.to_numpy(dtype='float64')
+        finite = values[np.isfinite(values)]
+        scale = _infer_float_scale(finite) if len(finite) else 0
+        if db != 'oracle':
+            info['type'] = 'REAL'
+            info['input_size'] = _bind_type(db, 'NATIVE_FLOAT')
+        elif scale is None or len(finite) < len(values):
+            info['type'] = 'BINARY_DOUBLE'
+            info['input_size'] = _bind_type(db, 'NATIVE_FLOAT')
+        else:
+            integer_digits = max(_digits(finite.min()), _digits(finite.max())) if len(finite) else 1
+            precision = integer_digits + scale
+            if precision > ORACLE_MAX_PRECISION:
+                info['type'] = 'BINARY_DOUBLE'
+                info['input_size'] = _bind_type(db, 'NATIVE_FLOAT')
+            else:
+                info['type'] = f'NUMBER({precision},{scale})' if scale else f'NUMBER({precision})'
+                info['input_size'] = _bind_type(db, 'NUMBER')
+
+    elif pd.api.types.is_datetime64_any_dtype(kind):
+        tz = getattr(kind, 'tz', None)
+        if db != 'oracle':
+            info['type'] = 'TEXT'
+            info['input_size'] = None
+        elif tz is not None:
+            # o bind leva o instante em UTC sem fuso (ver binds._datetime): um TIMESTAMP WITH TIME ZONE receberia
+            # o fuso da sessão e guardaria outro instante
+            info['type'] = 'TIMESTAMP'
+            info['input_size'] = _bind_type(db, 'TIMESTAMP')
+        elif len(values) and ((values.dt.microsecond != 0) | (values.dt.nanosecond != 0)).any():
+            info['type'] = 'TIMESTAMP'
+            info['input_size'] = _bind_type(db, 'TIMESTAMP')
+        else:
+            info['type'] = 'DATE'
+            info['input_size'] = _bind_type(db, 'DATETIME')
+
+    elif len(values) and pd.api.types.infer_dtype(values, skipna=True) == 'decimal':
+        # decimal.Decimal (e.g. NUMBER lido como Decimal, decimal do arrow/parquet): precisão e escala exatas dos dígitos
+        exponents = [v.as_tuple().exponent for v in values]
+        scale = max(0, -min(exponents))
+        integer_digits = max(max(v.adjusted() + 1 for v in values), 1)
+        if db != 'oracle':
+            info['type'] = 'REAL'
+            info['input_size'] = None
+        elif integer_digits + scale > ORACLE_MAX_PRECISION:
+            info['type'] = 'BINARY_DOUBLE'
+            info['input_size'] = _bind_type(db, 'NATIVE_FLOAT')
+        else:
+            info['type'] = f'NUMBER({integer_digits + scale},{scale})' if scale else f'NUMBER({integer_digits})'
+            info['input_size'] = _bind_type(db, 'NUMBER')
+
+    else:
+        n_bytes = values.astype(str).str.encode('utf-8').str.len()
+        max_bytes = int(n_bytes.max()) if len(n_bytes) else 1
+        if db != 'oracle':
+            info['type'] = 'TEXT'
+            info['input_size'] = None
+        elif max_bytes > ORACLE_MAX_VARCHAR:
+            info['type'] = 'CLOB'
+            info['input_size'] = _bind_type(db, 'CLOB')
+        else:
+            info['type'] = f'VARCHAR2({max(max_bytes, 1)})'
+            info['input_size'] = max(max_bytes, 1)
+
+    return info
+
+
+def infer_schema(df, db='oracle'):
+    """
+    Schema SQL do DataFrame (uma varredura por coluna): tipos justos para o create_table e
+    tamanhos de bind para o cursor.setinputsizes do insert
+
+    inputs:
+    :: df [pd.DataFrame] -> dados a serem inseridos
+    :: db [str] -> banco de destino ('oracle', 'sqlite')
+
+    output:
+    :: [list de dict] um dict por coluna, ver infer_column
+    """
+
+    return [infer_column(df[c], db=db) for c in df.columns]
+
+
+def get_input_sizes(schema, db='oracle'):
+    """Tamanhos de bind para cursor.setinputsizes a partir de infer_schema (None quando o banco não utiliza)"""
+
+    if db != 'oracle':
+        return None
+    return [c['input_size'] for c in schema]
+
+
+def _parse_type(type_):
+    # "NUMBER(10,2)" -> ("NUMBER", [10, 2])
+    name, _, args = type_.upper().partition('(')
+    return name.strip(), [int(a) for a in args.rstrip(')').split(',')] if args else []
+
+
+def _get_input_size(type_, db):
+    # tipo de bind de um tipo SQL de infer_column
+    name, args = _parse_type(type_)
+    if db != 'oracle':
+        return None
+    if name == 'VARCHAR2':
+        return args[0]
+    bind = {'NUMBER': 'NUMBER', 'BINARY_DOUBLE': 'NATIVE_FLOAT', 'DATE': 'DATETIME', 'TIMESTAMP': 'TIMESTAMP', 'CLOB': 'CLOB'}
+    return _bind_type(db, bind[name])
+
+
+def _merge_type(a, b, db):
+    if a == b:
+        return a
+    (name_a, args_a), (name_b, args_b) = _parse_type(a), _parse_type(b)
+    names = {name_a, name_b}
+    if db != 'oracle':
+        if names <= {'INTEGER', 'REAL'}:
+            return 'REAL'
+        return 'TEXT'
+    if names == {'NUMBER'}:
+        integer_digits = max(args[0] - (args[1] if len(args) > 1 else 0) for args in (args_a, args_b))
+        scale = max(args[1] if len(args) > 1 else 0 for args in (args_a, args_b))
+        if integer_digits + scale > ORACLE_MAX_PRECISION:
+            return 'BINARY_DOUBLE'
+        return f'NUMBER({integer_digits + scale},{scale})' if scale else f'NUMBER({integer_digits})'
+    if names <= {'NUMBER', 'BINARY_DOUBLE'}:
+        return 'BINARY_DOUBLE'
+    if names <= {'DATE', 'TIMESTAMP'}:
+        return 'TIMESTAMP'
+    if names == {'VARCHAR2'}:
+        return f'VARCHAR2({max(args_a[0], args_b[0])})'
+    if names <= {'VARCHAR2', 'CLOB'}:
+        return 'CLOB'
+    print(f'Tipos incompatíveis na mesma coluna: {a} e {b}')
+    raise ValueError
+
+
+def merge_schema(left, right, db='oracle'):
+    """
+    Schema que comporta os dados de dois schemas das mesmas colunas (e.g. infer_schema de lotes diferentes):
+    NUMBER com a maior parte inteira e a maior escala, VARCHAR2 com o maior tamanho, DATE + TIMESTAMP -> TIMESTAMP etc.
+
+    inputs:
+    :: left, right [list de dict] -> schemas de infer_schema, com as colunas na mesma ordem
+    :: db [str] -> banco de destino ('oracle', 'sqlite')
+
+    output:
+    :: [list de dict] como em infer_schema
+    """
+
+    merged = []
+    for a, b in zip(left, right):
+        type_ = _merge_type(a['type'], b['type'], db)
+        merged.append({'column': a['column'], 'type': type_, 'input_size': _get_input_size(type_, db),
+                       'nullable': a['nullable'] or b['nullable']})
+    return merged
+
+
+def _oracle_number(precision, scale):
+    # tipo python e arrow de uma coluna NUMBER pelo cursor.description: inteiros que cabem em int64, decimais exatos
+    # (Decimal) com precisão/escala declaradas e float apenas para NUMBER/FLOAT sem escala (scale -127)
+    import pyarrow
+
+    precision = precision or 0
+    if scale == -127 or precision == 0:
+        return float, pyarrow.float64()
+    if scale <= 0:
+        digits = precision - scale
+        if digits <= 18:
+            return int, pyarrow.int64()
+        return int, pyarrow.decimal128(min(digits, ORACLE_MAX_PRECISION), 0)
+    return decimal.Decimal, pyarrow.decimal128(precision, scale)
+
+
+def get_arrow_schema(description, db='oracle'):
+    """
+    Tipos arrow do resultado de uma consulta a partir do cursor.description (tipo, precisão e escala declarados),
+    sem olhar os valores: um lote com 1.5 em uma coluna que começou com inteiros não muda o tipo.
+    No sqlite o description não traz tipos: as colunas ficam None e o tipo vem dos valores
+
+    inputs:
+    :: description [list] -> cursor.description após o execute
+    :: db [str] -> banco de origem ('oracle', 'sqlite')
+
+    output:
+    :: [list] de (coluna, tipo pyarrow ou None)
+    """
+
+    import pyarrow
+
+    if db != 'oracle':
+        return [(d[0], None) for d in description]
+
+    cx_Oracle = backends.load('oracle')
+    types = {
+        cx_Oracle.DB_TYPE_BINARY_DOUBLE: pyarrow.float64(),
+        cx_Oracle.DB_TYPE_BINARY_FLOAT: pyarrow.float32(),
+        cx_Oracle.DB_TYPE_BINARY_INTEGER: pyarrow.int64(),
+        cx_Oracle.DB_TYPE_DATE: pyarrow.timestamp('s'),
+        cx_Oracle.DB_TYPE_TIMESTAMP: pyarrow.timestamp('us'),
+        cx_Oracle.DB_TYPE_TIMESTAMP_TZ: pyarrow.timestamp('us'),
+        cx_Oracle.DB_TYPE_TIMESTAMP_LTZ: pyarrow.timestamp('us'),
+        cx_Oracle.DB_TYPE_INTERVAL_DS: pyarrow.duration('us'),
+        cx_Oracle.DB_TYPE_CLOB: pyarrow.large_string(),
+        cx_Oracle.DB_TYPE_NCLOB: pyarrow.large_string(),
+        cx_Oracle.DB_TYPE_LONG: pyarrow.large_string(),
+        cx_Oracle.DB_TYPE_BLOB: pyarrow.large_binary(),
+        cx_Oracle.DB_TYPE_RAW: pyarrow.binary(),
+        cx_Oracle.DB_TYPE_LONG_RAW: pyarrow.large_binary(),
+    }
+    arrow_schema = []
+    for name, type_code, _, _, precision, scale, _ in description:
+        if type_code is cx_Oracle.DB_TYPE_NUMBER:
+            arrow_schema.append((name, _oracle_number(precision, scale)[1]))
+        else:
+            arrow_schema.append((name, types.get(type_code, pyarrow.string())))
+    return arrow_schema
+
+
+def get_output_handler(db='oracle'):
+    """
+    outputtypehandler do cx_Oracle coerente com get_arrow_schema: NUMBER como int, Decimal ou float conforme
+    precisão/escala (sem tipos mistos por valor) e LOBs lidos direto como str/bytes. None no sqlite
+    """
+
+    if db != 'oracle':
+        return None
+    cx_Oracle = backends.load('oracle')
+
+    def handler(cursor, name, default_type, size, precision, scale):
+        if default_type is cx_Oracle.DB_TYPE_NUMBER:
+            return cursor.var(_oracle_number(precision, scale)[0], arraysize=cursor.arraysize)
+        if default_type in (cx_Oracle.DB_TYPE_CLOB, cx_Oracle.DB_TYPE_NCLOB):
+            return cursor.var(cx_Oracle.DB_TYPE_LONG, arraysize=cursor.arraysize)
+        if default_type is cx_Oracle.DB_TYPE_BLOB:
+            return cursor.var(cx_Oracle.DB_TYPE_LONG_RAW, arraysize=cursor.arraysize)
+    return handler
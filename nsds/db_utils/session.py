@@ -0,0 +1,244 @@
+from . import catalog
+from . import db_utils
+from . import helpers
+from . import schema
+from . import tracing
+
+
+# # # # # # # # # # # # # # # # # # #
+#                                   #
+#   SESSÃO (UNIDADE DE TRABALHO)    #
+#                                   #
+# # # # # # # # # # # # # # # # # # #
+
+# códigos de erro oracle ignorados em drop_table(if_exists=True) e create_table(if_not_exists=True)
+ORA_TABLE_NOT_FOUND = -942
+ORA_NAME_IN_USE = -955
+
+
+def get_plsql_block(statements):
+    """
+    Bloco PL/SQL anônimo que executa statements em sequência, em um único round trip.
+    Cada comando vai por EXECUTE IMMEDIATE: DDL não é aceito como SQL estático e uma tabela criada
+    no próprio bloco não existe quando o bloco é compilado
+
+    inputs:
+    :: statements [list] -> (comando, código de erro ignorado ou None)
+
+    output:
+    :: [str] bloco "BEGIN ... END;"
+    """
+
+    lines = []
+    for q, ignore in statements:
+        line = "EXECUTE IMMEDIATE '{}';".format(q.strip().rstrip(';').replace("'", "''"))
+        if ignore:
+            line = f'BEGIN {line} EXCEPTION WHEN OTHERS THEN IF SQLCODE != {ignore} THEN RAISE; END IF; END;'
+        lines.append(line)
+    return 'BEGIN\n' + '\n'.join(lines) + '\nEND;'
+
+
+class Session:
+    """
+    Unidade de trabalho: uma conexão e um cursor reaproveitados por uma sequência de operações.
+    DDL e DML sem binds são enfileirados e enviados juntos no próximo flush: um bloco PL/SQL anônimo no oracle
+    ou um único executescript no sqlite (um round trip por flush). Inserts usam o mesmo cursor e transação.
+    Com with, ao sair há commit (rollback se houve exceção) e o cursor, e a conexão se aberta pela sessão, são fechados.
+    No oracle, DDL faz commit implícito: o rollback desfaz apenas o DML posterior ao último DDL.
+
+    inputs:
+    :: sql_connector [connector object ou str] -> conexão ou cursor cx_Oracle/sqlite3, ou nome de uma conexão salva
+       (aberta e fechada pela sessão)
+    :: config_filename -> arquivo onde estão salvos os dados de conexão (default: "connections.json")
+
+    e.g.
+    with Session('MINHA_CONEXAO') as s:
+        for name, df in frames.items():
+            s.insert_df(df, name, if_exists='replace')
+    """
+
+    def __init__(self, sql_connector, config_filename='connections.json'):
+        self.owns_connection = isinstance(sql_connector, str)
+        if self.owns_connection:
+            sql_connector = db_utils.connect(sql_connector, config_filename=config_filename)
+        db, module, _ = helpers.get_db_module_connectortype(sql_connector)
+        if module not in ('cx_oracle', 'sqlite3'):
+            if self.owns_connection:
+                sql_connector.close()
+            print(f'Session não implementada para {module}')
+            raise NotImplementedError
+
+        self.db = db.lower()
+        self.connection = helpers.get_connection(sql_connector)
+        self.cursor = helpers.get_cursor(sql_connector)
+        self.owns_cursor = self.cursor is not sql_connector
+        self.pending = [] # (comando, código de erro ignorado ou None)
+        self.touched = set() # tabelas com DDL pendente, invalidadas no catálogo após o flush
+        self.round_trips = 0
+        self.statements = 0
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.commit()
+            else:
+                self.rollback()
+        finally:
+            self.close()
+
+    def _check(self):
+        if self.closed:
+            print('Sessão já fechada')
+            raise RuntimeError
+
+    def execute(self, q, params=None):
+        """
+        Enfileira q (DDL ou DML sem retorno de linhas) para o próximo flush.
+        Com params, q é executado imediatamente (após o flush do que estiver pendente)
+        """
+
+        self._check()
+        if params:
+            self.flush()
+            tracing.execute(self.cursor, q, params)
+            self.round_trips += 1
+            self.statements += 1
+        else:
+            self.pending.append((q, None))
+
+    def query(self, q, params=None):
+        """Executa o que estiver pendente e a consulta q, retornando todas as linhas"""
+
+        self._check()
+        self.flush()
+        self.round_trips += 1
+        self.statements += 1
+        return tracing.execute(self.cursor, q, params).fetchall()
+
+    def create_table(self, table_name, if_not_exists=False, **kwargs):
+        """Enfileira a criação de table_name (kwargs como em db_utils.create_table)"""
+
+        self._check()
+        if self.db == 'oracle':
+            # o oracle não tem CREATE TABLE IF NOT EXISTS: o erro de nome em uso é ignorado no bloco
+            self.pending.append((db_utils.get_create_table_query(table_name, **kwargs), ORA_NAME_IN_USE if if_not_exists else None))
+        else:
+            self.pending.append((db_utils.get_create_table_query(table_name, if_not_exists=if_not_exists, **kwargs), None))
+        self.touched.add(table_name)
+
+    def drop_table(self, table_name, if_exists=False):
+        """Enfileira a remoção de table_name; com if_exists, não falha se a tabela não existir"""
+
+        self._check()
+        helpers.check_identifier(table_name)
+        if self.db == 'oracle':
+            self.pending.append((f'DROP TABLE {table_name}', ORA_TABLE_NOT_FOUND if if_exists else None))
+        else:
+            self.pending.append((f'DROP TABLE {"IF EXISTS " if if_exists else ""}{table_name}', None))
+        self.touched.add(table_name)
+
+    def insert_rows(self, rows, cols, table_name, batch_size=100000, input_sizes=None):
+        """
+        Insere rows em table_name com um executemany por lote no cursor da sessão, sem commit
+        (ver db_utils.insert_batches). Retorna as estatísticas da carga
+        """
+
+        self._check()
+        self.flush()
+        stats = db_utils.insert_batches(helpers.iter_batches(rows, batch_size), cols, table_name, self.cursor, input_sizes=input_sizes)
+        self.round_trips += stats['batches']
+        self.statements += stats['batches']
+        return stats
+
+    def insert_df(self, df, table_name, if_exists='fail', batch_size=100000):
+        """
+        Insere df em table_name, criando a tabela no mesmo round trip dos comandos pendentes.
+        A existência da tabela não é consultada: "replace" vira DROP (se existir) + CREATE, "append" CREATE se não existir
+        e "fail" um CREATE simples, que falha se a tabela já existir
+
+        inputs:
+        :: df [pd.DataFrame] -> dados a serem inseridos
+        :: table_name [str] -> tabela de destino
+        :: if_exists [str] -> "fail" (default), "replace" ou "append"
+        :: batch_size [int] -> linhas por executemany | default: 100000
+
+        output:
+        :: [dict] com estatísticas da carga (ver db_utils.insert_batches)
+        """
+
+        if if_exists not in ('fail', 'replace', 'append'):
+            print(f'if_exists inválido: {if_exists} | "fail", "replace" ou "append"')
+            raise ValueError
+        df_schema = schema.infer_schema(df, db=self.db)
+        columns = [c.upper() for c in df.columns]
+        types = [c['type'].upper() for c in df_schema]
+
+        if if_exists == 'replace':
+            self.drop_table(table_name, if_exists=True)
+        self.create_table(table_name, if_not_exists=if_exists == 'append', cols=columns, types=types)
+        self.flush()
+        stats = db_utils.insert_batches(helpers.iter_df_batches(df, batch_size, self.db), columns, table_name, self.cursor,
+                                        input_sizes=schema.get_input_sizes(df_schema, self.db))
+        self.round_trips += stats['batches']
+        self.statements += stats['batches']
+        return stats
+
+    def flush(self):
+        """Envia os comandos pendentes em um único round trip (bloco PL/SQL no oracle, executescript no sqlite)"""
+
+        self._check()
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        if self.db == 'oracle':
+            tracing.execute(self.cursor, get_plsql_block(pending))
+        elif self.connection.in_transaction:
+            # o executescript faria commit da transação aberta: os comandos seguem um a um (sem round trip no sqlite)
+            for q, _ in pending:
+                tracing.execute(self.cursor, q)
+        else:
+            script = 'BEGIN;\n' + ';\n'.join(q.strip().rstrip(';') for q, _ in pending) + ';'
+            with tracing.span('executescript', tracing.fingerprint(script), round_trips=1):
+                self.cursor.executescript(script)
+        self.round_trips += 1
+        self.statements += len(pending)
+
+        for table_name in self.touched:
+            catalog.invalidate(self.connection, table_name)
+        self.touched.clear()
+
+    def commit(self):
+        """Flush dos comandos pendentes e commit da transação"""
+
+        self.flush()
+        self.connection.commit()
+
+    def rollback(self):
+        """Descarta os comandos pendentes e desfaz a transação"""
+
+        self._check()
+        self.pending.clear()
+        self.touched.clear()
+        self.connection.rollback()
+        catalog.invalidate(self.connection) # no sqlite, o DDL já enviado também é desfeito
+
+    def close(self):
+        """Fecha o cursor e, se aberta pela sessão, a conexão (comandos pendentes são descartados)"""
+
+        if self.closed:
+            return
+        self.closed = True
+        self.pending.clear()
+        try:
+            if self.owns_cursor:
+                self.cursor.close()
+        finally:
+            if self.owns_connection:
+                self.connection.close()
+
+    def stats(self):
+        return {'round_trips': self.round_trips, 'statements': self.statements, 'pending': len(self.pending)}
@@ -0,0 +1,254 @@
+import re
+from contextlib import contextmanager
+
+from . import backends
+from . import catalog
+from . import helpers
+from . import tracing
+
+
+# # # # # # # # # # # # # # # # # # #
+#                                   #
+#   PERFIS DE DESEMPENHO SQLITE     #
+#                                   #
+# # # # # # # # # # # # # # # # # # #
+
+# pragmas aplicados na abertura de cada conexão, na ordem abaixo: page_size só tem efeito antes da criação
+# do arquivo (ou após um VACUUM) e não pode mudar em modo WAL, por isso vem antes de journal_mode.
+# cache_size negativo é em KiB (e.g. -262144 = 256MB); mmap_size em bytes
+PRAGMAS = ['page_size', 'journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store']
+
+# segundos que uma conexão aguarda o lock de outra antes de "database is locked" (timeout do sqlite3.connect)
+DEFAULT_BUSY_TIMEOUT = 5.0
+
+PROFILES = {
+    # configuração padrão do sqlite: journal de rollback, synchronous FULL, cache de ~2MB, sem mmap
+    'default': {},
+    # WAL com synchronous NORMAL: leitores não bloqueiam o escritor e nenhum commit é perdido em queda do processo
+    # (apenas em queda do sistema operacional os últimos commits podem ser perdidos)
+    'fast': {
+        'page_size': 8192,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -262144,
+        'mmap_size': 1024 ** 3,
+        'temp_store': 'MEMORY'
+    },
+    # banco de rascunho/staging local: sem fsync e journal em memória. uma queda durante a escrita
+    # pode corromper o arquivo, que deve poder ser recriado
+    'scratch': {
+        'page_size': 16384,
+        'journal_mode': 'MEMORY',
+        'synchronous': 'OFF',
+        'cache_size': -1048576,
+        'mmap_size': 4 * 1024 ** 3,
+        'temp_store': 'MEMORY'
+    },
+}
+
+
+def get_pragmas(profile=None, pragmas=None):
+    """
+    Pragmas do perfil profile com os ajustes de pragmas, na ordem em que devem ser aplicados
+
+    inputs:
+    :: profile [str ou dict] -> nome de um perfil de PROFILES ou dict de pragmas | default: None ("default")
+    :: pragmas [dict] -> pragmas que sobrescrevem/complementam o perfil | default: None
+
+    output:
+    :: [list] de (pragma, valor)
+    """
+
+    if isinstance(profile, dict):
+        settings = dict(profile)
+    else:
+        try:
+            settings = dict(PROFILES[(profile or 'default').lower()])
+        except KeyError:
+            print(f'Perfil sqlite não encontrado: {profile} | perfis: {sorted(PROFILES)}')
+            raise
+    settings.update({k.lower(): v for k, v in (pragmas or {}).items()})
+
+    unknown = [k for k in settings if k not in PRAGMAS]
+    if unknown:
+        print(f'Pragmas não suportados: {unknown} | suportados: {PRAGMAS}')
+        raise ValueError
+    for k, v in settings.items():
+        # pragmas não aceitam bind: apenas inteiros ou palavras simples
+        if not isinstance(v, int) and not re.fullmatch(r'[A-Za-z]+', str(v)):
+            print(f'Valor inválido para o pragma {k}: {v}')
+            raise ValueError
+    return [(k, settings[k]) for k in PRAGMAS if k in settings]
+
+
+def apply_profile(sql_connector, profile=None, pragmas=None, schema=None):
+    """
+    Aplica os pragmas do perfil na conexão (ou, com schema, em um banco anexado)
+
+    inputs:
+    :: sql_connector [connector object] -> conexão ou cursor sqlite3
+    :: profile [str ou dict] -> perfil (ver get_pragmas)
+    :: pragmas [dict] -> ajustes sobre o perfil
+    :: schema [str] -> nome de um banco anexado (ver attach) | default: None (banco principal)
+
+    output:
+    :: [dict] pragma -> valor em vigor após a aplicação
+    """
+
+    cursor = helpers.get_cursor(sql_connector)
+    prefix = ''
+    if schema:
+        helpers.check_identifier(schema)
+        prefix = f'{schema}.'
+
+    applied = {}
+    for k, v in get_pragmas(profile, pragmas):
+        # temp_store vale para a conexão inteira, não por banco
+        target = '' if k == 'temp_store' else prefix
+        row = tracing.execute(cursor, f'PRAGMA {target}{k} = {v}').fetchone()
+        applied[k] = row[0] if row else v
+    return applied
+
+
+def get_settings(sql_connector, schema=None):
+    """Valores atuais dos pragmas de PRAGMAS na conexão (ou no banco anexado schema), None se não se aplicam"""
+
+    cursor = helpers.get_cursor(sql_connector)
+    prefix = ''
+    if schema:
+        helpers.check_identifier(schema)
+        prefix = f'{schema}.'
+    settings = {}
+    for k in PRAGMAS:
+        row = tracing.execute(cursor, f'PRAGMA {"" if k == "temp_store" else prefix}{k}').fetchone()
+        settings[k] = row[0] if row else None # e.g. mmap_size não se aplica a bancos em memória
+    return settings
+
+
+def is_memory(dbpath):
+    """Se dbpath é um banco em memória (":memory:" ou uri "file:...mode=memory")"""
+
+    return dbpath == ':memory:' or (dbpath.startswith('file:') and 'mode=memory' in dbpath)
+
+
+def connect(dbpath, profile=None, pragmas=None, **kwargs):
+    """
+    Abre uma conexão sqlite3 com o perfil aplicado. uris "file:..." são abertas com uri=True
+    (e.g. "file:staging?mode=memory&cache=shared", banco em memória compartilhado pelas conexões do processo)
+
+    inputs:
+    :: dbpath [str] -> arquivo do banco, ":memory:" ou uri "file:..."
+    :: profile, pragmas -> ver get_pragmas
+    :: kwargs -> repassados para sqlite3.connect (e.g. cached_statements, check_same_thread)
+
+    output:
+    :: [sqlite3.Connection]
+    """
+
+    sqlite3 = backends.load('sqlite')
+    connection = sqlite3.connect(dbpath, uri=dbpath.startswith('file:'), **kwargs)
+    try:
+        apply_profile(connection, profile, pragmas)
+    except:
+        connection.close()
+        raise
+    return connection
+
+
+def listen_engine(engine, profile=None, pragmas=None):
+    """Aplica o perfil em cada conexão aberta pela engine sqlalchemy"""
+
+    sqlalchemy = backends.load('sqlalchemy')
+
+    def on_connect(dbapi_connection, connection_record):
+        apply_profile(dbapi_connection, profile, pragmas)
+
+    sqlalchemy.event.listen(engine, 'connect', on_connect)
+    return engine
+
+
+def attach(sql_connector, dbpath, alias, profile=None, pragmas=None):
+    """
+    Anexa o banco dbpath à conexão como alias (tabelas acessadas como "alias.tabela"), e.g. um banco
+    de staging em memória ou em arquivo temporário ao lado do banco principal
+
+    inputs:
+    :: sql_connector [connector object] -> conexão ou cursor sqlite3
+    :: dbpath [str] -> arquivo do banco (".db" acrescentado se necessário), ":memory:" ou "" (banco temporário em disco)
+    :: alias [str] -> nome do banco anexado
+    :: profile, pragmas -> perfil aplicado ao banco anexado (temp_store vale para a conexão inteira)
+    """
+
+    helpers.check_identifier(alias)
+    if dbpath and not is_memory(dbpath) and not dbpath.startswith('file:'):
+        dbpath = helpers.format_sqlite_path(dbpath)
+    tracing.execute(helpers.get_cursor(sql_connector), f'ATTACH DATABASE :dbpath AS {alias}', {'dbpath': dbpath})
+    if profile or pragmas:
+        apply_profile(sql_connector, profile, pragmas, schema=alias)
+    catalog.invalidate(sql_connector)
+
+
+def detach(sql_connector, alias):
+    """Desanexa o banco alias (sem transação aberta na conexão)"""
+
+    helpers.check_identifier(alias)
+    tracing.execute(helpers.get_cursor(sql_connector), f'DETACH DATABASE {alias}')
+    catalog.invalidate(sql_connector)
+
+
+def _index_definitions(cursor, table_name):
+    # índices criados explicitamente (os automáticos de PRIMARY KEY/UNIQUE têm sql nulo e não podem ser removidos)
+    schema, name = table_name.split('.') if '.' in table_name else ('main', table_name)
+    q = f"SELECT name, sql FROM {schema}.sqlite_master WHERE type = 'index' AND upper(tbl_name) = upper(:name) AND sql IS NOT NULL"
+    return schema, tracing.execute(cursor, q, {'name': name}).fetchall()
+
+
+@contextmanager
+def bulk_load(sql_connector, table_name, synchronous='OFF', cache_size=-1048576):
+    """
+    Carga em massa em table_name: os índices da tabela são removidos no início e recriados ao final
+    (uma ordenação por índice em vez de uma atualização por linha), com synchronous e cache_size
+    ajustados durante a carga e restaurados depois. Ao final há commit; se houver exceção, rollback
+    e os índices são recriados mesmo assim (commits feitos dentro do bloco não são desfeitos).
+    Sem transação aberta, o sqlite3 executa cada DROP INDEX em modo autocommit (transações implícitas só
+    são abertas antes de DML): a remoção é confirmada na hora e um rollback não traz os índices de volta,
+    por isso a recriação roda em qualquer saída, inclusive se a própria remoção falhar
+
+    inputs:
+    :: sql_connector [connector object] -> conexão ou cursor sqlite3
+    :: table_name [str] -> tabela carregada ("tabela" ou "banco_anexado.tabela")
+    :: synchronous [str] -> synchronous durante a carga | default: "OFF"
+    :: cache_size [int] -> cache_size durante a carga | default: -1048576 (1GB)
+
+    e.g.
+    with sqlite_profiles.bulk_load(con, 'VENDAS'):
+        db_utils.insert_df(df, 'VENDAS', con, if_exists='append', batch_size=100000)
+    """
+
+    helpers.check_identifier(table_name)
+    connection = helpers.get_connection(sql_connector)
+    cursor = helpers.get_cursor(sql_connector)
+    schema, indexes = _index_definitions(cursor, table_name)
+
+    previous = get_settings(cursor, schema=schema)
+    apply_profile(cursor, {'synchronous': synchronous, 'cache_size': cache_size}, schema=schema)
+    try:
+        for name, _ in indexes:
+            tracing.execute(cursor, f'DROP INDEX {schema}.{name}')
+        yield indexes
+    except:
+        connection.rollback()
+        raise
+    finally:
+        try:
+            for name, sql in indexes:
+                # IF NOT EXISTS: índices não removidos (falha na remoção) ou removidos dentro de uma transação já
+                # aberta, que o rollback acima trouxe de volta
+                sql = re.sub(r'^\s*CREATE\s+(UNIQUE\s+)?INDEX\s+(IF\s+NOT\s+EXISTS\s+)?', r'CREATE \1INDEX IF NOT EXISTS ', sql, flags=re.I)
+                if schema != 'main':
+                    sql = re.sub(r'(INDEX IF NOT EXISTS )', rf'\1{schema}.', sql, count=1)
+                with tracing.span('bulk_load.create_index', name, table=table_name):
+                    tracing.execute(cursor, sql)
+            connection.commit()
+        finally:
+            apply_profile(cursor, {'synchronous': previous['synchronous'], 'cache_size': previous['cache_size']}, schema=schema)
@@ -0,0 +1,261 @@
+import os
+
+from . import binds
+from . import db_utils
+from . import helpers
+from . import schema as schema_
+from . import tracing
+
+
+# # # # # # # # # # # # # # # #
+#                             #
+#   STAGING PARQUET/ARROW     #
+#                             #
+# # # # # # # # # # # # # # # #
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.dataset
+    except ImportError:
+        print('pyarrow não instalado: pip install pyarrow')
+        raise
+    return pyarrow
+
+
+def export_parquet(sql_connector, q, path, params=None, batch_size=100000, rows_per_file=None, partition_cols=None,
+                   compression='snappy', v=False):
+    """
+    Exporta o resultado da consulta q para parquet, lote a lote (memória limitada a um lote).
+    No oracle, os tipos das colunas vêm do cursor.description (ver schema.get_arrow_schema): NUMBER(p,0) como int64,
+    NUMBER(p,s) como decimal exato, DATE/TIMESTAMP como timestamp. No sqlite, que não declara tipos no resultado,
+    vale o tipo dos valores do primeiro lote
+
+    inputs:
+    :: sql_connector [connector object] -> conector ao banco
+    :: q [str] -> consulta
+    :: path [str] -> arquivo .parquet ou, com rows_per_file/partition_cols, diretório de destino
+    :: params [dict ou list] -> parâmetros de bind da consulta
+    :: batch_size [int] -> linhas por fetch/record batch | default: 100000
+    :: rows_per_file [int] -> se informado, path é um diretório com arquivos part-NNNNN.parquet de até rows_per_file linhas
+    :: partition_cols [list] -> se informado, path é um dataset particionado (hive) por essas colunas
+    :: compression [str] -> compressão dos arquivos | default: "snappy"
+    :: v [bool] -> imprime as estatísticas da exportação
+
+    output:
+    :: [dict] com "rows", "batches" e "files" (paths escritos)
+    """
+
+    pa = _import_pyarrow()
+
+    writer, schema, files = None, None, []
+    n_rows, n_batches, file_rows = 0, 0, 0
+
+    def new_writer():
+        if rows_per_file:
+            os.makedirs(path, exist_ok=True)
+            file_path = os.path.join(path, f'part-{len(files):05d}.parquet')
+        else:
+            file_path = path
+        files.append(file_path)
+        return pa.parquet.ParquetWriter(file_path, schema, compression=compression)
+
+    cursor = helpers.get_cursor(sql_connector)
+    owns_cursor = cursor is not sql_connector
+    db, module, _ = helpers.get_db_module_connectortype(sql_connector)
+    db = db.lower()
+    if module in ('cx_oracle', 'sqlite3'):
+        cursor.arraysize = batch_size
+    handler = schema_.get_output_handler(db) if module == 'cx_oracle' else None
+    if handler:
+        previous_handler = cursor.outputtypehandler
+        cursor.outputtypehandler = handler
+
+    try:
+        result = tracing.execute(cursor, q, params)
+        if result is None:
+            result = cursor
+        names = list(result.keys()) if hasattr(result, 'keys') else [d[0] for d in cursor.description]
+        # tipos declarados pelo banco (oracle); sem tipo (sqlite), vale o do primeiro lote
+        if module in ('cx_oracle', 'sqlite3'):
+            declared = [t for _, t in schema_.get_arrow_schema(cursor.description, db)]
+        else:
+            declared = [None] * len(names)
+
+        while True:
+            rows = tracing.fetchmany(result, batch_size, q)
+            if not rows:
+                break
+            columns = []
+            for j, values in enumerate(zip(*rows)):
+                if declared[j] is not None:
+                    columns.append(pa.array(values, type=declared[j])) # uma passada, sem inferência nem cast
+                    continue
+                column = pa.array(values)
+                if schema is not None and column.type != schema.field(j).type:
+                    try:
+                        column = column.cast(schema.field(j).type) # cast seguro: falha em vez de truncar
+                    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                        print(f'Coluna {names[j]}: valores {column.type} em uma coluna {schema.field(j).type} (tipo do primeiro lote). '
+                              f'Converter na consulta, e.g. CAST({names[j]} AS REAL)')
+                        raise
+                columns.append(column)
+            if schema is None:
+                # colunas só com nulos no primeiro lote ficam como string
+                schema = pa.schema([(n, pa.string() if c.type == pa.null() else c.type) for n, c in zip(names, columns)])
+                columns = [c.cast(f.type) if c.type == pa.null() else c for c, f in zip(columns, schema)]
+            batch = pa.RecordBatch.from_arrays(columns, schema=schema)
+            n_rows += batch.num_rows
+            n_batches += 1
+
+            if partition_cols:
+                pa.parquet.write_to_dataset(pa.Table.from_batches([batch]), root_path=path, partition_cols=partition_cols,
+                                            compression=compression)
+                continue
+
+            # um lote maior que o espaço restante no arquivo é dividido (slice não copia os dados)
+            offset = 0
+            while offset < batch.num_rows:
+                if writer is None or (rows_per_file and file_rows >= rows_per_file):
+                    if writer is not None:
+                        writer.close()
+                    writer, file_rows = new_writer(), 0
+                size = min(rows_per_file - file_rows, batch.num_rows - offset) if rows_per_file else batch.num_rows
+                writer.write_batch(batch.slice(offset, size))
+                offset += size
+                file_rows += size
+    finally:
+        if writer is not None:
+            writer.close()
+        if handler:
+            cursor.outputtypehandler = previous_handler
+        if owns_cursor:
+            cursor.close()
+
+    if partition_cols and os.path.isdir(path):
+        files = sorted(os.path.join(root, f) for root, _, fs in os.walk(path) for f in fs if f.endswith('.parquet'))
+
+    if v:
+        print(f'{n_rows} linhas exportadas em {len(files)} arquivos para {path}')
+    return {'rows': n_rows, 'batches': n_batches, 'files': files}
+
+
+def _iter_arrow_batches(path, batch_size, columns=None):
+    pa = _import_pyarrow()
+
+    if os.path.isdir(path):
+        return pa.dataset.dataset(path, format='parquet', partitioning='hive').to_batches(columns=columns, batch_size=batch_size)
+    return pa.parquet.ParquetFile(path, memory_map=True).iter_batches(batch_size=batch_size, columns=columns)
+
+
+def _to_pandas(batch):
+    # inteiros e booleanos com nulos como Int64/boolean do pandas (sem passar por float); decimais chegam como Decimal
+    import pandas as pd
+
+    pa = _import_pyarrow()
+    types = {
+        pa.int8(): pd.Int8Dtype(), pa.int16(): pd.Int16Dtype(), pa.int32(): pd.Int32Dtype(), pa.int64(): pd.Int64Dtype(),
+        pa.uint8(): pd.UInt8Dtype(), pa.uint16(): pd.UInt16Dtype(), pa.uint32(): pd.UInt32Dtype(), pa.uint64(): pd.UInt64Dtype(),
+        pa.bool_(): pd.BooleanDtype(),
+    }
+    return batch.to_pandas(types_mapper=types.get)
+
+
+def iter_parquet_batches(path, batch_size=100000, columns=None, db='oracle'):
+    """
+    Lê arquivo/diretório parquet em lotes de linhas prontos para o executemany, convertidos coluna a coluna
+    (ver binds.py) em vez de valor a valor. Arquivos únicos são lidos por memory map; diretórios são lidos como
+    dataset (inclusive particionado).
+
+    inputs:
+    :: path [str] -> arquivo .parquet ou diretório
+    :: batch_size [int] -> linhas por lote | default: 100000
+    :: columns [list] -> colunas lidas | default: todas
+    :: db [str] -> banco de destino ('oracle', 'sqlite'): define a representação das datas
+
+    output:
+    :: [generator] de listas de tuplas
+    """
+
+    for batch in _iter_arrow_batches(path, batch_size, columns=columns):
+        if batch.num_rows:
+            yield from binds.iter_rows(_to_pandas(batch), batch_size, db=db)
+
+
+def get_parquet_schema(path, db='oracle', batch_size=100000):
+    """
+    Schema SQL dos dados do arquivo/diretório parquet, como em schema.infer_schema: cada lote é inferido e os lotes
+    são combinados com schema.merge_schema (os dados são percorridos uma vez, sem ficar em memória)
+
+    inputs:
+    :: path [str] -> arquivo .parquet ou diretório
+    :: db [str] -> banco de destino ('oracle', 'sqlite')
+    :: batch_size [int] -> linhas por lote | default: 100000
+
+    output:
+    :: [list de dict] um dict por coluna, ver schema.infer_column
+    """
+
+    merged, seen = None, None
+    for batch in _iter_arrow_batches(path, batch_size):
+        batch_schema = schema_.infer_schema(_to_pandas(batch), db=db)
+        has_values = [c.null_count < batch.num_rows for c in batch.columns]
+        if merged is None:
+            merged, seen = batch_schema, has_values
+            continue
+        for j, info in enumerate(batch_schema):
+            if not has_values[j]:
+                merged[j]['nullable'] = True
+            elif seen[j]:
+                merged[j] = schema_.merge_schema([merged[j]], [info], db=db)[0]
+            else:
+                # lotes anteriores só com nulos: o tipo vem deste
+                merged[j], seen[j] = dict(info, nullable=True), True
+
+    if merged is None:
+        pa = _import_pyarrow()
+        dataset = pa.dataset.dataset(path, format='parquet', partitioning='hive' if os.path.isdir(path) else None)
+        merged = schema_.infer_schema(_to_pandas(dataset.schema.empty_table()), db=db)
+    return merged
+
+
+def get_parquet_types(path, db='oracle'):
+    """Colunas e tipos SQL dos dados do arquivo/diretório parquet (ver get_parquet_schema)"""
+
+    parquet_schema = get_parquet_schema(path, db=db)
+    return [c['column'] for c in parquet_schema], [c['type'] for c in parquet_schema]
+
+
+def import_parquet(path, table_name, sql_connector, batch_size=100000, commit_every=1, create=True, v=False):
+    """
+    Carrega arquivo/diretório parquet em table_name pelo insert em lotes (ver db_utils.insert_batches)
+
+    inputs:
+    :: path [str] -> arquivo .parquet ou diretório
+    :: table_name [str] -> tabela de destino
+    :: sql_connector [connector object] -> conexão ou cursor cx_Oracle/sqlite3
+    :: batch_size [int] -> linhas por executemany | default: 100000
+    :: commit_every [int] -> commit a cada commit_every lotes | default: 1
+    :: create [bool] -> cria a tabela a partir do schema do parquet se ela não existir | default: True
+    :: v [bool] -> imprime as estatísticas da carga
+
+    output:
+    :: [dict] com estatísticas da carga ("rows", "batches", "seconds", "rows_per_sec")
+    """
+
+    db, _, _ = helpers.get_db_module_connectortype(sql_connector)
+    db = db.lower()
+    input_sizes = None
+    if create and not db_utils.table_exists(sql_connector, table_name):
+        # tipos justos a partir dos dados (uma leitura extra do parquet antes da carga)
+        parquet_schema = get_parquet_schema(path, db=db, batch_size=batch_size)
+        cols = [c['column'] for c in parquet_schema]
+        db_utils.create_table(table_name, sql_connector, cols=cols, types=[c['type'] for c in parquet_schema])
+        input_sizes = schema_.get_input_sizes(parquet_schema, db)
+    else:
+        pa = _import_pyarrow()
+        cols = pa.dataset.dataset(path, format='parquet', partitioning='hive' if os.path.isdir(path) else None).schema.names
+
+    return db_utils.insert_batches(iter_parquet_batches(path, batch_size=batch_size, columns=cols, db=db), cols, table_name,
+                                   sql_connector, commit_every=commit_every, input_sizes=input_sizes, v=v)
@@ -0,0 +1,193 @@
+import threading
+from collections import OrderedDict
+
+from . import helpers
+
+
+# # # # # # # # # # # # # # # # #
+#                               #
+#   CACHE DE STATEMENTS         #
+#                               #
+# # # # # # # # # # # # # # # # #
+
+# statements mantidos preparados por conexão (cx_Oracle stmtcachesize / sqlite3 cached_statements)
+DEFAULT_CACHE_SIZE = 50
+
+# limite de conexões acompanhadas; as mais antigas saem do registro
+MAX_CONNECTIONS = 256
+
+# id(conexão) -> StatementCache. sqlite3.Connection não aceita weakref, por isso o registro é por id
+_caches = OrderedDict()
+_lock = threading.Lock()
+
+
+class StatementCache:
+    """
+    Contagem de statements repetidos de uma conexão. Os drivers reaproveitam o statement já preparado
+    (cx_Oracle stmtcachesize, sqlite3 cached_statements) quando o mesmo texto de SQL é executado de novo
+    entre os size textos mais recentes; os caches em si não são expostos pelos drivers, então aqui apenas
+    os textos executados são contados. "repeated" é um teto do reaproveitamento: o sqlite3, e.g., prepara de
+    novo um statement cujo cursor anterior ainda está em uso. No oracle, ver cache_stats para os contadores
+    reais da sessão.
+
+    inputs:
+    :: size [int] -> tamanho do cache da conexão | default: DEFAULT_CACHE_SIZE
+    """
+
+    def __init__(self, size=DEFAULT_CACHE_SIZE):
+        self.size = size
+        self.repeated, self.new = 0, 0
+        self.baseline = {} # oracle: contadores de parse_stats no último reset
+        self._texts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, q):
+        """Registra uma execução de q. Retorna True se o texto está entre os size mais recentes"""
+
+        with self._lock:
+            if q in self._texts:
+                self._texts.move_to_end(q)
+                self.repeated += 1
+                return True
+            self.new += 1
+            if self.size:
+                self._texts[q] = None
+                if len(self._texts) > self.size:
+                    self._texts.popitem(last=False)
+            return False
+
+    def stats(self):
+        with self._lock:
+            repeated, new, tracked = self.repeated, self.new, len(self._texts)
+        total = repeated + new
+        return {
+            'repeated': repeated,
+            'new': new,
+            'repeated_rate': repeated / total if total else None,
+            'size': self.size,
+            'tracked': tracked
+        }
+
+
+def register(connection, size=DEFAULT_CACHE_SIZE):
+    """
+    Passa a contar os statements executados em connection
+
+    inputs:
+    :: connection [connection object] -> conexão cx_Oracle ou sqlite3
+    :: size [int] -> tamanho configurado do cache da conexão
+
+    output:
+    :: a própria connection
+    """
+
+    with _lock:
+        _caches[id(connection)] = StatementCache(size)
+        _caches.move_to_end(id(connection))
+        while len(_caches) > MAX_CONNECTIONS:
+            _caches.popitem(last=False)
+    return connection
+
+
+def record(cursor, q):
+    """Registra a execução de q na conexão de cursor (conexões não registradas são ignoradas)"""
+
+    connection = getattr(cursor, 'connection', None)
+    cache = _caches.get(id(connection)) if connection is not None else None
+    if cache is not None:
+        cache.record(q)
+
+
+def _session_cache_stats(counters, baseline):
+    # acertos do cache de cursores da sessão oracle desde baseline: parses resolvidos no cache sobre o total de parses.
+    # execuções sem parse algum são as reaproveitadas pelo cache de statements do cliente (stmtcachesize)
+    delta = {k: v - baseline.get(k, 0) for k, v in counters.items()}
+    parses, hits = delta.get('parse count (total)', 0), delta.get('session cursor cache hits', 0)
+    return {
+        'hits': hits,
+        'misses': parses - hits,
+        'hit_rate': hits / parses if parses else None,
+        'parses': parses,
+        'hard_parses': delta.get('parse count (hard)', 0),
+        'executions': delta.get('execute count', 0)
+    }
+
+
+def cache_stats(sql_connector=None):
+    """
+    Reaproveitamento de statements.
+    Com um conector oracle, os contadores da sessão (ver parse_stats) desde a conexão ou o último reset(sql_connector):
+    "hit_rate" é a fração dos parses atendida pelo cache de cursores da sessão ("session cursor cache hits") e
+    "executions" - "parses" as execuções que nem chegaram ao parse (cache de statements do cliente).
+    Nos demais casos (sqlite ou todas as conexões), a contagem de statements repetidos (ver StatementCache)
+
+    inputs:
+    :: sql_connector [connector object] -> se informado, apenas a conexão deste conector | default: None (todas somadas)
+
+    output:
+    :: [dict] oracle: "hits", "misses", "hit_rate", "parses", "hard_parses", "executions".
+       demais: "repeated", "new", "repeated_rate" (e "size", "tracked" quando de uma conexão)
+    """
+
+    if sql_connector is not None:
+        cache = _caches.get(id(helpers.get_connection(sql_connector)))
+        db, _, _ = helpers.get_db_module_connectortype(sql_connector)
+        if db.lower() == 'oracle':
+            return _session_cache_stats(parse_stats(sql_connector), cache.baseline if cache else {})
+        return cache.stats() if cache else None
+
+    with _lock:
+        caches = list(_caches.values())
+    repeated, new = sum(c.repeated for c in caches), sum(c.new for c in caches)
+    return {'repeated': repeated, 'new': new, 'repeated_rate': repeated / (repeated + new) if repeated + new else None}
+
+
+def reset(sql_connector=None):
+    """
+    Zera as contagens de todas as conexões acompanhadas ou, com sql_connector, apenas da sua conexão
+    (no oracle, os contadores da sessão passam a ser medidos a partir deste ponto)
+    """
+
+    if sql_connector is None:
+        with _lock:
+            caches = list(_caches.values())
+    else:
+        cache = _caches.get(id(helpers.get_connection(sql_connector)))
+        caches = [cache] if cache else []
+        db, _, _ = helpers.get_db_module_connectortype(sql_connector)
+        if cache and db.lower() == 'oracle':
+            cache.baseline = parse_stats(sql_connector)
+    for cache in caches:
+        with cache._lock:
+            cache.repeated, cache.new = 0, 0
+
+
+def parse_stats(sql_connector):
+    """
+    Contadores de parse da sessão oracle (v$mystat): total, hard parses e acertos do cache de cursores da sessão.
+    Exige grant de select em v$mystat e v$statname.
+
+    inputs:
+    :: sql_connector [connector object] -> conector oracle
+
+    output:
+    :: [dict] nome da estatística -> valor
+    """
+
+    db, _, _ = helpers.get_db_module_connectortype(sql_connector)
+    if db.lower() != 'oracle':
+        print(f'parse_stats não implementado para {db}')
+        raise NotImplementedError
+
+    q = """
+    select
+        n.name, s.value
+    from
+        v$mystat s
+    inner join
+        v$statname n
+        on s.statistic# = n.statistic#
+    where
+        n.name in ('parse count (total)', 'parse count (hard)', 'session cursor cache hits', 'execute count')
+    """
+    return dict(helpers.get_cursor(sql_connector).execute(q).fetchall())
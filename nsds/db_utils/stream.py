@@ -0,0 +1,299 @@
+import os
+import time
+import pickle
+import tempfile
+import itertools
+import threading
+from collections import deque
+
+from . import binds
+from . import db_utils
+from . import helpers
+
+
+# # # # # # # # # # # # # # # # #
+#                               #
+#   ESCRITA EM STREAM           #
+#                               #
+# # # # # # # # # # # # # # # # #
+
+class _Aborted(Exception):
+    # encerra o insert_batches da thread de escrita quando o stream é abortado
+    pass
+
+
+class StreamWriter:
+    """
+    Escrita incremental em table_name: o produtor entrega linhas ou DataFrames aos poucos (write) e uma thread
+    em segundo plano insere lotes de batch_size linhas com executemany (ver db_utils.insert_batches).
+    Lotes aguardando o banco ficam em memória até max_buffer_rows linhas; acima disso vão para um arquivo
+    temporário (frames pickle), lido de volta na ordem. O produtor nunca espera pelo banco.
+    A tabela deve existir, com as colunas cols.
+
+    inputs:
+    :: table_name [str] -> tabela de destino
+    :: sql_connector [connector object ou str] -> conexão cx_Oracle/sqlite3 utilizável pela thread de escrita
+       (e.g. do pool, ou sqlite3 com check_same_thread=False), ou nome de uma conexão salva, aberta e fechada
+       pela própria thread
+    :: cols [list] -> colunas das linhas | default: colunas do primeiro DataFrame escrito
+    :: batch_size [int] -> linhas por executemany | default: 50000
+    :: max_buffer_rows [int] -> linhas em lotes mantidos em memória antes de usar o disco | default: 4 * batch_size
+    :: commit_every [int] -> commit a cada commit_every lotes; None faz um único commit no close | default: 1
+    :: input_sizes [list] -> tipos/tamanhos de bind por coluna (apenas oracle)
+    :: spill_dir [str] -> diretório do arquivo temporário | default: diretório temporário do sistema
+    :: config_filename -> arquivo onde estão salvos os dados de conexão (default: "connections.json")
+
+    e.g.
+    with StreamWriter('EVENTOS', 'MINHA_CONEXAO', cols=['ID', 'PAYLOAD']) as writer:
+        for page in api_pages():
+            writer.write(page)
+    """
+
+    def __init__(self, table_name, sql_connector, cols=None, batch_size=50000, max_buffer_rows=None, commit_every=1,
+                 input_sizes=None, spill_dir=None, config_filename='connections.json'):
+        assert batch_size and batch_size > 0, 'batch_size deve ser um inteiro positivo'
+        self.table_name = table_name
+        self.cols = list(cols) if cols is not None else None
+        self.batch_size = batch_size
+        self.max_buffer_rows = max_buffer_rows or 4 * batch_size
+        self.commit_every = commit_every
+        self.input_sizes = input_sizes
+        self.spill_dir = spill_dir
+        self.config_filename = config_filename
+
+        if isinstance(sql_connector, str):
+            self.connection_name, self.sql_connector = sql_connector, None
+            connection_info = db_utils.get_connection_info(sql_connector, config_filename=config_filename)
+            self.db = helpers.get_flavor(connection_info)
+        else:
+            self.connection_name, self.sql_connector = None, sql_connector
+            self.db, _, _ = helpers.get_db_module_connectortype(sql_connector)
+
+        self._current = [] # lote sendo preenchido pelo produtor
+        self._queue = deque() # lotes fechados, em ordem: ("memory", linhas, n) ou ("disk", offset, n)
+        self._cond = threading.Condition()
+        self._memory_rows = 0
+        self._in_flight = 0
+        self._closing = False
+        self._aborted = False
+        self._closed = False
+        self._error = None
+        self._thread = None
+        self._spill = None
+        self._spill_path = None
+
+        self.rows_written = 0
+        self.rows_inserted = 0
+        self.spilled_rows = 0
+        self.spilled_bytes = 0
+        self.max_memory_rows = 0
+        self._insert_stats = None
+        self._start = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    # # produtor
+
+    def _check(self):
+        if self._error is not None:
+            print(f'Erro na escrita em {self.table_name}: {self._error!r}')
+            raise self._error
+        if self._closed or self._closing:
+            print('StreamWriter já fechado')
+            raise RuntimeError
+
+    def write(self, rows):
+        """
+        Acrescenta rows ao stream: um DataFrame (convertido coluna a coluna, ver binds.py) ou um iterável de tuplas,
+        consumido aos poucos (pode ser um generator)
+        """
+
+        self._check()
+        if hasattr(rows, 'iloc'):
+            if self.cols is None:
+                self.cols = [str(c).upper() for c in rows.columns]
+            for batch in binds.iter_rows(rows, self.batch_size, db=self.db):
+                self._add(batch)
+            return
+
+        iterator = iter(rows)
+        while True:
+            chunk = list(itertools.islice(iterator, self.batch_size - len(self._current)))
+            if not chunk:
+                break
+            self._add(chunk)
+
+    def _add(self, rows):
+        self.rows_written += len(rows)
+        start = 0
+        while start < len(rows):
+            take = self.batch_size - len(self._current)
+            self._current.extend(rows[start:start + take])
+            start += take
+            if len(self._current) >= self.batch_size:
+                self._seal()
+
+    def _seal(self):
+        # fecha o lote atual: em memória se couber em max_buffer_rows, senão em disco
+        if not self._current:
+            return
+        batch, self._current = self._current, []
+        n = len(batch)
+        with self._cond:
+            if self._memory_rows + n <= self.max_buffer_rows:
+                self._queue.append(('memory', batch, n))
+                self._memory_rows += n
+                self.max_memory_rows = max(self.max_memory_rows, self._memory_rows)
+            else:
+                self._queue.append(('disk', self._spill_batch(batch), n))
+                self.spilled_rows += n
+            self._cond.notify_all()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f'nsds-stream-{self.table_name}', daemon=True)
+            self._thread.start()
+
+    def _spill_batch(self, batch):
+        # chamado com o lock: grava o lote no fim do arquivo temporário e retorna seu offset
+        if self._spill is None:
+            fd, self._spill_path = tempfile.mkstemp(prefix=f'nsds_{self.table_name}_', suffix='.spill', dir=self.spill_dir)
+            self._spill = os.fdopen(fd, 'w+b')
+        self._spill.seek(0, os.SEEK_END)
+        offset = self._spill.tell()
+        pickle.dump(batch, self._spill, protocol=pickle.HIGHEST_PROTOCOL)
+        self._spill.flush()
+        self.spilled_bytes += self._spill.tell() - offset
+        return offset
+
+    # # thread de escrita
+
+    def _read_spill(self, offset):
+        with open(self._spill_path, 'rb') as fp:
+            fp.seek(offset)
+            return pickle.load(fp)
+
+    def _batches(self):
+        # lotes para o insert_batches, na ordem em que foram fechados; bloqueia até haver lote ou o stream fechar
+        while True:
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+                while not self._queue and not self._closing and not self._aborted:
+                    self._cond.wait()
+                if self._aborted:
+                    raise _Aborted
+                if not self._queue:
+                    return
+                kind, payload, n = self._queue.popleft()
+                self._in_flight = n
+                if kind == 'memory':
+                    self._memory_rows -= n
+            batch = self._read_spill(payload) if kind == 'disk' else payload
+            with self._cond:
+                if not any(k == 'disk' for k, _, _ in self._queue) and kind == 'disk':
+                    # nada mais em disco: o arquivo volta a ficar vazio
+                    self._spill.truncate(0)
+            yield batch
+            self.rows_inserted += n
+
+    def _run(self):
+        connection = None
+        try:
+            if self.connection_name:
+                connection = db_utils.connect(self.connection_name, config_filename=self.config_filename)
+            sql_connector = connection or self.sql_connector
+            self._insert_stats = db_utils.insert_batches(self._batches(), self.cols, self.table_name, sql_connector,
+                                                         commit_every=self.commit_every, input_sizes=self.input_sizes)
+            if not self.commit_every:
+                helpers.get_connection(sql_connector).commit()
+        except _Aborted:
+            if connection is not None or self.sql_connector is not None:
+                helpers.get_connection(connection or self.sql_connector).rollback()
+        except BaseException as e:
+            with self._cond:
+                self._error = e
+                self._queue.clear()
+                self._memory_rows = 0
+                self._cond.notify_all()
+        finally:
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+            if connection is not None:
+                connection.close()
+
+    # # controle
+
+    def flush(self):
+        """Fecha o lote parcial e aguarda a inserção de tudo o que foi escrito até aqui"""
+
+        self._check()
+        self._seal()
+        with self._cond:
+            while (self._queue or self._in_flight) and self._error is None:
+                self._cond.wait()
+        self._check()
+
+    def close(self):
+        """Insere o restante, aguarda a thread de escrita, remove o arquivo temporário e retorna as estatísticas"""
+
+        if self._closed:
+            return self.stats()
+        try:
+            if self._error is None:
+                self._seal()
+            with self._cond:
+                self._closing = True
+                self._cond.notify_all()
+            if self._thread is not None:
+                self._thread.join()
+        finally:
+            self._cleanup()
+        if self._error is not None:
+            print(f'Erro na escrita em {self.table_name}: {self._error!r}')
+            raise self._error
+        return self.stats()
+
+    def abort(self):
+        """Descarta os lotes pendentes e desfaz a transação em aberto (lotes já commitados permanecem)"""
+
+        if self._closed:
+            return
+        with self._cond:
+            self._aborted = True
+            self._queue.clear()
+            self._memory_rows = 0
+            self._cond.notify_all()
+        try:
+            if self._thread is not None:
+                self._thread.join()
+        finally:
+            self._current = []
+            self._cleanup()
+
+    def _cleanup(self):
+        self._closed = True
+        if self._spill is not None:
+            self._spill.close()
+            os.remove(self._spill_path)
+            self._spill = None
+
+    def stats(self):
+        seconds = time.perf_counter() - self._start
+        return {
+            'rows_written': self.rows_written,
+            'rows': self.rows_inserted,
+            'batches': self._insert_stats['batches'] if self._insert_stats else None,
+            'pending_rows': self.rows_written - self.rows_inserted,
+            'spilled_rows': self.spilled_rows,
+            'spilled_bytes': self.spilled_bytes,
+            'max_memory_rows': self.max_memory_rows,
+            'seconds': seconds,
+            'rows_per_sec': self.rows_inserted / seconds if seconds else float('inf')
+        }
@@ -0,0 +1,243 @@
+import time
+
+from . import db_utils
+from . import helpers
+from . import schema
+from . import tracing
+
+
+# # # # # # # # # # # # # # # # #
+#                               #
+#   SINCRONIZAÇÃO INCREMENTAL   #
+#                               #
+# # # # # # # # # # # # # # # # #
+
+# tipo da coluna de hash (int64 com sinal) guardada na tabela de destino
+HASH_TYPES = {'oracle': 'NUMBER(20)', 'sqlite': 'INTEGER'}
+
+
+def _normalize(frame, dtypes):
+    # valores comparáveis entre o DataFrame e o que volta do banco: números como float, datas como datetime64
+    # e o restante como texto (None para nulos)
+    import pandas as pd
+    from pandas.api import types as pdt
+
+    normalized = {}
+    for c, dtype in dtypes.items():
+        s = frame[c]
+        if pdt.is_bool_dtype(dtype) or pdt.is_numeric_dtype(dtype):
+            normalized[c] = pd.to_numeric(s, errors='coerce').astype('float64')
+        elif pdt.is_datetime64_any_dtype(dtype):
+            normalized[c] = pd.to_datetime(s, errors='coerce')
+        else:
+            normalized[c] = s.astype(object).where(s.notna(), None).map(lambda x: x if x is None else str(x))
+    return pd.DataFrame(normalized, index=frame.index)
+
+
+def row_hashes(frame, dtypes):
+    """
+    Hash (int64) de cada linha de frame nas colunas de dtypes, normalizadas pelos tipos do DataFrame de origem
+
+    inputs:
+    :: frame [pd.DataFrame] -> linhas a serem comparadas (o DataFrame ou o que foi lido da tabela)
+    :: dtypes [dict] -> coluna -> dtype do DataFrame de origem
+
+    output:
+    :: [np.ndarray] de int64
+    """
+
+    import pandas as pd
+
+    if not dtypes:
+        return pd.Series(0, index=frame.index, dtype='int64').values
+    return pd.util.hash_pandas_object(_normalize(frame, dtypes), index=False).values.view('int64')
+
+
+def get_merge_query(db, table_name, staging_table, keys, cols):
+    """
+    Query que aplica staging_table em table_name pelas colunas keys: MERGE no oracle, INSERT ... ON CONFLICT no sqlite
+
+    inputs:
+    :: db [str] -> "oracle" ou "sqlite"
+    :: table_name [str] -> tabela de destino
+    :: staging_table [str] -> tabela com as linhas novas/alteradas
+    :: keys [list] -> colunas chave
+    :: cols [list] -> todas as colunas (chaves incluídas)
+
+    output:
+    :: [str] query
+    """
+
+    updates = [c for c in cols if c not in keys]
+    if db == 'oracle':
+        q = f"""
+        MERGE INTO {table_name} t
+        USING {staging_table} s
+        ON ({' AND '.join(f't.{k} = s.{k}' for k in keys)})
+        """
+        if updates:
+            q += f"""WHEN MATCHED THEN UPDATE SET {', '.join(f't.{c} = s.{c}' for c in updates)}
+        """
+        q += f"""WHEN NOT MATCHED THEN INSERT ({', '.join(cols)}) VALUES ({', '.join(f's.{c}' for c in cols)})
+        """
+    elif db == 'sqlite':
+        # o "WHERE true" desfaz a ambiguidade do parser entre o ON da cláusula ON CONFLICT e um join
+        q = f"""
+        INSERT INTO {table_name} ({', '.join(cols)})
+        SELECT {', '.join(cols)} FROM {staging_table} WHERE true
+        ON CONFLICT ({', '.join(keys)}) DO {f"UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in updates)}" if updates else 'NOTHING'}
+        """
+    else:
+        print(f'db {db} não implementada')
+        raise NotImplementedError
+    return q
+
+
+def _columns(cursor, table_name):
+    tracing.execute(cursor, f'SELECT * FROM {table_name} WHERE 1 = 0')
+    return [d[0].upper() for d in cursor.description]
+
+
+def _target_hashes(sql_connector, table_name, keys, key_dtypes, value_dtypes, hash_column, chunksize):
+    # (hash da chave, hash das demais colunas) das linhas já presentes na tabela de destino. sem hash_column, todas as
+    # colunas do destino são lidas (e transferidas pela rede); cada lote é reduzido aos dois hashes, então a memória
+    # fica em ~16 bytes por linha do destino mais um lote
+    import pandas as pd
+
+    selected = keys + ([hash_column] if hash_column else list(value_dtypes))
+    q = f'SELECT {", ".join(selected)} FROM {table_name}'
+    parts = []
+    for chunk in db_utils.read_query(sql_connector, q, chunksize=chunksize):
+        chunk.columns = [c.upper() for c in chunk.columns]
+        if hash_column:
+            # linhas sem hash (gravadas antes da coluna existir) ficam com NaN e contam como alteradas
+            values = pd.to_numeric(chunk[hash_column], errors='coerce').astype('float64').values
+        else:
+            values = row_hashes(chunk, value_dtypes).astype('float64')
+        parts.append(pd.Series(values, index=row_hashes(chunk, key_dtypes)))
+    if not parts:
+        return pd.Series(dtype='float64')
+    hashes = pd.concat(parts)
+    return hashes[~hashes.index.duplicated()]
+
+
+def sync_df(df, table_name, sql_connector, keys, detect_changes=True, hash_column=None, staging_table=None,
+            batch_size=100000, direct_path=False, chunksize=100000, v=False):
+    """
+    Sincroniza table_name com df pelas colunas chave: as linhas são carregadas em uma tabela de staging pelo
+    caminho em lotes (insert_batches) e aplicadas com um único MERGE (oracle) / INSERT ... ON CONFLICT (sqlite)
+
+    inputs:
+    :: df [pd.DataFrame] -> dados de origem (uma linha por chave)
+    :: table_name [str] -> tabela de destino (criada a partir de df se não existir)
+    :: sql_connector [connector object] -> conexão ou cursor cx_Oracle/sqlite3
+    :: keys [list] -> colunas chave. no sqlite, é criado um índice único nelas se necessário (exigido pelo ON CONFLICT)
+    :: detect_changes [bool] -> compara hashes das linhas com o destino e envia apenas as novas ou alteradas | default: True
+    :: hash_column [str] -> coluna do destino onde o hash das linhas é guardado (criada se não existir).
+       com ela, a detecção lê apenas chave + hash do destino; sem ela, lê todas as colunas de todas as linhas do
+       destino a cada sincronização (recomendada para tabelas grandes) | default: None
+    :: staging_table [str] -> tabela de staging | default: table_name + "_STG"
+    :: batch_size [int] -> linhas por lote na carga da staging | default: 100000
+    :: direct_path [bool] -> carga direct-path da staging no oracle (ver insert_batches)
+    :: chunksize [int] -> linhas por fetch na leitura do destino para a detecção | default: 100000
+    :: v [bool] -> imprime as contagens
+
+    output:
+    :: [dict] com "inserted", "updated", "unchanged" (None sem detect_changes), "sent" (linhas enviadas) e "seconds"
+    """
+
+    start = time.perf_counter()
+    db, _, _ = helpers.get_db_module_connectortype(sql_connector)
+    db = db.lower()
+    cursor = helpers.get_cursor(sql_connector)
+
+    if isinstance(keys, str):
+        keys = [keys]
+    df = df.copy()
+    df.columns = [c.upper() for c in df.columns]
+    keys = [k.upper() for k in keys]
+    hash_column = hash_column.upper() if hash_column else None
+    staging_table = staging_table or f'{table_name}_STG'
+
+    missing = [k for k in keys if k not in df.columns]
+    if not keys or missing:
+        print(f'Colunas chave ausentes do DataFrame: {missing or keys}')
+        raise ValueError
+    if df.duplicated(subset=keys).any():
+        print(f'DataFrame com chaves duplicadas em {keys}')
+        raise ValueError
+
+    key_dtypes = {k: df[k].dtype for k in keys}
+    value_dtypes = {c: df[c].dtype for c in df.columns if c not in keys}
+    df_schema = schema.infer_schema(df, db=db)
+    types = [c['type'].upper() for c in df_schema]
+    if hash_column:
+        df[hash_column] = row_hashes(df, value_dtypes)
+        types.append(HASH_TYPES[db])
+        df_schema.append({'column': hash_column, 'type': HASH_TYPES[db], 'input_size': schema.infer_column(df[hash_column], db=db)['input_size']})
+    columns = list(df.columns)
+
+    # destino: criado se não existir; a coluna de hash e o índice único (sqlite) são acrescentados se faltarem
+    created = not db_utils.table_exists(sql_connector, table_name)
+    if created:
+        db_utils.create_table(table_name, sql_connector, cols=columns, types=types)
+    elif hash_column and hash_column not in _columns(cursor, table_name):
+        add = f'ADD ({hash_column} {HASH_TYPES[db]})' if db == 'oracle' else f'ADD COLUMN {hash_column} {HASH_TYPES[db]}'
+        tracing.execute(cursor, f'ALTER TABLE {table_name} {add}')
+    if db == 'sqlite':
+        index_name = f'UX_{table_name.split(".")[-1]}_{"_".join(keys)}'
+        tracing.execute(cursor, f'CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {table_name} ({", ".join(keys)})')
+
+    # detecção de alterações: classificação local por hash da chave e hash das demais colunas
+    unchanged = None
+    if detect_changes and not created:
+        target = _target_hashes(sql_connector, table_name, keys, key_dtypes, value_dtypes, hash_column, chunksize)
+        df_keys = row_hashes(df, key_dtypes)
+        # presença pela chave; o hash é comparado à parte (hash nulo no destino: NaN, diferente de tudo -> alterada)
+        exists = target.index.get_indexer(df_keys) >= 0
+        current = target.reindex(df_keys).values
+        changed = exists & ~(current == row_hashes(df, value_dtypes).astype('float64'))
+        send = ~exists | changed
+        inserted, updated, unchanged = int((~exists).sum()), int(changed.sum()), int((~send).sum())
+        df = df[send]
+    elif created:
+        inserted, updated = len(df), 0
+        unchanged = 0 if detect_changes else None
+
+    sent = len(df)
+    if created:
+        db_utils.insert_batches(helpers.iter_df_batches(df, batch_size, db), columns, table_name, sql_connector,
+                                input_sizes=schema.get_input_sizes(df_schema, db), direct_path=direct_path)
+    elif sent:
+        if db_utils.table_exists(sql_connector, staging_table):
+            db_utils.drop_table(staging_table, sql_connector) # sobra de uma execução interrompida
+        db_utils.create_table(staging_table, sql_connector, cols=columns, types=types, nologging=db == 'oracle')
+        try:
+            db_utils.insert_batches(helpers.iter_df_batches(df, batch_size, db), columns, staging_table, sql_connector,
+                                    input_sizes=schema.get_input_sizes(df_schema, db), direct_path=direct_path)
+            if unchanged is None:
+                # sem detecção, as contagens saem das chaves da staging já presentes no destino
+                q = f"""
+                SELECT count(*) FROM {staging_table} s
+                WHERE EXISTS (SELECT 1 FROM {table_name} t WHERE {' AND '.join(f't.{k} = s.{k}' for k in keys)})
+                """
+                updated = tracing.execute(cursor, q).fetchone()[0]
+                inserted = sent - updated
+            tracing.execute(cursor, get_merge_query(db, table_name, staging_table, keys, columns))
+        finally:
+            db_utils.drop_table(staging_table, sql_connector)
+    else:
+        inserted = updated = 0
+    helpers.get_connection(sql_connector).commit()
+
+    stats = {
+        'inserted': inserted,
+        'updated': updated,
+        'unchanged': unchanged,
+        'sent': sent,
+        'seconds': time.perf_counter() - start
+    }
+    if v:
+        print(f'{table_name}: {inserted} inseridas, {updated} atualizadas, {unchanged if unchanged is not None else "?"} inalteradas '
+              f'| {sent} enviadas | {stats["seconds"]:.2f}s')
+    return stats
@@ -0,0 +1,327 @@
+import os
+import re
+import json
+import time
+import random
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+
+from . import statements
+
+
+# # # # # # # # # # # # # # # #
+#                             #
+#   INSTRUMENTAÇÃO            #
+#                             #
+# # # # # # # # # # # # # # # #
+
+# tracer ativo do processo. com None (default) as funções abaixo apenas repassam a chamada ao cursor
+# (exceto pela contagem de statements repetidos de statements.py)
+_tracer = None
+_lock = threading.Lock()
+
+logger = logging.getLogger('nsds.db_utils')
+
+
+@functools.lru_cache(maxsize=1024)
+def fingerprint(q):
+    """
+    Forma normalizada de uma query para agregação: literais viram ?, espaços são colapsados e
+    o texto fica em minúsculas (e.g. "select * from t where a = 1" -> "select * from t where a = ?")
+    """
+
+    q = re.sub(r"'(?:[^']|'')*'", '?', q)
+    q = re.sub(r'\b\d+(?:\.\d+)?\b', '?', q)
+    q = re.sub(r'\s+', ' ', q).strip().lower()
+    return q
+
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p
+    low, high = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (k - low)
+
+
+def _estimate_bytes(rows):
+    # estimativa do volume enviado: tamanho de strings/bytes e 8 bytes para os demais valores
+    total = 0
+    for row in rows:
+        for value in row:
+            total += len(value) if isinstance(value, (str, bytes)) else 8
+    return total
+
+
+class Tracer:
+    """
+    Agrega as operações instrumentadas por fingerprint da query (ou nome da operação)
+    e repassa cada span para os exporters
+
+    inputs:
+    :: exporters [list] -> callables que recebem cada span (dict), e.g. log_exporter, JsonLinesExporter
+    :: max_samples [int] -> latências guardadas por fingerprint para os percentis: passando de max_samples execuções,
+       uma amostra uniforme de todas elas (reservoir sampling) | default: 10000
+    :: estimate_bytes [bool] -> estima os bytes enviados nos executemany (percorre as linhas) | default: True
+    """
+
+    def __init__(self, exporters=None, max_samples=10000, estimate_bytes=True):
+        self.exporters = list(exporters or [])
+        self.max_samples = max_samples
+        self.estimate_bytes = estimate_bytes
+        self._stats = {}
+        self._random = random.Random()
+        self._lock = threading.Lock()
+
+    def record(self, span):
+        """Agrega um span: {"name", "statement", "start", "duration", "rows", "bytes", "round_trips", ...}"""
+
+        key = (span['name'], span.get('statement'))
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {'count': 0, 'seconds': 0.0, 'max': None, 'rows': 0, 'bytes': 0, 'round_trips': 0,
+                                            'latencies': []}
+            stats['count'] += 1
+            stats['seconds'] += span['duration']
+            stats['max'] = span['duration'] if stats['max'] is None else max(stats['max'], span['duration'])
+            stats['rows'] += span.get('rows') or 0
+            stats['bytes'] += span.get('bytes') or 0
+            stats['round_trips'] += span.get('round_trips') or 0
+            # reservoir sampling: cada uma das count execuções tem a mesma chance de estar entre as max_samples guardadas
+            if len(stats['latencies']) < self.max_samples:
+                stats['latencies'].append(span['duration'])
+            else:
+                j = self._random.randrange(stats['count'])
+                if j < self.max_samples:
+                    stats['latencies'][j] = span['duration']
+        for exporter in self.exporters:
+            exporter(span)
+
+    def summary(self):
+        """
+        Estatísticas agregadas por (operação, fingerprint)
+
+        output:
+        :: [list de dict] com "name", "statement", "count", "seconds", "p50", "p95", "max", "rows", "bytes", "round_trips",
+           ordenada pelo tempo total
+        """
+
+        with self._lock:
+            items = [(k, dict(v, latencies=sorted(v['latencies']))) for k, v in self._stats.items()]
+        summary = []
+        for (name, statement), stats in items:
+            latencies = stats.pop('latencies')
+            summary.append(dict(
+                name=name, statement=statement, **stats,
+                p50=_percentile(latencies, 0.5), p95=_percentile(latencies, 0.95)
+            ))
+        return sorted(summary, key=lambda s: -s['seconds'])
+
+    def to_dataframe(self):
+        """summary() como DataFrame"""
+
+        import pandas as pd
+        return pd.DataFrame(self.summary())
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+def enable(tracer=None, **kwargs):
+    """
+    Ativa a instrumentação no processo
+
+    inputs:
+    :: tracer [Tracer] -> tracer a ser utilizado | default: Tracer(**kwargs)
+
+    output:
+    :: [Tracer] ativo
+    """
+
+    global _tracer
+    with _lock:
+        _tracer = tracer or Tracer(**kwargs)
+        return _tracer
+
+
+def disable():
+    """Desativa a instrumentação e retorna o tracer que estava ativo"""
+
+    global _tracer
+    with _lock:
+        tracer, _tracer = _tracer, None
+        return tracer
+
+
+def get_tracer():
+    """Tracer ativo ou None"""
+
+    return _tracer
+
+
+@contextmanager
+def tracing(tracer=None, **kwargs):
+    """
+    Context manager que ativa a instrumentação durante o bloco e restaura o estado anterior ao final
+
+    e.g.
+        with tracing.tracing(exporters=[tracing.log_exporter]) as tracer:
+            db_utils.insert_df(df, 'tabela', con, batch_size=50000)
+        print(tracer.to_dataframe())
+    """
+
+    global _tracer
+    with _lock:
+        previous = _tracer
+        _tracer = tracer or Tracer(**kwargs)
+        active = _tracer
+    try:
+        yield active
+    finally:
+        with _lock:
+            _tracer = previous
+
+
+@contextmanager
+def span(name, statement=None, **attributes):
+    """
+    Mede o bloco como um span. O dict entregue pode ser completado dentro do bloco (e.g. span["rows"] = n).
+    Sem tracer ativo, apenas executa o bloco.
+    """
+
+    tracer = _tracer
+    if tracer is None:
+        yield {}
+        return
+    record = dict(attributes, name=name, statement=statement, start=time.time())
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = repr(e)
+        raise
+    finally:
+        record['duration'] = time.perf_counter() - start
+        tracer.record(record)
+
+
+def traced(name):
+    """Decorator que registra cada chamada da função como um span (e.g. tempo de obtenção de conexões)"""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def execute(cursor, q, params=None):
+    """cursor.execute(q, params) instrumentado. Retorna o mesmo que cursor.execute"""
+
+    statements.record(cursor, q) # contagem de statements repetidos, também sem tracer (um lookup por execução)
+    if _tracer is None:
+        return cursor.execute(q, params) if params else cursor.execute(q)
+    with span('execute', fingerprint(q), round_trips=1) as record:
+        result = cursor.execute(q, params) if params else cursor.execute(q)
+        rowcount = getattr(cursor, 'rowcount', -1)
+        record['rows'] = rowcount if rowcount and rowcount > 0 else 0
+    return result
+
+
+def executemany(cursor, q, rows, **kwargs):
+    """cursor.executemany(q, rows, **kwargs) instrumentado"""
+
+    statements.record(cursor, q)
+    tracer = _tracer
+    if tracer is None:
+        return cursor.executemany(q, rows, **kwargs)
+    sized = hasattr(rows, '__len__')
+    with span('executemany', fingerprint(q), rows=len(rows) if sized else None, round_trips=1) as record:
+        if tracer.estimate_bytes and sized:
+            record['bytes'] = _estimate_bytes(rows)
+        return cursor.executemany(q, rows, **kwargs)
+
+
+def fetchmany(result, size, q=None):
+    """result.fetchmany(size) instrumentado; round trips estimados pelo arraysize do cursor"""
+
+    if _tracer is None:
+        return result.fetchmany(size)
+    with span('fetch', fingerprint(q) if q else None) as record:
+        rows = result.fetchmany(size)
+        arraysize = getattr(result, 'arraysize', None) or size
+        record['rows'] = len(rows)
+        record['round_trips'] = max(-(-len(rows) // arraysize), 1)
+    return rows
+
+
+#
+# EXPORTERS
+#
+
+def log_exporter(span):
+    """Exporter que registra cada span no logger "nsds.db_utils" (nível DEBUG)"""
+
+    logger.debug('%s %.6fs rows=%s bytes=%s | %s', span['name'], span['duration'], span.get('rows'), span.get('bytes'),
+                 span.get('statement') or '')
+
+
+class JsonLinesExporter:
+    """
+    Exporter que grava cada span em uma linha json no formato de span do OpenTelemetry
+    (name, trace_id, span_id, start/end_time_unix_nano, attributes)
+
+    inputs:
+    :: path [str] -> arquivo de saída (aberto em modo append)
+    :: trace_id [str] -> id comum aos spans da execução | default: aleatório
+    """
+
+    def __init__(self, path, trace_id=None):
+        self.path = path
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self._lock = threading.Lock()
+
+    def __call__(self, span):
+        start_ns = int(span['start'] * 1e9)
+        attributes = {f'db.{k}': v for k, v in span.items() if k not in ('name', 'start', 'duration', 'statement') and v is not None}
+        if span.get('statement'):
+            attributes['db.statement'] = span['statement']
+        line = json.dumps({
+            'name': f'nsds.{span["name"]}',
+            'trace_id': self.trace_id,
+            'span_id': os.urandom(8).hex(),
+            'start_time_unix_nano': start_ns,
+            'end_time_unix_nano': start_ns + int(span['duration'] * 1e9),
+            'status': {'code': 'ERROR' if 'error' in span else 'OK'},
+            'attributes': attributes,
+        }, default=str)
+        with self._lock, open(self.path, 'a') as fp:
+            fp.write(line + '\n')
+
+
+class OpenTelemetryExporter:
+    """Exporter que cria spans no SDK do OpenTelemetry (requer opentelemetry-api instalado)"""
+
+    def __init__(self, tracer_name='nsds.db_utils'):
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            print('opentelemetry não instalado: pip install opentelemetry-api opentelemetry-sdk')
+            raise
+        self._tracer = trace.get_tracer(tracer_name)
+
+    def __call__(self, span):
+        start_ns = int(span['start'] * 1e9)
+        otel_span = self._tracer.start_span(f'nsds.{span["name"]}', start_time=start_ns)
+        for k, v in span.items():
+            if k not in ('name', 'start', 'duration') and v is not None:
+                otel_span.set_attribute(f'db.{k}', v if isinstance(v, (str, int, float, bool)) else str(v))
+        otel_span.end(end_time=start_ns + int(span['duration'] * 1e9))
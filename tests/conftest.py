@@ -0,0 +1,14 @@
+import pytest
+
+from nsds.db_utils import db_utils
+from nsds.db_utils import pool
+
+
+@pytest.fixture
+def sqlite_connection(tmp_path):
+    """Conexão sqlite salva em um arquivo de conexões temporário: (nome da conexão, config_filename)"""
+
+    config_filename = str(tmp_path / 'connections.json')
+    db_utils.save_connection_info('TESTE', flavor='sqlite', dbpath=str(tmp_path / 'teste.db'), config_filename=config_filename)
+    yield 'TESTE', config_filename
+    pool.close_all() # o registro de pools é por nome de conexão
@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+from nsds.db_utils import aio
+from nsds.db_utils import db_utils
+from nsds.db_utils import pool
+
+
+def test_async_pool_follows_shared_pool_max(sqlite_connection):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    connection.execute('CREATE TABLE T (ID INTEGER)')
+    connection.executemany('INSERT INTO T VALUES (?)', [(i,) for i in range(50)])
+    connection.commit()
+    connection.close()
+    pool.get_pool(name, config_filename=config_filename, min=0, max=2) # pool do processo criado antes, menor
+
+    with pytest.raises(ValueError):
+        aio.AsyncConnectionPool(name, max=8, max_concurrency=3, config_filename=config_filename)
+
+    async def main():
+        async_pool = aio.AsyncConnectionPool(name, max=8, config_filename=config_filename)
+        assert async_pool.max_concurrency == 2
+
+        async def read():
+            return [len(chunk) async for chunk in async_pool.read_query('select ID from T', chunksize=10, as_df=False)]
+
+        try:
+            return await asyncio.wait_for(asyncio.gather(*(read() for _ in range(6))), 10)
+        finally:
+            await async_pool.close()
+
+    assert asyncio.run(main()) == [[10] * 5] * 6
@@ -0,0 +1,27 @@
+import subprocess
+import sys
+
+import pytest
+
+from nsds.db_utils import backends
+
+
+def _run(code):
+    return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.strip()
+
+
+def test_import_does_not_load_drivers():
+    loaded = _run('import sys, nsds; nsds.db_utils.connect; '
+                  'print(sorted({"cx_Oracle", "sqlalchemy", "pandas", "sqlite3"} & set(sys.modules)))')
+    assert loaded == '[]'
+
+
+def test_backend_loaded_on_first_use():
+    loaded = _run('import sys, nsds; from nsds.db_utils import backends; backends.load("sqlite"); '
+                  'print("sqlite3" in sys.modules, "cx_Oracle" in sys.modules)')
+    assert loaded == 'True False'
+
+
+def test_unknown_backend():
+    with pytest.raises(KeyError):
+        backends.load('nao_registrado')
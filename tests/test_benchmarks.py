@@ -0,0 +1,37 @@
+import os
+import subprocess
+import importlib.util
+
+BENCH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'bench_db_utils.py')
+spec = importlib.util.spec_from_file_location('bench_db_utils', BENCH)
+bench = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bench)
+
+
+def test_import_time_failure_is_a_failed_metric(monkeypatch):
+    class Failed:
+        returncode, stdout, stderr = 1, '', 'Traceback\nAssertionError: driver importado no import'
+
+    monkeypatch.setattr(subprocess, 'run', lambda *args, **kwargs: Failed())
+    results = bench.bench_import_time(2)
+    assert results['import.nsds.db_utils']['value'] is None
+    assert results['import.nsds.db_utils']['error'] == 'AssertionError: driver importado no import'
+
+
+def test_import_time_without_drivers():
+    results = bench.bench_import_time(1)
+    assert all(r['value'] is not None for r in results.values()), results
+
+
+def test_compare_flags_regressions_only():
+    baseline = {'results': {
+        'load': {'value': 100.0, 'higher_is_better': True},
+        'latency': {'value': 1.0, 'higher_is_better': False},
+        'import': {'value': 1.0, 'higher_is_better': False},
+    }}
+    results = {'results': {
+        'load': {'value': 70.0, 'higher_is_better': True},
+        'latency': {'value': 1.1, 'higher_is_better': False},
+        'import': {'value': None, 'higher_is_better': False},
+    }}
+    assert [r[0] for r in bench.compare(results, baseline, 0.25)] == ['load']
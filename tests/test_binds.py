@@ -0,0 +1,44 @@
+import datetime
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from nsds.db_utils import binds
+from nsds.db_utils import schema
+
+
+def test_nulls_and_native_types():
+    df = pd.DataFrame({
+        'i': [1, 2, 3],
+        'f': [1.5, np.nan, 3.0],
+        'b': [True, False, True],
+        'd': pd.to_datetime(['2024-01-01', None, '2024-01-03 10:00:00.5'], format='ISO8601'),
+        's': ['a', None, 'c'],
+        'c': pd.Categorical(['x', None, 'x']),
+    })
+    rows = binds.to_rows(df, db='oracle')
+    assert rows[1] == (2, None, 0, None, None, None)
+    assert rows[2] == (3, 3.0, 1, datetime.datetime(2024, 1, 3, 10, 0, 0, 500000), 'c', 'x')
+    assert all(type(v) in (int, float, str, datetime.datetime) for v in rows[0])
+
+
+def test_tz_aware_binds_utc_instant():
+    sp = pd.Series(pd.to_datetime(['2024-06-01 12:00']).tz_localize('America/Sao_Paulo'))
+    df = pd.DataFrame({'d': sp, 'o': sp.astype(object)})
+    assert binds.to_rows(df, db='oracle') == [(datetime.datetime(2024, 6, 1, 15, 0),) * 2]
+    assert binds.to_rows(df, db='sqlite') == [('2024-06-01 15:00:00', '2024-06-01 15:00:00')]
+    assert schema.infer_column(df['d'], db='oracle')['type'] == 'TIMESTAMP'
+
+
+def test_batches_round_trip_sqlite():
+    df = pd.DataFrame({'x': np.arange(10.0), 'd': pd.date_range('2024-01-01', periods=10, freq='h')})
+    df.loc[3, 'x'] = np.nan
+    con = sqlite3.connect(':memory:')
+    con.execute('create table t (x real, d text)')
+    for batch in binds.iter_rows(df, 4, db='sqlite'):
+        assert len(batch) <= 4
+        con.executemany('insert into t values (?, ?)', batch)
+    out = con.execute('select x, d from t').fetchall()
+    assert out[3] == (None, '2024-01-01 03:00:00')
+    assert len(out) == 10
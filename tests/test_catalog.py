@@ -0,0 +1,39 @@
+import datetime
+
+from nsds.db_utils import catalog
+from nsds.db_utils import db_utils
+
+
+def test_catalog_shared_by_database_without_holding_connections(sqlite_connection):
+    name, config_filename = sqlite_connection
+    catalog.drop_catalogs()
+    first = db_utils.connect(name, config_filename=config_filename)
+    db_utils.create_table('T', first, cols=['ID'], types=['INTEGER'])
+    assert db_utils.table_exists(first, 'T', cache=True)
+    first.close()
+
+    second = db_utils.connect(name, config_filename=config_filename)
+    shared = catalog.get_catalog(second)
+    assert shared is catalog.get_catalog(second) and shared.sql_connector is None
+    db_utils.drop_table('T', second) # invalida o catálogo do arquivo
+    assert not db_utils.table_exists(second, 'T', cache=True)
+    second.close()
+    catalog.drop_catalogs()
+
+
+def test_oracle_name_reload_is_chunked():
+    c = catalog.Catalog.__new__(catalog.Catalog)
+    c.tables, c._last_ddl_time = 'all', None
+    calls = []
+
+    def execute(sql_connector, q, params=None):
+        calls.append(len(params))
+        if 'tab_cols' in q:
+            return []
+        return [('OWNER', v, 'TABLE', datetime.datetime(2024, 1, 1)) for k, v in params.items()]
+
+    c._execute = execute
+    names = [f'T{i}' for i in range(2500)]
+    objects = c._load_oracle(None, names=names)
+    assert len(objects) == 2500
+    assert max(calls) <= catalog.MAX_IN_LIST
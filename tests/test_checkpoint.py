@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+from nsds.db_utils import checkpoint
+from nsds.db_utils import db_utils
+from nsds.db_utils import tracing
+
+
+def _interrupt_at(monkeypatch, call):
+    # executemany que falha no envio de número call (a carga cai no meio)
+    executemany, calls = tracing.executemany, []
+
+    def failing(cursor, q, rows, **kwargs):
+        calls.append(len(rows))
+        if len(calls) == call:
+            raise RuntimeError('carga interrompida')
+        return executemany(cursor, q, rows, **kwargs)
+
+    monkeypatch.setattr(tracing, 'executemany', failing)
+    return calls
+
+
+def _ids(connection):
+    return [r[0] for r in connection.execute('select ID from CARGA order by ID')]
+
+
+@pytest.mark.parametrize('store', ['file', 'table'])
+def test_load_resumes_after_interruption(sqlite_connection, monkeypatch, tmp_path, store):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    store = checkpoint.StateFile(str(tmp_path / 'carga.json')) if store == 'file' else checkpoint.ControlTable()
+    df = pd.DataFrame({'ID': range(10), 'VALOR': [i / 2 for i in range(10)]})
+
+    _interrupt_at(monkeypatch, 3)
+    with pytest.raises(RuntimeError):
+        db_utils.insert_df(df, 'CARGA', connection, batch_size=3, checkpoint=store)
+    connection.rollback()
+    assert _ids(connection) == list(range(6)) # dois lotes gravados
+
+    calls = _interrupt_at(monkeypatch, None)
+    stats = db_utils.insert_df(df, 'CARGA', connection, batch_size=3, checkpoint=store)
+    assert stats['resumed_from'] == 6 and calls == [3, 1] # só os lotes que faltavam
+    assert _ids(connection) == list(range(10))
+    assert store.load('CARGA', connection) is None # carga concluída limpa o estado
+    connection.close()
+
+
+def test_load_rejects_other_content(sqlite_connection, monkeypatch, tmp_path):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    path = str(tmp_path / 'carga.json')
+    _interrupt_at(monkeypatch, 2)
+    with pytest.raises(RuntimeError):
+        db_utils.insert_df(pd.DataFrame({'ID': range(4)}), 'CARGA', connection, batch_size=2, checkpoint=path)
+    connection.rollback()
+
+    with pytest.raises(ValueError):
+        db_utils.insert_df(pd.DataFrame({'ID': range(5)}), 'CARGA', connection, batch_size=2, checkpoint=path)
+    checkpoint.clear('CARGA', checkpoint=path)
+    assert checkpoint.StateFile(path).load('CARGA', connection) is None
+    assert _ids(connection) == [0, 1] # as linhas já gravadas permanecem
+    connection.close()
@@ -0,0 +1,45 @@
+import numpy as np
+
+from nsds.db_utils import columnar
+from nsds.db_utils import db_utils
+
+
+def _table(sqlite_connection, rows):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    connection.execute('CREATE TABLE T (ID INTEGER, X REAL, NOME TEXT)')
+    connection.executemany('INSERT INTO T VALUES (?, ?, ?)', rows)
+    connection.commit()
+    return connection
+
+
+def test_read_arrays_sqlite(sqlite_connection):
+    rows = [(i, i / 2, f'n{i}') for i in range(7)] + [(None, None, None)]
+    connection = _table(sqlite_connection, rows)
+    # lotes de 3 e capacidade inicial menor que o resultado: os arrays crescem entre lotes
+    arrays, masks = columnar.read_arrays(connection, 'select ID, X, NOME from T order by rowid', arraysize=3)
+    assert arrays['ID'].dtype == np.int64 and arrays['X'].dtype == np.float64 and arrays['NOME'].dtype == object
+    assert arrays['ID'][:7].tolist() == list(range(7))
+    assert arrays['X'][:7].tolist() == [i / 2 for i in range(7)]
+    assert arrays['NOME'].tolist() == [f'n{i}' for i in range(7)] + [None]
+    assert masks['ID'].tolist() == [False] * 7 + [True]
+    assert 'NOME' not in masks # colunas object guardam o None
+    connection.close()
+
+
+def test_read_arrays_promotes_untyped_column(sqlite_connection):
+    # sqlite sem tipo no resultado: o 1º lote é inteiro, o 2º traz float
+    connection = _table(sqlite_connection, [(1, 0, 'a'), (2, 0, 'b'), (3.5, 0, 'c')])
+    arrays, _ = columnar.read_arrays(connection, 'select ID from T order by rowid', arraysize=2, nrows=3)
+    assert arrays['ID'].dtype == np.float64 and arrays['ID'].tolist() == [1.0, 2.0, 3.5]
+    connection.close()
+
+
+def test_read_arrays_as_df(sqlite_connection):
+    connection = _table(sqlite_connection, [(1, 1.5, 'a'), (None, None, 'b')])
+    df = columnar.read_arrays(connection, 'select ID, X from T order by rowid', as_df=True)
+    assert str(df['ID'].dtype) == 'Int64' and df['ID'].isna().tolist() == [False, True]
+    assert df['X'].isna().tolist() == [False, True]
+    empty = columnar.read_arrays(connection, 'select ID from T where 1 = 0', as_df=True)
+    assert list(empty.columns) == ['ID'] and len(empty) == 0
+    connection.close()
@@ -0,0 +1,39 @@
+import builtins
+import json
+import os
+
+from nsds.db_utils import config
+from nsds.db_utils import db_utils
+
+
+def test_config_read_once_until_file_changes(tmp_path, monkeypatch):
+    config_filename = str(tmp_path / 'connections.json')
+    db_utils.save_connection_info('A', flavor='sqlite', dbpath='a.db', config_filename=config_filename)
+
+    opened, real_open = [], builtins.open
+    monkeypatch.setattr(builtins, 'open', lambda file, *a, **k: opened.append(file) or real_open(file, *a, **k))
+    for _ in range(5):
+        info = db_utils.get_connection_info('A', config_filename=config_filename)
+        info['dbpath'] = 'alterado' # cópia: não altera o cache
+    assert opened == [] # gravado por save_connection_info, já em cache
+    assert db_utils.get_connection_info('A', config_filename=config_filename)['dbpath'] == 'a.db'
+
+    with real_open(config_filename, 'w') as fp: # alterado por outro processo
+        json.dump({'A': {'flavor': 'sqlite', 'dbpath': 'b.db'}, 'B': {}}, fp)
+    os.utime(config_filename, ns=(1, 1))
+    assert db_utils.get_connection_info('A', config_filename=config_filename)['dbpath'] == 'b.db'
+    assert opened == [os.path.abspath(config_filename)]
+
+
+def test_env_var_overrides_file(tmp_path, monkeypatch):
+    monkeypatch.setenv(config.ENV_VAR, json.dumps({'ENV': {'flavor': 'sqlite', 'dbpath': ':memory:'}}))
+    assert db_utils.get_connection_info('env', config_filename=str(tmp_path / 'nao_existe.json'))['dbpath'] == ':memory:'
+
+
+def test_update_keeps_other_connections(tmp_path):
+    config_filename = str(tmp_path / 'connections.json')
+    for name in ('A', 'B'):
+        db_utils.save_connection_info(name, flavor='sqlite', dbpath=f'{name}.db', config_filename=config_filename)
+    with open(config_filename) as fp:
+        assert sorted(json.load(fp)) == ['A', 'B']
+    assert [f for f in os.listdir(tmp_path) if f.endswith('.tmp')] == [] # escrita atômica sem sobras
@@ -0,0 +1,116 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from nsds.db_utils import db_utils
+from nsds.db_utils import helpers
+
+
+def test_iter_df_batches_native_values():
+    df = pd.DataFrame({
+        'i': [1, 2, 3],
+        'f': [0.5, np.nan, 1.5],
+        'd': pd.to_datetime(['2024-01-01 10:00', None, '2024-01-03 00:00']),
+    })
+    batches = list(helpers.iter_df_batches(df, 2))
+    assert [len(b) for b in batches] == [2, 1]
+    assert batches[0][0] == (1, 0.5, datetime.datetime(2024, 1, 1, 10, 0))
+    assert batches[0][1] == (2, None, None)
+    assert type(batches[0][0][0]) is int
+
+
+def test_batched_insert_commits_every_n_batches(sqlite_connection):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    other = db_utils.connect(name, config_filename=config_filename)
+    connection.execute('CREATE TABLE T (ID INTEGER)')
+    connection.commit()
+
+    def rows():
+        for i in range(10):
+            if i == 6: # após 6 linhas (3 lotes de 2): só o commit do 2º lote é visível em outra conexão
+                seen.append(other.execute('SELECT count(*) FROM T').fetchone()[0])
+            yield (i,)
+
+    seen = []
+    stats = db_utils.insert_rows(rows(), ['ID'], 'T', connection, batch_size=2, commit_every=2)
+    assert (stats['rows'], stats['batches']) == (10, 5)
+    assert seen == [4]
+    assert other.execute('SELECT count(*) FROM T').fetchone()[0] == 10 # o lote final também é commitado
+    other.close()
+    connection.close()
+
+
+def test_insert_df_batches_round_trip(sqlite_connection):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    df = pd.DataFrame({'ID': range(7), 'V': [0.5 * i for i in range(7)]})
+    stats = db_utils.insert_df(df, 'T', connection, batch_size=3, commit_every=1)
+    assert stats['batches'] == 3
+    assert connection.execute('SELECT sum(ID), sum(V) FROM T').fetchone() == (21, 10.5)
+    connection.close()
+
+
+def test_workers_reject_serial_only_options(sqlite_connection):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    df = pd.DataFrame({'ID': [1, 2]})
+    for option in [{'commit_every': 1}, {'direct_path': True}, {'batch_errors': True}]:
+        with pytest.raises(ValueError):
+            db_utils.insert_df(df, 'T', connection, workers=2, connection_name=name, **option)
+    with pytest.raises(ValueError):
+        db_utils.insert_rows([(1,)], ['ID'], 'T', connection, workers=2, connection_name=name, commit_every=1)
+    assert not db_utils.table_exists(connection, 'T')
+    connection.close()
+
+
+def test_workers_use_config_filename(sqlite_connection, tmp_path, monkeypatch):
+    # a conexão dos workers está salva fora de ./connections.json
+    name, config_filename = sqlite_connection
+    monkeypatch.chdir(tmp_path / '..')
+    connection = db_utils.connect(name, config_filename=config_filename)
+    stats = db_utils.insert_df(pd.DataFrame({'ID': range(100)}), 'T', connection, batch_size=10, workers=2, connection_name=name,
+                               config_filename=config_filename)
+    assert stats['rows'] == 100
+    stats = db_utils.insert_rows([(i,) for i in range(100, 150)], ['ID'], 'T', connection, batch_size=10, workers=2,
+                                 connection_name=name, config_filename=config_filename)
+    assert stats['rows'] == 50
+    assert connection.execute('SELECT count(*), sum(ID) FROM T').fetchone() == (150, sum(range(150)))
+    connection.close()
+
+
+def test_read_query_streams_chunks(sqlite_connection):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    connection.execute('CREATE TABLE T (ID INTEGER, V REAL)')
+    connection.executemany('INSERT INTO T VALUES (?, ?)', [(i, i / 2) for i in range(25)])
+
+    chunks = list(db_utils.read_query(connection, 'SELECT ID, V FROM T WHERE ID >= ? ORDER BY ID', params=[5], chunksize=8))
+    assert [len(c) for c in chunks] == [8, 8, 4]
+    assert all(list(c.columns) == ['ID', 'V'] and c['ID'].dtype == chunks[0]['ID'].dtype for c in chunks)
+    assert pd.concat(chunks)['ID'].tolist() == list(range(5, 25))
+
+    rows = db_utils.read_query(connection, 'SELECT ID FROM T ORDER BY ID', chunksize=10, as_df=False)
+    assert next(rows) == [(i,) for i in range(10)]
+    rows.close() # interrompido no meio: o cursor próprio é fechado
+    connection.close()
+
+
+def test_direct_path_queries():
+    q = db_utils.get_insert_query('oracle', 'T', ['a', 'b'], direct_path=True)
+    assert '/*+ APPEND_VALUES */' in q and ':1, :2' in q
+    assert 'APPEND' not in db_utils.get_insert_query('sqlite', 'T', ['a', 'b'], direct_path=True)
+    assert db_utils.get_create_table_query('T_STG', cols=['A'], types=['NUMBER'], nologging=True).endswith(' NOLOGGING')
+
+
+def test_staged_load_moves_and_drops_staging(sqlite_connection):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    df = pd.DataFrame({'ID': range(5), 'S': list('abcde')})
+    stats = db_utils.insert_df(df, 'T', connection, staging_table='T_STG', direct_path=True)
+    assert stats['rows'] == 5
+    assert connection.execute('SELECT count(*), min(S), max(S) FROM T').fetchone() == (5, 'a', 'e')
+    assert not db_utils.table_exists(connection, 'T_STG')
+    connection.close()
@@ -0,0 +1,87 @@
+import sqlite3
+
+import pytest
+
+from nsds.db_utils import db_utils
+from nsds.db_utils import failover
+from nsds.db_utils import tracing
+
+
+def _flaky_executemany(monkeypatch, failing_calls):
+    # executemany que perde a sessão nas chamadas de número em failing_calls (1, 2, ...)
+    executemany, calls = tracing.executemany, []
+
+    def flaky(cursor, q, rows, **kwargs):
+        calls.append(len(rows))
+        if len(calls) in failing_calls:
+            raise Exception('DPI-1080: connection was closed by ORA-3113')
+        return executemany(cursor, q, rows, **kwargs)
+
+    monkeypatch.setattr(tracing, 'executemany', flaky)
+    return calls
+
+
+def _managed(sqlite_connection):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    connection.execute('CREATE TABLE T (ID INTEGER)')
+    connection.commit()
+    connection.close()
+    return db_utils.connect(name, config_filename=config_filename, managed=True, ping_interval=0)
+
+
+def test_cursor_reconnects_closed_connection(sqlite_connection):
+    connection = _managed(sqlite_connection)
+    reconnects = failover.get_metrics()['reconnects']
+    connection.connection.close()
+    assert connection.cursor().execute('select count(*) from T').fetchone() == (0,)
+    assert failover.get_metrics()['reconnects'] == reconnects + 1
+    connection.close()
+
+
+def test_replay_survives_drop_during_replay(sqlite_connection, monkeypatch):
+    connection = _managed(sqlite_connection)
+    # lotes de 2: o 3º envio cai (lote 3), e o reenvio do lote 3 cai de novo
+    _flaky_executemany(monkeypatch, {3, 4})
+    batches = [[(i,), (i + 1,)] for i in range(0, 10, 2)]
+    stats = db_utils.insert_batches(batches, ['ID'], 'T', connection, commit_every=2)
+    assert stats['rows'] == 10 and stats['reconnects'] == 2
+    ids = [r[0] for r in connection.cursor().execute('select ID from T order by ID')]
+    assert ids == list(range(10)) # sem duplicados
+    connection.close()
+
+
+def test_replay_is_bounded(sqlite_connection, monkeypatch):
+    connection = _managed(sqlite_connection)
+    calls = _flaky_executemany(monkeypatch, set(range(2, 100)))
+    with pytest.raises(Exception, match='DPI-1080'):
+        db_utils.insert_batches([[(1,)], [(2,)]], ['ID'], 'T', connection, commit_every=5)
+    assert len(calls) == 2 + failover.MAX_REPLAYS # cada reenvio cai já no 1º lote pendente
+    connection.close()
+
+
+def test_sqlite_lock_is_not_transient():
+    assert not failover.is_transient(sqlite3.OperationalError('database is locked'))
+    assert failover.is_transient(Exception('DPI-1080: connection was closed'))
+
+
+def test_busy_timeout_waits_for_lock(sqlite_connection):
+    name, config_filename = sqlite_connection
+    writer = db_utils.connect(name, config_filename=config_filename, busy_timeout=0)
+    writer.execute('CREATE TABLE T (ID INTEGER)')
+    writer.commit()
+    writer.execute('BEGIN IMMEDIATE')
+    other = db_utils.connect(name, config_filename=config_filename, busy_timeout=0)
+    with pytest.raises(sqlite3.OperationalError, match='locked'):
+        other.execute('INSERT INTO T VALUES (1)')
+    other.close()
+    writer.rollback()
+    writer.close()
+
+
+def test_get_dsns():
+    info = {'host': 'a, b:1522', 'service': 'svc'}
+    assert failover.get_dsns(info) == ['a:1521/svc', 'b:1522/svc']
+    descriptor, = failover.get_dsns(info, descriptor=True)
+    assert 'FAILOVER=on' in descriptor and '(HOST=b)(PORT=1522)' in descriptor
+    assert failover.get_dsns({'dsn': ['x', 'y']}) == ['x', 'y']
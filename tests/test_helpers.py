@@ -0,0 +1,38 @@
+import sqlite3
+
+import sqlalchemy
+
+from nsds.db_utils import helpers
+
+
+def test_connector_types_resolved_from_registry():
+    connection = sqlite3.connect(':memory:')
+    assert helpers.get_db_module_connectortype(connection) == ('sqlite', 'sqlite3', 'connection')
+    assert helpers.get_db_module_connectortype(connection.cursor()) == ('sqlite', 'sqlite3', 'cursor')
+    assert helpers.get_cursor(connection).execute('select 1').fetchone() == (1,)
+    assert helpers.get_connection(connection.cursor()) is connection
+
+    engine = sqlalchemy.create_engine('sqlite://')
+    assert helpers.get_db_module_connectortype(engine) == ('sqlite', 'sqlalchemy', 'engine')
+    connection.close()
+
+
+def test_registered_subclass_and_custom_connector():
+    class Subclass(sqlite3.Connection):
+        pass
+
+    connection = sqlite3.connect(':memory:', factory=Subclass)
+    assert helpers.get_db_module_connectortype(connection) == ('sqlite', 'sqlite3', 'connection')
+
+    class Wrapper:
+        def __init__(self, connection):
+            self.connection = connection
+
+        def cursor(self):
+            return self.connection.cursor()
+
+    helpers.register_connector(Wrapper, lambda c: 'sqlite', 'sqlite3', 'connection')
+    wrapper = Wrapper(connection)
+    assert helpers.get_db_module_connectortype(wrapper) == ('sqlite', 'sqlite3', 'connection')
+    assert helpers.get_cursor(wrapper).execute('select 2').fetchone() == (2,)
+    connection.close()
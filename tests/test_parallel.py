@@ -0,0 +1,74 @@
+import pandas as pd
+import pytest
+
+from nsds.db_utils import db_utils
+from nsds.db_utils import parallel
+
+
+def test_rowid_ranges_split_extents():
+    # (objeto, arquivo, bloco, blocos, rowid inicial, rowid final), com rowids representados por (objeto, arquivo, bloco)
+    extents = [(obj, fno, block, 8, (obj, fno, block), (obj, fno, block + 7))
+               for obj in (100, 101) for fno in (4, 5) for block in range(0, 80, 8)]
+    groups = parallel._group_extents(extents, 4)
+    assert len(groups) == 4
+
+    covered = []
+    for ranges in groups:
+        assert len({(low[0], low[1]) for low, _ in ranges}) == len(ranges) # uma faixa por objeto/arquivo
+        for low, high in ranges:
+            assert low[:2] == high[:2]
+            covered.extend((low[0], low[1], b) for b in range(low[2], high[2] + 1))
+    expected = [(obj, fno, b) for obj in (100, 101) for fno in (4, 5) for b in range(80)]
+    assert sorted(covered) == expected # faixas disjuntas cobrindo todos os blocos
+
+
+def test_read_table_parallel_sqlite(sqlite_connection):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    db_utils.insert_df(pd.DataFrame({'ID': range(1000), 'V': [i * 0.5 for i in range(1000)]}), 'T', connection)
+    connection.commit()
+    connection.close()
+
+    df = parallel.read_table_parallel(name, 'T', workers=3, config_filename=config_filename)
+    assert sorted(df['ID']) == list(range(1000))
+
+
+def test_atomic_replace_uses_new_schema_and_keeps_indexes(sqlite_connection):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    db_utils.insert_df(pd.DataFrame({'ID': [1, 2]}), 'T', connection)
+    connection.execute('CREATE INDEX T_ID ON T (ID)')
+    connection.commit()
+
+    df = pd.DataFrame({'ID': range(500), 'NOME': [f'n{i}' for i in range(500)]})
+    stats = parallel.insert_df_parallel(df, 'T', name, sql_connector=connection, if_exists='replace', workers=2,
+                                        partition_rows=100, atomic=True, config_filename=config_filename)
+    assert stats['rows'] == 500
+    assert connection.execute('SELECT count(*), count(NOME) FROM T').fetchone() == (500, 500)
+    assert connection.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'T'").fetchall() == [('T_ID',)]
+    assert not db_utils.table_exists(connection, 'T_STG')
+    connection.close()
+
+
+def test_failed_partitions_raise(sqlite_connection):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    connection.execute('CREATE TABLE T (ID INTEGER PRIMARY KEY)')
+    connection.execute('INSERT INTO T VALUES (5000)')
+    connection.commit()
+
+    rows = [(i,) for i in range(300)] + [(5000,)] # a última partição repete uma chave já gravada
+    with pytest.raises(parallel.PartitionLoadError) as error:
+        parallel.insert_rows_parallel(rows, ['ID'], 'T', name, sql_connector=connection, workers=2, partition_rows=100,
+                                      config_filename=config_filename)
+    assert [e['partition'] for e in error.value.errors] == [3]
+    assert error.value.stats['rows'] == 300
+    assert connection.execute('SELECT count(*) FROM T').fetchone() == (301,)
+
+    rows = [(i,) for i in range(1000, 1300)] + [(1300, 'x')] # linha inválida na última partição
+    with pytest.raises(parallel.PartitionLoadError):
+        parallel.insert_rows_parallel(rows, ['ID'], 'T', name, sql_connector=connection, workers=2, partition_rows=100,
+                                      atomic=True, config_filename=config_filename)
+    assert connection.execute('SELECT count(*) FROM T').fetchone() == (301,) # nada da carga atomic
+    assert not db_utils.table_exists(connection, 'T_STG')
+    connection.close()
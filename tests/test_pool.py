@@ -0,0 +1,52 @@
+import threading
+
+from nsds.db_utils import db_utils
+from nsds.db_utils import pool
+
+
+def test_sqlite_pool_reuses_and_replaces_dead_connections(sqlite_connection):
+    name, config_filename = sqlite_connection
+    p = pool.get_pool(name, config_filename=config_filename, min=0, max=2, ping_interval=0)
+    connection = p.acquire()
+    p.release(connection)
+    connection.close() # a conexão ociosa "cai" no pool
+
+    with p.connection() as other:
+        assert other.execute('select 1').fetchone() == (1,)
+    stats = p.stats()
+    assert (stats['hits'], stats['misses']) == (1, 2) # a devolvida foi reaproveitada, testada e trocada
+    assert stats['opened'] == 1
+
+
+def test_pool_creation_outside_registry_lock(sqlite_connection, monkeypatch):
+    name, config_filename = sqlite_connection
+    db_utils.save_connection_info('LENTA', flavor='sqlite', dbpath=':memory:', config_filename=config_filename)
+    started, proceed, created = threading.Event(), threading.Event(), []
+
+    class SlowPool(pool.ConnectionPool):
+        def __init__(self, connection_name, **kwargs):
+            created.append(connection_name)
+            if connection_name == 'LENTA':
+                started.set()
+                proceed.wait(5)
+            super().__init__(connection_name, **kwargs)
+
+    monkeypatch.setattr(pool, 'ConnectionPool', SlowPool)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pool.get_pool('LENTA', config_filename=config_filename)))
+               for _ in range(3)]
+    for t in threads:
+        t.start()
+    assert started.wait(5)
+
+    # outra conexão não espera a criação em andamento
+    other = threading.Thread(target=lambda: results.append(pool.get_pool(name, config_filename=config_filename)))
+    other.start()
+    other.join(2)
+    assert not other.is_alive() and results[0].connection_name == name
+    results.clear()
+    proceed.set()
+    for t in threads:
+        t.join(5)
+    assert created.count('LENTA') == 1
+    assert len(results) == 3 and all(r is results[0] for r in results)
@@ -0,0 +1,62 @@
+import threading
+
+from nsds.db_utils import db_utils
+from nsds.db_utils import query_cache
+
+
+def test_wal_commits_invalidate_entries(tmp_path):
+    config_filename = str(tmp_path / 'connections.json')
+    db_utils.save_connection_info('WAL', flavor='sqlite', dbpath=str(tmp_path / 'wal.db'), profile='fast',
+                                  config_filename=config_filename)
+    cache = query_cache.QueryCache(str(tmp_path / 'cache'))
+    writer = db_utils.connect('WAL', config_filename=config_filename) # mantida aberta: sem checkpoint, commits ficam no -wal
+    writer.execute('CREATE TABLE T (ID INTEGER)')
+    writer.execute('INSERT INTO T VALUES (1)')
+    writer.commit()
+
+    def read():
+        return query_cache.read_cached('WAL', 'select * from T', depends_on='auto', cache=cache, config_filename=config_filename)
+
+    assert len(read()) == 1
+    assert len(read()) == 1
+    writer.execute('INSERT INTO T VALUES (2)')
+    writer.commit()
+    assert len(read()) == 2
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 2
+    writer.close()
+
+
+def test_failed_put_still_returns_result(sqlite_connection, tmp_path):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    connection.execute('CREATE TABLE T (V)')
+    connection.executemany('INSERT INTO T VALUES (?)', [(1,), ('a',)]) # tipos mistos: o arrow não converte a coluna
+    connection.commit()
+    connection.close()
+
+    cache = query_cache.QueryCache(str(tmp_path / 'cache'))
+    df = query_cache.read_cached(name, 'select V from T', cache=cache, config_filename=config_filename)
+    assert df['V'].tolist() == [1, 'a']
+    assert cache.stats()['entries'] == 0
+
+
+def test_quoted_identifiers_keep_case():
+    assert query_cache.normalize_sql('SELECT "A"\n FROM T') == 'select "A" from t'
+    assert query_cache.get_key('C', 'select "A" from t') != query_cache.get_key('C', 'select "a" from t')
+    assert query_cache.get_key('C', 'SELECT  x FROM t;') == query_cache.get_key('c', 'select x from T')
+
+
+def test_counters_are_thread_safe(tmp_path):
+    cache = query_cache.QueryCache(str(tmp_path / 'cache'))
+
+    def work():
+        for _ in range(10000):
+            cache.record(True)
+            cache.record(False)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert (cache.hits, cache.misses) == (80000, 80000)
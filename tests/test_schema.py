@@ -0,0 +1,43 @@
+from decimal import Decimal, ROUND_HALF_EVEN
+
+import numpy as np
+import pandas as pd
+
+from nsds.db_utils import schema
+
+
+def _number(value, scale):
+    # valor devolvido por uma coluna NUMBER(p,scale): o decimal arredondado para scale casas, lido como float
+    return float(Decimal(repr(float(value))).quantize(Decimal(1).scaleb(-scale), rounding=ROUND_HALF_EVEN))
+
+
+def _scale(type_):
+    return int(type_.rstrip(')').split(',')[1]) if ',' in type_ else 0
+
+
+def test_float_scale_is_exact():
+    info = schema.infer_column(pd.Series([1.0000001, 3.0000004, 2.5]), db='oracle')
+    assert info['type'] == 'NUMBER(8,7)'
+
+
+def test_float_types_round_trip():
+    rng = np.random.default_rng(0)
+    columns = [
+        [1.0000001, 3.0000004],
+        [0.1, 0.2, 0.3],
+        [19.99, 1234.5, -0.01],
+        [1e-9, 2.5e-10],
+        np.round(rng.normal(0, 1000, 1000), 4).tolist(),
+        rng.normal(0, 1, 1000).tolist(),
+    ]
+    for values in columns:
+        info = schema.infer_column(pd.Series(values), db='oracle')
+        if info['type'] == 'BINARY_DOUBLE':
+            continue
+        scale = _scale(info['type'])
+        assert [_number(v, scale) for v in values] == values, info['type']
+
+
+def test_float_without_exact_scale_is_binary_double():
+    info = schema.infer_column(pd.Series([1 / 3, 2 / 3]), db='oracle')
+    assert info['type'] == 'BINARY_DOUBLE'
@@ -0,0 +1,48 @@
+import pandas as pd
+import pytest
+
+from nsds.db_utils import db_utils
+from nsds.db_utils import session
+
+
+def test_session_batches_ddl_in_one_round_trip(sqlite_connection):
+    name, config_filename = sqlite_connection
+    with session.Session(name, config_filename=config_filename) as s:
+        s.drop_table('A', if_exists=True)
+        s.create_table('A', cols=['ID'], types=['INTEGER'])
+        s.execute('CREATE TABLE B (ID INTEGER)')
+        assert s.stats()['pending'] == 3
+        s.flush()
+        assert s.stats() == {'round_trips': 1, 'statements': 3, 'pending': 0}
+
+        stats = s.insert_df(pd.DataFrame({'ID': range(5)}), 'A', if_exists='replace', batch_size=2)
+        assert stats['rows'] == 5
+        assert s.query('select count(*) from A') == [(5,)]
+    assert s.closed
+
+    connection = db_utils.connect(name, config_filename=config_filename)
+    assert connection.execute('select count(*) from A').fetchone() == (5,) # commit ao sair do with
+    connection.close()
+
+
+def test_session_rolls_back_on_error(sqlite_connection):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    with pytest.raises(ZeroDivisionError):
+        with session.Session(connection) as s:
+            s.insert_df(pd.DataFrame({'ID': [1, 2]}), 'A')
+            1 / 0
+    assert not db_utils.table_exists(connection, 'A') # no sqlite, o DDL enviado também é desfeito
+    with pytest.raises(RuntimeError):
+        s.execute('select 1')
+    connection.close()
+
+
+def test_get_plsql_block():
+    block = session.get_plsql_block([("INSERT INTO T VALUES ('a');", None), ('DROP TABLE T', session.ORA_TABLE_NOT_FOUND)])
+    assert block.splitlines() == [
+        'BEGIN',
+        "EXECUTE IMMEDIATE 'INSERT INTO T VALUES (''a'')';",
+        "BEGIN EXECUTE IMMEDIATE 'DROP TABLE T'; EXCEPTION WHEN OTHERS THEN IF SQLCODE != -942 THEN RAISE; END IF; END;",
+        'END;',
+    ]
@@ -0,0 +1,50 @@
+import pytest
+
+from nsds.db_utils import db_utils
+from nsds.db_utils import sqlite_profiles
+from nsds.db_utils import tracing
+
+
+def _setup(sqlite_connection):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    connection.execute('CREATE TABLE T (ID INTEGER, V TEXT)')
+    connection.execute('CREATE INDEX T_ID ON T (ID)')
+    connection.execute('CREATE INDEX T_V ON T (V)')
+    connection.commit()
+    return connection
+
+
+def _indexes(connection):
+    return sorted(n for n, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'T'"))
+
+
+def test_bulk_load_recreates_indexes_after_error(sqlite_connection):
+    connection = _setup(sqlite_connection)
+    synchronous = sqlite_profiles.get_settings(connection)['synchronous']
+    with pytest.raises(RuntimeError):
+        with sqlite_profiles.bulk_load(connection, 'T'):
+            assert _indexes(connection) == []
+            connection.executemany('INSERT INTO T VALUES (?, ?)', [(1, 'a'), (2, 'b')])
+            raise RuntimeError
+    assert _indexes(connection) == ['T_ID', 'T_V']
+    assert connection.execute('SELECT count(*) FROM T').fetchone() == (0,)
+    assert sqlite_profiles.get_settings(connection)['synchronous'] == synchronous
+    connection.close()
+
+
+def test_bulk_load_recreates_indexes_when_drop_fails(sqlite_connection, monkeypatch):
+    connection = _setup(sqlite_connection)
+    execute = tracing.execute
+
+    def failing_second_drop(cursor, q, params=None):
+        if q.startswith('DROP INDEX') and 'T_V' in q:
+            raise RuntimeError('drop')
+        return execute(cursor, q, params)
+
+    monkeypatch.setattr(tracing, 'execute', failing_second_drop)
+    with pytest.raises(RuntimeError, match='drop'):
+        with sqlite_profiles.bulk_load(connection, 'T'):
+            pass
+    assert _indexes(connection) == ['T_ID', 'T_V'] # T_ID já tinha sido removido (autocommit)
+    connection.close()
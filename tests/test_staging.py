@@ -0,0 +1,84 @@
+import datetime
+import decimal
+
+import pyarrow as pa
+import pyarrow.parquet
+import pytest
+
+from nsds.db_utils import db_utils
+from nsds.db_utils import schema
+from nsds.db_utils import staging
+
+
+def test_oracle_arrow_types_come_from_description():
+    cx_Oracle = pytest.importorskip('cx_Oracle')
+    description = [
+        ('ID', cx_Oracle.DB_TYPE_NUMBER, 11, None, 10, 0, 0),
+        ('VALOR', cx_Oracle.DB_TYPE_NUMBER, 15, None, 12, 2, 1),
+        ('X', cx_Oracle.DB_TYPE_NUMBER, 127, None, 0, -127, 1),
+        ('GRANDE', cx_Oracle.DB_TYPE_NUMBER, 31, None, 30, 0, 1),
+        ('DIA', cx_Oracle.DB_TYPE_DATE, 23, None, None, None, 1),
+        ('NOME', cx_Oracle.DB_TYPE_VARCHAR, 20, 20, None, None, 1),
+    ]
+    assert schema.get_arrow_schema(description) == [
+        ('ID', pa.int64()),
+        ('VALOR', pa.decimal128(12, 2)),
+        ('X', pa.float64()),
+        ('GRANDE', pa.decimal128(30, 0)),
+        ('DIA', pa.timestamp('s')),
+        ('NOME', pa.string()),
+    ]
+
+
+def test_round_trip_sqlite(tmp_path):
+    source = db_utils.connect_sqlite(dbpath=str(tmp_path / 'origem.db'))
+    source.execute('CREATE TABLE T (ID INTEGER, V REAL, NOME TEXT)')
+    rows = [(i, i / 4 if i % 3 else None, f'nome {i}' if i % 5 else None) for i in range(1000)]
+    source.executemany('INSERT INTO T VALUES (?, ?, ?)', rows)
+    source.commit()
+
+    path = str(tmp_path / 't.parquet')
+    assert staging.export_parquet(source, 'SELECT * FROM T', path, batch_size=128)['rows'] == 1000
+
+    target = db_utils.connect_sqlite(dbpath=str(tmp_path / 'destino.db'))
+    stats = staging.import_parquet(path, 'T', target, batch_size=100)
+    assert stats['rows'] == 1000
+    assert target.execute('SELECT * FROM T ORDER BY ID').fetchall() == rows
+    source.close()
+    target.close()
+
+
+def test_rows_per_file_splits_large_batches(tmp_path):
+    connection = db_utils.connect_sqlite(dbpath=str(tmp_path / 'origem.db'))
+    connection.execute('CREATE TABLE T (A INTEGER)')
+    connection.executemany('INSERT INTO T VALUES (?)', [(i,) for i in range(1000)])
+    connection.commit()
+
+    path = str(tmp_path / 'saida')
+    stats = staging.export_parquet(connection, 'SELECT A FROM T', path, rows_per_file=300, batch_size=1000)
+    counts = [pyarrow.parquet.ParquetFile(f).metadata.num_rows for f in stats['files']]
+    assert counts == [300, 300, 300, 100]
+    assert pyarrow.parquet.read_table(path)['A'].to_pylist() == list(range(1000))
+    connection.close()
+
+
+def test_sqlite_mixed_numbers_fail_instead_of_truncating(tmp_path):
+    connection = db_utils.connect_sqlite(dbpath=str(tmp_path / 'origem.db'))
+    connection.execute('CREATE TABLE T (V NUMERIC)')
+    connection.executemany('INSERT INTO T VALUES (?)', [(1,), (2,), (1.5,)])
+    with pytest.raises(pa.ArrowInvalid):
+        staging.export_parquet(connection, 'SELECT V FROM T', str(tmp_path / 't.parquet'), batch_size=2)
+    connection.close()
+
+
+def test_parquet_schema_is_inferred_over_all_batches(tmp_path):
+    pytest.importorskip('cx_Oracle') # tipos de bind do oracle
+    path = str(tmp_path / 't.parquet')
+    table = pa.table({
+        'VALOR': pa.array([decimal.Decimal('1.50'), decimal.Decimal('123456.25'), None], pa.decimal128(12, 2)),
+        'DATA': pa.array([datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 1, 0, 0, 0, 1)]),
+        'NOME': pa.array(['a', 'b', 'c' * 30]),
+    })
+    pyarrow.parquet.write_table(table, path)
+    types = [c['type'] for c in staging.get_parquet_schema(path, db='oracle', batch_size=1)]
+    assert types == ['NUMBER(8,2)', 'TIMESTAMP', 'VARCHAR2(30)']
@@ -0,0 +1,37 @@
+from nsds.db_utils import db_utils
+from nsds.db_utils import statements
+from nsds.db_utils import tracing
+
+
+def test_repeated_statements_sqlite(sqlite_connection):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename, cached_statements=2)
+    cursor = connection.cursor()
+    for q in ['select 1', 'select 2', 'select 1', 'select 3', 'select 2']:
+        cursor.execute(q)
+        statements.record(cursor, q)
+    stats = statements.cache_stats(connection)
+    # janela de 2 textos: "select 1" repete; "select 2" já tinha saído quando voltou
+    assert (stats['repeated'], stats['new'], stats['tracked']) == (1, 4, 2)
+    assert stats['repeated_rate'] == 0.2
+    connection.close()
+
+
+def test_repeated_statements_without_tracing(sqlite_connection):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    connection.execute('CREATE TABLE T (ID INTEGER)')
+    assert tracing.get_tracer() is None
+    for _ in range(5):
+        db_utils.table_exists(connection, 'T')
+    stats = statements.cache_stats(connection)
+    assert (stats['repeated'], stats['new']) == (4, 1)
+    connection.close()
+
+
+def test_session_cache_stats_delta():
+    baseline = {'parse count (total)': 10, 'session cursor cache hits': 2, 'parse count (hard)': 5, 'execute count': 20}
+    counters = {'parse count (total)': 30, 'session cursor cache hits': 17, 'parse count (hard)': 6, 'execute count': 120}
+    stats = statements._session_cache_stats(counters, baseline)
+    assert stats == {'hits': 15, 'misses': 5, 'hit_rate': 0.75, 'parses': 20, 'hard_parses': 1, 'executions': 100}
+    assert statements._session_cache_stats(counters, {})['hit_rate'] == 17 / 30
@@ -0,0 +1,61 @@
+import sqlite3
+import threading
+
+import pandas as pd
+import pytest
+
+from nsds.db_utils import db_utils
+from nsds.db_utils import stream
+from nsds.db_utils import tracing
+
+
+def _create(sqlite_connection):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    connection.execute('CREATE TABLE EVENTOS (ID INTEGER, PAYLOAD TEXT)')
+    connection.commit()
+    return connection
+
+
+def test_stream_spills_and_keeps_order(sqlite_connection, monkeypatch, tmp_path):
+    name, config_filename = sqlite_connection
+    connection = _create(sqlite_connection)
+    # o banco "trava" até o produtor terminar: os lotes acima de max_buffer_rows vão para o disco
+    release, executemany = threading.Event(), tracing.executemany
+
+    def slow(cursor, q, rows, **kwargs):
+        release.wait(5)
+        return executemany(cursor, q, rows, **kwargs)
+
+    monkeypatch.setattr(tracing, 'executemany', slow)
+    spill_dir = tmp_path / 'spill'
+    spill_dir.mkdir()
+    writer = stream.StreamWriter('EVENTOS', name, cols=['ID', 'PAYLOAD'], batch_size=10, max_buffer_rows=20,
+                                 spill_dir=str(spill_dir), config_filename=config_filename)
+    writer.write((i, f'p{i}') for i in range(55))
+    writer.write(pd.DataFrame({'ID': range(55, 100), 'PAYLOAD': [f'p{i}' for i in range(55, 100)]}))
+    assert writer.spilled_rows >= 70 and writer.max_memory_rows <= 20
+    assert len(list(spill_dir.iterdir())) == 1
+
+    release.set()
+    stats = writer.close()
+    assert stats['rows'] == stats['rows_written'] == 100 and stats['pending_rows'] == 0
+    rows = connection.execute('select ID, PAYLOAD from EVENTOS order by rowid').fetchall()
+    assert rows == [(i, f'p{i}') for i in range(100)] # ordem de escrita, inclusive dos lotes lidos do disco
+    assert list(spill_dir.iterdir()) == [] # arquivo temporário removido
+    connection.close()
+
+
+def test_stream_flush_and_error(sqlite_connection):
+    name, config_filename = sqlite_connection
+    connection = _create(sqlite_connection)
+    with stream.StreamWriter('EVENTOS', name, cols=['ID', 'PAYLOAD'], batch_size=4, config_filename=config_filename) as writer:
+        writer.write([(1, 'a'), (2, 'b')])
+        writer.flush() # lote parcial inserido e commitado
+        assert connection.execute('select count(*) from EVENTOS').fetchone() == (2,)
+
+    writer = stream.StreamWriter('INEXISTENTE', name, cols=['ID'], batch_size=2, config_filename=config_filename)
+    writer.write([(1,), (2,), (3,)])
+    with pytest.raises(sqlite3.OperationalError):
+        writer.close() # o erro da thread de escrita chega ao produtor
+    connection.close()
@@ -0,0 +1,39 @@
+import pandas as pd
+
+from nsds.db_utils import db_utils
+from nsds.db_utils import sync
+
+
+def _rows(connection):
+    return connection.execute('SELECT ID, V FROM T ORDER BY ID').fetchall()
+
+
+def test_sync_detects_inserts_updates_and_unchanged(sqlite_connection):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    stats = sync.sync_df(pd.DataFrame({'ID': [1, 2, 3], 'V': ['a', 'b', 'c']}), 'T', connection, keys='ID')
+    assert (stats['inserted'], stats['updated'], stats['unchanged']) == (3, 0, 0)
+
+    stats = sync.sync_df(pd.DataFrame({'ID': [2, 3, 4], 'V': ['b', 'x', 'd']}), 'T', connection, keys='ID')
+    assert (stats['inserted'], stats['updated'], stats['unchanged'], stats['sent']) == (1, 1, 1, 2)
+    assert _rows(connection) == [(1, 'a'), (2, 'b'), (3, 'x'), (4, 'd')]
+    connection.close()
+
+
+def test_sync_null_hash_counts_as_changed(sqlite_connection):
+    name, config_filename = sqlite_connection
+    connection = db_utils.connect(name, config_filename=config_filename)
+    # linhas gravadas antes da coluna de hash existir
+    connection.execute('CREATE TABLE T (ID INTEGER, V TEXT)')
+    connection.executemany('INSERT INTO T VALUES (?, ?)', [(1, 'a'), (2, 'b')])
+    connection.commit()
+
+    df = pd.DataFrame({'ID': [1, 2], 'V': ['a', 'b']})
+    stats = sync.sync_df(df, 'T', connection, keys='ID', hash_column='ROW_HASH')
+    assert (stats['inserted'], stats['updated'], stats['unchanged']) == (0, 2, 0)
+    assert connection.execute('SELECT count(*) FROM T WHERE ROW_HASH IS NULL').fetchone() == (0,)
+
+    stats = sync.sync_df(df, 'T', connection, keys='ID', hash_column='ROW_HASH')
+    assert (stats['inserted'], stats['updated'], stats['unchanged'], stats['sent']) == (0, 0, 2, 0)
+    assert _rows(connection) == [(1, 'a'), (2, 'b')]
+    connection.close()
@@ -0,0 +1,32 @@
+import random
+import sqlite3
+
+from nsds.db_utils import statements
+from nsds.db_utils import tracing
+
+
+def test_percentiles_sample_all_executions():
+    tracer = tracing.Tracer(max_samples=200)
+    tracer._random = random.Random(0)
+    for i in range(20000): # latências crescentes: guardar só as primeiras distorce os percentis
+        tracer.record({'name': 'execute', 'statement': 'select ?', 'duration': float(i)})
+    stats, = tracer.summary()
+    assert stats['count'] == 20000 and stats['max'] == 19999.0
+    assert 8000 < stats['p50'] < 12000
+    assert 17000 < stats['p95'] < 20000
+
+
+def test_disabled_tracing_skips_spans(monkeypatch):
+    recorded, spans = [], []
+    monkeypatch.setattr(statements, 'record', lambda cursor, q: recorded.append(q))
+    span = tracing.span
+    monkeypatch.setattr(tracing, 'span', lambda *args, **kwargs: spans.append(args) or span(*args, **kwargs))
+    cursor = sqlite3.connect(':memory:').cursor()
+    tracing.disable()
+    assert tracing.execute(cursor, 'select 1').fetchone() == (1,)
+    assert spans == [] and recorded == ['select 1'] # statements repetidos são contados mesmo sem tracer
+
+    with tracing.tracing() as tracer:
+        tracing.execute(cursor, 'select 1')
+    assert len(spans) == 1 and recorded == ['select 1'] * 2
+    assert tracer.summary()[0]['count'] == 1